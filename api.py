@@ -0,0 +1,485 @@
+"""
+HTTP inference API for Font Identifier
+asyncio server (standard library only) that serves predictions without Streamlit
+
+Usage:
+    python api.py [--host 0.0.0.0] [--port 8000] [--workers 2]
+
+Endpoints:
+    POST /v1/predict        one image, multipart/form-data or raw bytes -> top-k JSON
+    POST /v1/predict/batch  images as multipart/form-data -> NDJSON, one line per image as it completes
+    GET  /healthz           200 once the model is warmed up; includes result cache metrics
+Query parameter `k` overrides the number of fonts/families returned.
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import email.message
+import json
+import logging
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.connection import wait
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from config.settings import ModelConfig
+from font_identifier.cache import open_prediction_cache, prediction_variant
+from font_identifier.labels import build_family_index, rank_predictions
+from font_identifier.neardup import build_near_duplicate_index
+from font_identifier.preprocessing import open_image, prepare_image
+from font_identifier.health import READY, readiness, ready_file, serving_batch_sizes, warmup
+from font_identifier.inference import InferenceDispatcher, InferenceQueueFull
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_TOP_K = 50
+# Images of one batch request decoded/queued at a time
+BATCH_CONCURRENCY = 32
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 415: "Unsupported Media Type",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    """Turned into a JSON error response with the given status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: Dict[str, List[str]]
+    headers: Dict[str, str]
+    body: bytes = b""
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+# ----------------------------------------------------------------------
+# HTTP/1.1 parsing
+# ----------------------------------------------------------------------
+
+async def read_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                       max_body: int) -> Optional[Request]:
+    """Parse one request from the connection; None when the client closed it"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(431, "request headers too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    url = urlsplit(target)
+    request = Request(method=method.upper(), path=url.path, query=parse_qs(url.query), headers=headers)
+
+    if headers.get("expect", "").lower() == "100-continue":
+        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        try:
+            request.body = await _read_chunked(reader, max_body)
+        except asyncio.LimitOverrunError:
+            raise HttpError(400, "malformed chunk")  # a chunk size or trailer line without end
+    elif "content-length" in headers:
+        if not headers["content-length"].isdecimal():
+            raise HttpError(400, "invalid Content-Length")
+        length = int(headers["content-length"])
+        if length > max_body:
+            raise HttpError(413, f"request body larger than {max_body} bytes")
+        request.body = await reader.readexactly(length)
+    elif request.method == "POST":
+        raise HttpError(411, "Content-Length required")
+    return request
+
+
+async def _read_chunked(reader: asyncio.StreamReader, max_body: int) -> bytes:
+    body = bytearray()
+    while True:
+        size_line = await reader.readuntil(b"\r\n")
+        size_field = size_line.split(b";", 1)[0].strip()
+        if not size_field or size_field.strip(b"0123456789abcdefABCDEF"):
+            raise HttpError(400, "malformed chunk")
+        size = int(size_field, 16)
+        if size == 0:
+            while await reader.readuntil(b"\r\n") != b"\r\n":
+                pass  # trailers
+            return bytes(body)
+        if len(body) + size > max_body:
+            raise HttpError(413, f"request body larger than {max_body} bytes")
+        body += await reader.readexactly(size)
+        if await reader.readexactly(2) != b"\r\n":
+            raise HttpError(400, "malformed chunk")
+
+
+def _header_params(name: str, value: str) -> email.message.Message:
+    message = email.message.Message()
+    message[name] = value
+    return message
+
+
+def parse_multipart(body: bytes, content_type: str) -> List[Tuple[str, str, bytes]]:
+    """(field name, filename, data) for each part of a multipart/form-data body"""
+    boundary = _header_params("content-type", content_type).get_param("boundary")
+    if not boundary:
+        raise HttpError(400, "multipart body without boundary")
+    parts = []
+    for chunk in body.split(b"--" + boundary.encode("latin-1"))[1:]:
+        if chunk.startswith(b"--"):
+            break  # closing delimiter
+        head, sep, data = chunk[2:].partition(b"\r\n\r\n")
+        if not sep:
+            continue
+        headers = {}
+        for line in head.decode("latin-1").split("\r\n"):
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        disposition = _header_params("content-disposition", headers.get("content-disposition", ""))
+        parts.append((
+            disposition.get_param("name", header="content-disposition") or "",
+            disposition.get_param("filename", header="content-disposition") or "",
+            data[:-2] if data.endswith(b"\r\n") else data,
+        ))
+    return parts
+
+
+def request_images(request: Request) -> List[Tuple[str, bytes]]:
+    """(filename, bytes) for every uploaded file, or the raw body as a single image"""
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    if content_type.lower().startswith("multipart/form-data"):
+        images = [(filename or name, data) for name, filename, data in parse_multipart(request.body, content_type)
+                  if filename or name in ("file", "image", "files", "images")]
+    elif content_type.lower().startswith(("image/", "application/octet-stream")):
+        images = [("", request.body)]
+    else:
+        raise HttpError(415, f"unsupported content type {content_type}")
+    if not images or not any(data for _, data in images):
+        raise HttpError(400, "no image in request")
+    return images
+
+
+def _response_head(status: int, headers: Dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_json(writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool = True):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(_response_head(status, {
+        "Content-Type": "application/json",
+        "Content-Length": str(len(body)),
+        "Connection": "keep-alive" if keep_alive else "close",
+    }) + body)
+    await writer.drain()
+
+
+# ----------------------------------------------------------------------
+# Prediction service
+# ----------------------------------------------------------------------
+
+class PredictionService:
+    """
+    Decodes images on a thread pool and batches the forwards of all concurrent
+    requests through one InferenceDispatcher.
+    """
+
+    def __init__(self, backend, class_names: list, settings: ModelConfig):
+        self.backend = backend
+        self.class_names = class_names
+        self.settings = settings
+        self.family_index = build_family_index(class_names)
+        self.cache = open_prediction_cache(settings)
+        self.near_duplicates = build_near_duplicate_index(settings)
+        self.executor = ThreadPoolExecutor(max_workers=settings.preprocess_workers,
+                                           thread_name_prefix="api-preprocess")
+        self.dispatcher = None
+        if settings.batching_enabled:
+            self.dispatcher = InferenceDispatcher(
+                backend,
+                max_batch_size=settings.max_batch_size,
+                batch_window_ms=settings.batch_window_ms,
+                max_queue_depth=settings.max_queue_depth,
+            )
+        self.ready = threading.Event()
+
+    def warmup(self):
+        """Warm up, then mark the service (and the process readiness state) ready"""
+        if self.settings.warmup_enabled:
+            warmup(self.backend, serving_batch_sizes(self.settings), self.settings.warmup_rounds)
+        else:
+            readiness.set(READY, backend=self.backend.name)
+        self.ready.set()
+
+    async def predict(self, data: bytes, k: int) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        variant = prediction_variant("whole", self.settings, k)
+        if self.cache is not None:
+            hit = await loop.run_in_executor(self.executor, self.cache.get, data, variant)
+            if hit is not None:
+                return hit
+        try:
+            image, image_hash, near, tensor = await loop.run_in_executor(self.executor, self._prepare, data, variant)
+        except Exception:
+            raise HttpError(400, "could not decode image")
+        if near is not None:
+            return near
+        try:
+            if self.dispatcher is not None:
+                outputs = await asyncio.wrap_future(self.dispatcher.submit(tensor))
+            else:
+                outputs = await loop.run_in_executor(self.executor, self.backend.infer_batch, tensor.unsqueeze(0))
+        except InferenceQueueFull as e:
+            raise HttpError(503, str(e))
+        result = rank_predictions(outputs, self.class_names, self.family_index, k)[0]
+        if self.cache is not None:
+            loop.run_in_executor(self.executor, self.cache.put, data, variant, result)
+        if self.near_duplicates is not None:
+            self.near_duplicates.add(image_hash, image, variant, result)
+        return result
+
+    def _prepare(self, data: bytes, variant: str):
+        """Decode on the preprocess pool: (image, dHash, near-duplicate result, model input)"""
+        image = open_image(data).convert("RGB")
+        image_hash = near = None
+        if self.near_duplicates is not None:
+            image_hash, near = self.near_duplicates.lookup(image, variant)
+            if near is not None:
+                return image, image_hash, near, None
+        return image, image_hash, None, prepare_image(image)
+
+    def top_k(self, request: Request) -> int:
+        try:
+            k = int(request.query.get("k", [self.settings.top_k])[0])
+        except ValueError:
+            raise HttpError(400, "k must be an integer")
+        return max(1, min(k, MAX_TOP_K, len(self.class_names)))
+
+    def close(self):
+        if self.dispatcher is not None:
+            self.dispatcher.close()
+        self.executor.shutdown(wait=False)
+
+
+class ApiServer:
+    """Routes HTTP requests to the prediction service"""
+
+    def __init__(self, service: PredictionService, max_body: int):
+        self.service = service
+        self.max_body = max_body
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await read_request(reader, writer, self.max_body)
+                    if request is None:
+                        break
+                    keep_alive = request.keep_alive
+                    await self.route(request, writer)
+                except HttpError as e:
+                    await send_json(writer, e.status, {"error": e.message}, keep_alive)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    logger.warning(f"API request failed: {e}")
+                    await send_json(writer, 500, {"error": "internal error"}, keep_alive=False)
+                    break
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def route(self, request: Request, writer: asyncio.StreamWriter):
+        if request.path == "/healthz":
+            ready = self.service.ready.is_set()
+            payload = {"ready": ready}
+            if self.service.cache is not None:
+                payload["cache"] = self.service.cache.stats()
+            if self.service.near_duplicates is not None:
+                payload["near_duplicates"] = self.service.near_duplicates.stats()
+            await send_json(writer, 200 if ready else 503, payload, request.keep_alive)
+            return
+        if request.path not in ("/v1/predict", "/v1/predict/batch"):
+            raise HttpError(404, f"no route for {request.path}")
+        if request.method != "POST":
+            raise HttpError(405, "use POST")
+        if not self.service.ready.is_set():
+            raise HttpError(503, "model is warming up")
+
+        k = self.service.top_k(request)
+        images = request_images(request)
+        if request.path == "/v1/predict":
+            result = await self.service.predict(images[0][1], k)
+            await send_json(writer, 200, result, request.keep_alive)
+        else:
+            await self.stream_batch(images, k, writer, request.keep_alive)
+
+    async def stream_batch(self, images: List[Tuple[str, bytes]], k: int,
+                           writer: asyncio.StreamWriter, keep_alive: bool):
+        """NDJSON over chunked encoding: one line per image, in completion order"""
+        writer.write(_response_head(200, {
+            "Content-Type": "application/x-ndjson",
+            "Transfer-Encoding": "chunked",
+            "Connection": "keep-alive" if keep_alive else "close",
+        }))
+        limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def one(index: int, filename: str, data: bytes) -> Dict[str, Any]:
+            async with limit:
+                try:
+                    result = await self.service.predict(data, k)
+                except HttpError as e:
+                    result = {"error": e.message}
+                except Exception:
+                    result = {"error": "prediction failed"}
+            return dict(result, index=index, filename=filename)
+
+        tasks = [asyncio.ensure_future(one(i, name, data)) for i, (name, data) in enumerate(images)]
+        for next_done in asyncio.as_completed(tasks):
+            line = (json.dumps(await next_done) + "\n").encode("utf-8")
+            writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+# ----------------------------------------------------------------------
+# Process management
+# ----------------------------------------------------------------------
+
+def load_service_model(settings: ModelConfig):
+    """
+    Load the backend in the parent process (no warmup, no worker pool). Readiness stays
+    LOADING until the prediction service has warmed up.
+    """
+    from font_identifier.model import load_local_backend, read_class_names
+
+    class_names = read_class_names()
+    backend = load_local_backend(class_names, dataclasses.replace(settings, worker_processes=0), warm=False)
+    if backend is None:
+        raise SystemExit("Could not load the font model")
+    return backend, class_names
+
+
+def serve_worker(sock: socket.socket, backend, class_names: list, settings: ModelConfig,
+                 max_body: int, num_threads: Optional[int] = None, warmed=None):
+    """Run one event loop on an already bound listening socket; `warmed` is set once warmed up"""
+    if num_threads:
+        backend.after_fork(num_threads)
+    service = PredictionService(backend, class_names, settings)
+
+    async def run():
+        server = await asyncio.start_server(ApiServer(service, max_body).handle_connection, sock=sock,
+                                            limit=MAX_HEADER_BYTES)
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, stop.set)
+        def warm():
+            service.warmup()
+            if warmed is not None:
+                warmed.set()
+
+        threading.Thread(target=warm, name="api-warmup", daemon=True).start()
+        async with server:
+            await stop.wait()
+
+    try:
+        asyncio.run(run())
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Font Identifier HTTP inference API")
+    parser.add_argument("--host", help="Bind address (default: API_HOST / config)")
+    parser.add_argument("--port", type=int, help="Port (default: API_PORT / config)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: API_WORKERS / config)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from config.settings import config_manager
+    from font_identifier.threads import available_cores
+    from font_identifier.workers import worker_context
+
+    config = config_manager.load_config()
+    settings = config.model
+    host = args.host or config.server.api_host
+    port = args.port or config.server.api_port
+    workers = max(1, args.workers or config.server.api_workers)
+    max_body = config.server.max_upload_size * 1024 * 1024
+
+    readiness.configure(ready_file("api", port))
+    backend, class_names = load_service_model(settings)
+    sock = socket.create_server((host, port), backlog=1024)
+    logger.info("Font Identifier API (%s backend) listening on http://%s:%d with %d worker(s)",
+                backend.name, host, port, workers)
+    if workers == 1:
+        serve_worker(sock, backend, class_names, settings, max_body)
+        return
+
+    # The parent has run forwards (optimizer benchmarks, oneDNN self-check), so its OpenMP
+    # pools would not survive a fork: workers start from the fork server and attach to the
+    # weights moved to shared memory here. Restart any that die.
+    ctx = worker_context()
+    backend.share_memory()
+    threads = settings.intra_op_threads or max(1, available_cores() // workers)
+
+    def spawn(index: int):
+        warmed = ctx.Event()
+        process = ctx.Process(target=serve_worker, name=f"font-api-worker-{index}",
+                              args=(sock, backend, class_names, settings, max_body, threads, warmed))
+        process.start()
+        return process, warmed
+
+    processes, warmed = map(list, zip(*[spawn(i) for i in range(workers)]))
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    try:
+        while not stopping.is_set():
+            wait([p.sentinel for p in processes], timeout=1.0)
+            if not readiness.is_ready() and all(event.is_set() for event in warmed):
+                readiness.set(READY, backend=backend.name, workers=workers)
+            for i, process in enumerate(processes):
+                if not process.is_alive() and not stopping.is_set():
+                    logger.warning(f"API worker {i} exited with code {process.exitcode}; restarting")
+                    processes[i], warmed[i] = spawn(i)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""
+Inference backends for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.backends
+"""
+
+from font_identifier.backends import (  # noqa: F401
+    BACKENDS, INPUT_SHAPE, InferenceBackend, OnnxRuntimeBackend, TorchBackend, create_backend, load_model_file,
+)
@@ -0,0 +1,263 @@
+"""
+Offline batch prediction for Font Identifier
+Streams a directory, glob or JSONL job file through a bounded
+decode -> preprocess -> batched-inference pipeline and writes one JSONL line per image
+
+Usage:
+    python batch.py archive/ -o results.jsonl
+    python batch.py "scans/**/*.png" --workers 6 --batch-size 32
+    python batch.py jobs.jsonl            # lines: {"id": "...", "path": "..."} or "path"
+    python batch.py /shared/archive --work-dir /shared/run1   # on every node; see shards.py
+"""
+
+import argparse
+import dataclasses
+import glob
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+
+@dataclass
+class Job:
+    """One image to classify; `id` is echoed in the result line"""
+    id: str
+    path: str
+
+
+# ----------------------------------------------------------------------
+# Inputs (all lazy, so memory does not grow with the corpus)
+# ----------------------------------------------------------------------
+
+def iter_directory(root: str) -> Iterator[Job]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(dirpath, name)
+                yield Job(id=os.path.relpath(path, root), path=path)
+
+
+def iter_glob(pattern: str) -> Iterator[Job]:
+    for path in glob.iglob(pattern, recursive=True):
+        if os.path.isfile(path):
+            yield Job(id=path, path=path)
+
+
+def iter_jsonl(job_file: str) -> Iterator[Job]:
+    """Lines are {"id": ..., "path": ...} objects or bare path strings; relative paths resolve from the file"""
+    base = os.path.dirname(os.path.abspath(job_file))
+    with open(job_file, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                entry = {"path": entry}
+            path = entry.get("path") or entry.get("image")
+            if not path:
+                raise ValueError(f"{job_file}:{line_no}: job has no 'path'")
+            yield Job(id=str(entry.get("id", path)), path=os.path.join(base, path))
+
+
+def iter_jobs(source: str) -> Iterator[Job]:
+    """Jobs from a directory, a JSONL job file or a glob pattern"""
+    if os.path.isdir(source):
+        return iter_directory(source)
+    if source.endswith((".jsonl", ".ndjson")) and os.path.isfile(source):
+        return iter_jsonl(source)
+    return iter_glob(source)
+
+
+# ----------------------------------------------------------------------
+# Pipeline
+# ----------------------------------------------------------------------
+
+def _decode(path: str):
+    """Runs in a decode process: file -> preprocessed float32 array, plus timing"""
+    from font_identifier.preprocessing import prepare_image
+
+    started = time.perf_counter()
+    try:
+        array = prepare_image(path).numpy()
+        return array, None, (time.perf_counter() - started) * 1000.0
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", (time.perf_counter() - started) * 1000.0
+
+
+class BatchRunner:
+    """
+    Decode processes feed a bounded window of preprocessed images; the parent
+    groups them into batches, runs the model and writes results as they finish.
+    At most `2 * batch_size` images are in flight at any time.
+    """
+
+    def __init__(self, backend, class_names: list, batch_size: int = 16, top_k: int = 5):
+        from font_identifier.labels import build_family_index
+
+        self.backend = backend
+        self.class_names = class_names
+        self.family_index = build_family_index(class_names)
+        self.batch_size = max(1, batch_size)
+        self.top_k = top_k
+
+    def run(self, jobs: Iterable[Job], pool) -> Iterator[Dict[str, Any]]:
+        """Yield one result dict per job, in input order"""
+        jobs = iter(jobs)
+        pending: deque = deque()
+        window = 2 * self.batch_size
+
+        def fill():
+            for job in jobs:
+                pending.append((job, pool.apply_async(_decode, (job.path,))))
+                if len(pending) >= window:
+                    return
+
+        fill()
+        while pending:
+            chunk = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+            fill()
+            decoded = [(job, *future.get()) for job, future in chunk]
+            yield from self._infer(decoded)
+
+    def _infer(self, decoded: List[Tuple[Job, Any, Optional[str], float]]) -> Iterator[Dict[str, Any]]:
+        import numpy as np
+        import torch
+        from font_identifier.labels import rank_predictions
+
+        ok = [(job, array, decode_ms) for job, array, error, decode_ms in decoded if error is None]
+        ranked, batch_ms, batch_error = [], 0.0, None
+        if ok:
+            started = time.perf_counter()
+            try:
+                batch = torch.from_numpy(np.stack([array for _, array, _ in ok]))
+                with torch.no_grad():
+                    outputs = self.backend(batch)
+                ranked = rank_predictions(outputs, self.class_names, self.family_index, self.top_k)
+            except Exception as e:
+                batch_error = f"{type(e).__name__}: {e}"
+            batch_ms = (time.perf_counter() - started) * 1000.0
+
+        results = iter(ranked)
+        for job, array, error, decode_ms in decoded:
+            line = {"id": job.id, "path": job.path}
+            if error is None and batch_error is None:
+                line.update(next(results))
+            line["error"] = error or batch_error
+            line["timings"] = {"decode_ms": round(decode_ms, 2), "batch_ms": round(batch_ms, 2),
+                               "batch_size": len(ok)}
+            yield line
+
+
+def write_results(results: Iterable[Dict[str, Any]], out: IO[str], progress_every: int = 1000) -> Dict[str, Any]:
+    """Write JSONL lines as results arrive; returns summary counts"""
+    started = time.perf_counter()
+    total = errors = 0
+    for result in results:
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        total += 1
+        errors += result["error"] is not None
+        if total % progress_every == 0:
+            out.flush()
+            elapsed = time.perf_counter() - started
+            logger.info(f"{total} images, {errors} errors, {total / elapsed:.1f} images/s")
+    out.flush()
+    elapsed = time.perf_counter() - started
+    return {"images": total, "errors": errors, "seconds": round(elapsed, 2),
+            "images_per_second": round(total / elapsed, 2) if elapsed else 0.0}
+
+
+def run_sharded(source: str, runner: BatchRunner, pool, work_dir: str, output: Optional[str],
+                shard_size: int, node_id: Optional[str] = None, lease_ttl: float = 300.0) -> Dict[str, Any]:
+    """
+    Work through a shared shard queue until every shard is done, then merge.
+    Safe to start on any number of nodes at once, and to restart after a crash.
+    """
+    from shards import LeaseLost, ShardQueue
+
+    queue = ShardQueue(work_dir, node_id=node_id, lease_ttl=lease_ttl)
+    try:
+        # Absolute paths, so every node resolves the same files on the shared filesystem
+        items = ({"id": job.id, "path": os.path.abspath(job.path)} for job in iter_jobs(source))
+        queue.plan(items, shard_size, source=source)
+        while True:
+            shard = queue.claim()
+            if shard is None:
+                break
+            started = time.perf_counter()
+            try:
+                jobs = (Job(id=item["id"], path=item["path"]) for item in shard.pending_items())
+                for result in runner.run(jobs, pool):
+                    shard.write(result)
+                    if shard.written % runner.batch_size == 0:
+                        shard.checkpoint()
+                shard.complete()
+                queue.record(shard, time.perf_counter() - started)
+            except LeaseLost as e:
+                logger.warning(f"Abandoning {e}: its lease was taken over")
+            finally:
+                shard.close()
+        queue.merge(output or os.path.join(work_dir, "results.jsonl"))
+        for stats in queue.node_stats():
+            logger.info(f"Node {stats['node']}: {json.dumps(stats)}")
+        return queue.stats
+    finally:
+        queue.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Identify fonts in a directory, glob or JSONL job file")
+    parser.add_argument("source", help="Directory, glob pattern (quote it) or .jsonl job file")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout, or WORK_DIR/results.jsonl)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Decode/preprocess processes")
+    parser.add_argument("--batch-size", type=int, help="Images per forward (default: config)")
+    parser.add_argument("--top-k", type=int, help="Fonts/families per result (default: config)")
+    parser.add_argument("--work-dir", help="Shared directory for sharded, resumable runs across nodes")
+    parser.add_argument("--shard-size", type=int, default=1000, help="Items per shard (with --work-dir)")
+    parser.add_argument("--node-id", help="Name for this node's leases and stats (default: host-pid)")
+    parser.add_argument("--lease-ttl", type=float, default=300.0,
+                        help="Seconds without a heartbeat before another node may take over a shard")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+                        stream=sys.stderr)
+
+    from font_identifier import get_model_settings, load_local_backend, read_class_names
+
+    settings = get_model_settings()
+    # Start the decode processes before the model is loaded, so they stay small
+    ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+    with ctx.Pool(args.workers) as pool:
+        class_names = read_class_names()
+        backend = load_local_backend(class_names, dataclasses.replace(settings, warmup_enabled=False,
+                                                                      worker_processes=0))
+        if backend is None:
+            raise SystemExit("Could not load the font model")
+        runner = BatchRunner(backend, class_names, batch_size=args.batch_size or settings.max_batch_size,
+                             top_k=args.top_k or settings.top_k)
+        if args.work_dir:
+            summary = run_sharded(args.source, runner, pool, args.work_dir, args.output, args.shard_size,
+                                  node_id=args.node_id, lease_ttl=args.lease_ttl)
+        else:
+            out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+            try:
+                summary = write_results(runner.run(iter_jobs(args.source), pool), out)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+    logger.info(f"Done: {json.dumps(summary)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,19 @@ DIST_DIR = "dist"
 INCLUDE_FILES = [
     "main.py",
     "utils.py", 
+    "font_identifier/",
+    "backends.py",
+    "daemon.py",
+    "health.py",
+    "healthcheck.py",
+    "inference.py",
+    "model_cache.py",
+    "model_store.py",
+    "optimize.py",
+    "quantization.py",
+    "threads.py",
+    "weights.py",
+    "workers.py",
     "requirements.txt",
     "README.md",
     "LICENSE",
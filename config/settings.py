@@ -10,6 +10,8 @@ from pathlib import Path
 from typing import Dict, Any, Optional
 from dataclasses import dataclass, asdict
 
+from font_identifier.settings import ModelConfig  # noqa: F401  (defined with the library)
+
 
 @dataclass
 class DatabaseConfig:
@@ -20,15 +22,6 @@ class DatabaseConfig:
     max_backups: int = 7
 
 
-@dataclass
-class ModelConfig:
-    """Model configuration"""
-    path: str = "model.pth"
-    device: str = "auto"  # auto, cpu, cuda
-    confidence_threshold: float = 0.5
-    max_image_size: int = 2048  # pixels
-
-
 @dataclass
 class ServerConfig:
     """Server configuration"""
@@ -37,6 +30,10 @@ class ServerConfig:
     debug: bool = False
     cors_enabled: bool = False
     max_upload_size: int = 50  # MB
+    # HTTP inference API (api.py)
+    api_host: str = "0.0.0.0"
+    api_port: int = 8000
+    api_workers: int = 1  # processes forked after the model is loaded
 
 
 @dataclass
@@ -185,10 +182,46 @@ class ConfigManager:
             "MODEL_PATH": ("model", "path"),
             "MODEL_DEVICE": ("model", "device"),
             "MODEL_CONFIDENCE_THRESHOLD": ("model", "confidence_threshold"),
+            "MODEL_BACKEND": ("model", "backend"),
+            "MODEL_TOP_K": ("model", "top_k"),
+            "MODEL_MAX_REGIONS": ("model", "max_regions"),
+            "MODEL_TILE_STRIDE": ("model", "tile_stride"),
+            "MODEL_MAX_TILES": ("model", "max_tiles"),
+            "MODEL_QUANTIZATION": ("model", "quantization"),
+            "MODEL_QUANTIZATION_CALIBRATION_IMAGES": ("model", "quantization_calibration_images"),
+            "MODEL_FOLD_BATCHNORM": ("model", "fold_batchnorm"),
+            "MODEL_CHANNELS_LAST": ("model", "channels_last"),
+            "MODEL_FREEZE": ("model", "freeze_model"),
+            "MODEL_ONEDNN_AUTOTUNE": ("model", "onednn_autotune"),
+            "MODEL_COMPILED_CACHE": ("model", "compiled_cache"),
+            "MODEL_SHARED_STORE": ("model", "shared_store"),
+            "MODEL_INTRA_OP_THREADS": ("model", "intra_op_threads"),
+            "MODEL_INTER_OP_THREADS": ("model", "inter_op_threads"),
+            "MODEL_EXPECTED_CONCURRENCY": ("model", "expected_concurrency"),
+            "MODEL_SPLIT_CORES": ("model", "split_cores"),
+            "MODEL_WARMUP_ENABLED": ("model", "warmup_enabled"),
+            "MODEL_WARMUP_ROUNDS": ("model", "warmup_rounds"),
+            "MODEL_BATCHING_ENABLED": ("model", "batching_enabled"),
+            "MODEL_MAX_BATCH_SIZE": ("model", "max_batch_size"),
+            "MODEL_BATCH_WINDOW_MS": ("model", "batch_window_ms"),
+            "MODEL_MAX_QUEUE_DEPTH": ("model", "max_queue_depth"),
+            "MODEL_PREPROCESS_WORKERS": ("model", "preprocess_workers"),
+            "MODEL_WORKER_PROCESSES": ("model", "worker_processes"),
+            "MODEL_WORKER_THREADS": ("model", "worker_threads"),
+            "MODEL_DAEMON_SOCKET": ("model", "daemon_socket"),
+            "MODEL_DAEMON_TIMEOUT": ("model", "daemon_timeout"),
+            "MODEL_PREDICTION_CACHE": ("model", "prediction_cache"),
+            "MODEL_PREDICTION_CACHE_MB": ("model", "prediction_cache_mb"),
+            "MODEL_NEAR_DUPLICATE_ENTRIES": ("model", "near_duplicate_entries"),
+            "MODEL_NEAR_DUPLICATE_DISTANCE": ("model", "near_duplicate_distance"),
+            "MODEL_HOT_SWAP_INTERVAL": ("model", "hot_swap_interval"),
             
             # Server
             "STREAMLIT_SERVER_ADDRESS": ("server", "host"),
             "STREAMLIT_SERVER_PORT": ("server", "port"),
+            "API_HOST": ("server", "api_host"),
+            "API_PORT": ("server", "api_port"),
+            "API_WORKERS": ("server", "api_workers"),
             "DEBUG": ("server", "debug"),
             
             # Recording
@@ -295,6 +328,12 @@ class ConfigManager:
         if not (1 <= config.server.port <= 65535):
             errors.append(f"Invalid server port: {config.server.port}")
         
+        if not (1 <= config.server.api_port <= 65535):
+            errors.append(f"Invalid API port: {config.server.api_port}")
+        
+        if config.server.api_workers < 1:
+            errors.append("API workers must be at least 1")
+        
         # Validate file paths
         if not config.database.path:
             errors.append("Database path cannot be empty")
@@ -302,6 +341,57 @@ class ConfigManager:
         if not config.model.path:
             errors.append("Model path cannot be empty")
         
+        if config.model.backend not in ("torch", "onnxruntime"):
+            errors.append(f"Invalid model backend: {config.model.backend}")
+        
+        if config.model.top_k < 1:
+            errors.append("Model top_k must be at least 1")
+        
+        if config.model.max_regions < 1:
+            errors.append("Model max regions must be at least 1")
+        
+        if config.model.tile_stride < 1:
+            errors.append("Model tile stride must be at least 1")
+        
+        if config.model.max_tiles < 1:
+            errors.append("Model max tiles must be at least 1")
+        
+        if config.model.quantization not in ("none", "int8"):
+            errors.append(f"Invalid model quantization: {config.model.quantization}")
+        
+        if config.model.intra_op_threads < 0 or config.model.inter_op_threads < 0:
+            errors.append("Model thread counts cannot be negative (0 = automatic)")
+        
+        if config.model.expected_concurrency < 1:
+            errors.append("Model expected concurrency must be at least 1")
+        
+        if config.model.max_batch_size < 1:
+            errors.append("Model max batch size must be at least 1")
+        
+        if config.model.batch_window_ms < 0:
+            errors.append("Model batch window cannot be negative")
+        
+        if config.model.max_queue_depth < 1:
+            errors.append("Model max queue depth must be at least 1")
+        
+        if config.model.preprocess_workers < 1:
+            errors.append("Model preprocess workers must be at least 1")
+        
+        if config.model.worker_processes < 0 or config.model.worker_threads < 0:
+            errors.append("Model worker processes/threads cannot be negative")
+        
+        if config.model.daemon_timeout <= 0:
+            errors.append("Model daemon timeout must be positive")
+        
+        if config.model.prediction_cache_mb < 1:
+            errors.append("Model prediction cache size must be at least 1 MB")
+        
+        if config.model.near_duplicate_entries < 0 or config.model.near_duplicate_distance < 0:
+            errors.append("Model near-duplicate entries/distance cannot be negative")
+        
+        if config.model.hot_swap_interval < 0:
+            errors.append("Model hot swap interval cannot be negative (0 = off)")
+        
         # Validate security
         if config.security.secret_key == "change-me-in-production" and config.environment == "production":
             errors.append("Secret key must be changed in production")
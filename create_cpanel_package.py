@@ -34,6 +34,18 @@ class CPanelPackager:
             'setup_cpanel.py',         # Setup script
             'CPANEL_DEPLOYMENT.md',    # Documentation
             'model_config.py',         # Model configuration
+            'utils.py',                # Preprocessing (compatibility shim)
+            'backends.py',             # Backends shim
+            'daemon.py',               # Inference daemon command line
+            'health.py',               # Model readiness
+            'inference.py',            # Micro-batching dispatcher
+            'model_cache.py',          # Model cache shim
+            'model_store.py',          # Model store command line
+            'optimize.py',             # Optimization shim
+            'quantization.py',         # Quantization report command line
+            'threads.py',              # Thread budget calibration
+            'workers.py',              # Workers shim
+            'weights.py',              # Weights converter command line
             'app_users.db',           # Database (if exists)
             'model.pth',              # Model file (if exists)
         ]
@@ -43,7 +55,8 @@ class CPanelPackager:
             '.streamlit',
             'data',
             'static',
-            'config'
+            'config',
+            'font_identifier'
         ]
         
         # Files to exclude (will be created during setup)
@@ -0,0 +1,11 @@
+"""
+Host-level inference daemon for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.daemon
+"""
+
+from font_identifier.daemon import (  # noqa: F401
+    DaemonBackend, DaemonClient, DaemonError, InferenceDaemon, connect_daemon, decode_tensor, encode_tensor, main,
+)
+
+if __name__ == "__main__":
+    main()
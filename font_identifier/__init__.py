@@ -0,0 +1,65 @@
+"""
+Font Identifier core library
+Model loading, preprocessing, prediction and labels, without any Streamlit dependency.
+
+Submodules are imported on first use, so `import font_identifier` is cheap and
+torch/torchvision are only loaded once something needs them:
+
+    from font_identifier import load_model_and_classes, predict_fonts
+    model, class_names = load_model_and_classes()
+    results = predict_fonts(["a.png", "b.png"], model, class_names)
+"""
+
+import importlib
+
+_EXPORTS = {
+    # model loading
+    "load_model_and_classes": "model",
+    "model_lease": "model",
+    "get_model_manager": "model",
+    "load_local_backend": "model",
+    "get_model_settings": "model",
+    "resolve_model_path": "model",
+    "validate_model_file": "model",
+    # labels
+    "read_class_names": "labels",
+    "build_family_index": "labels",
+    "rank_predictions": "labels",
+    "rank_probabilities": "labels",
+    "FamilyIndex": "labels",
+    # preprocessing
+    "INPUT_SIZE": "preprocessing",
+    "preprocess": "preprocessing",
+    "preprocess_tiles": "preprocessing",
+    "prepare_image": "preprocessing",
+    # segmentation
+    "find_text_regions": "segmentation",
+    "crop_regions": "segmentation",
+    # prediction
+    "predict_font": "predict",
+    "predict_font_bytes": "predict",
+    "predict_font_topk": "predict",
+    "predict_font_regions": "predict",
+    "predict_font_tiled": "predict",
+    "predict_fonts": "predict",
+    "iter_predict_fonts": "predict",
+    "run_model": "predict",
+    # result cache
+    "PredictionCache": "cache",
+    "open_prediction_cache": "cache",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
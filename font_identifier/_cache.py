@@ -0,0 +1,80 @@
+"""
+Process-wide resource cache for Font Identifier
+Replaces st.cache_resource for code that must not depend on Streamlit
+"""
+
+import functools
+import threading
+import weakref
+from typing import Any, Callable, Dict, List, Tuple
+
+_lock = threading.Lock()
+_entries: Dict[Tuple, Any] = {}
+_key_locks: Dict[Tuple, threading.RLock] = {}
+# Objects passed to release_resources(): nothing new is cached for them
+_released: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+
+def _check_released(fn: Callable, args: Tuple):
+    for arg in args:
+        if arg in _released:
+            raise RuntimeError(
+                f"{fn.__qualname__}() called with a released {type(arg).__name__} (a model retired by a "
+                f"hot swap?); pin the model with model_lease() or call load_model_and_classes() again"
+            )
+
+
+def cached_resource(fn: Callable) -> Callable:
+    """
+    Create the resource once per process and argument set, shared by all threads.
+    Arguments are matched by identity (models and label lists are not hashed),
+    and kept alive alongside the cached value. Raises RuntimeError for an argument
+    whose resources were released.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        key = (fn.__module__, fn.__qualname__) + tuple(id(a) for a in args)
+        with _lock:
+            _check_released(fn, args)
+            if key in _entries:
+                return _entries[key][1]
+            key_lock = _key_locks.setdefault(key, threading.RLock())
+        with key_lock:
+            with _lock:
+                _check_released(fn, args)
+                if key in _entries:
+                    return _entries[key][1]
+            value = fn(*args)
+            with _lock:
+                _entries[key] = (args, value)
+            return value
+
+    def clear():
+        with _lock:
+            for key in [k for k in _entries if k[:2] == (fn.__module__, fn.__qualname__)]:
+                del _entries[key]
+
+    wrapper.clear = clear
+    return wrapper
+
+
+def release_resources(obj: Any) -> List[Any]:
+    """
+    Forget every cached resource created with `obj` among its arguments and return them.
+    `obj` is marked released first, so resources being created for it right now are
+    waited for and returned too, and none are created for it afterwards.
+    """
+    with _lock:
+        _released.add(obj)
+        pending = [(key, lock) for key, lock in _key_locks.items() if id(obj) in key[2:]]
+    for _, lock in pending:
+        with lock:
+            pass
+    with _lock:
+        for key, _ in pending:
+            _key_locks.pop(key, None)
+        keys = [key for key, (args, _) in _entries.items() if any(arg is obj for arg in args)]
+        for key in keys:
+            _key_locks.pop(key, None)
+        return [_entries.pop(key)[1] for key in keys]
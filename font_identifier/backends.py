@@ -0,0 +1,424 @@
+"""
+Inference backends for Font Identifier
+A common interface (load / warmup / infer_batch) over PyTorch and ONNX Runtime
+"""
+
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple
+
+from .settings import ModelConfig
+
+# torch is imported where it is used, so an ONNX Runtime deployment does not load it with this module
+if TYPE_CHECKING:
+    import torch
+    import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+INPUT_SHAPE = (3, 224, 224)
+# Settings baked into an exported ONNX graph; part of its cache key
+ONNX_EXPORT = {"opset_version": 17, "dynamic_batch": True}
+
+
+def exporter_version() -> Optional[str]:
+    """Installed torch version, read without importing torch; None where torch is not installed"""
+    try:
+        return importlib.metadata.version("torch")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def load_model_file(model_path: str, num_classes: int, prefer_mapped: bool = True) -> Optional["nn.Module"]:
+    """
+    Load a model in eval mode; None on failure.
+    - Memory-mapped weights (weights.py), given directly or as an up-to-date sibling of a .pth
+    - A ResNet-18 state_dict, read once with torch.load(mmap=True) and adopted without copies
+    - A pickled module (full unpickle, only when the safe load refuses the file)
+    """
+    import torch
+    import torch.nn as nn
+    from .weights import build_resnet18, fresh_weights_path, is_weights_file, load_weights_model
+
+    mapped = model_path if is_weights_file(model_path) else None
+    if mapped is None and prefer_mapped:
+        mapped = fresh_weights_path(model_path)
+    if mapped is not None:
+        try:
+            return load_weights_model(mapped, num_classes)
+        except Exception as e:
+            logger.warning(f"Could not load mapped weights {mapped}: {e}")
+            if mapped == model_path:
+                return None
+
+    # Try to load without exposing strategies to the user
+    try:
+        ckpt = torch.load(model_path, map_location="cpu", weights_only=True, mmap=True)
+    except Exception:
+        # Pickled modules, legacy (non-zip) checkpoints and torch < 2.1
+        try:
+            ckpt = torch.load(model_path, map_location="cpu", weights_only=False)
+        except Exception:
+            return None
+    if isinstance(ckpt, nn.Module):
+        model = ckpt
+        try:
+            model.eval()
+        except Exception:
+            pass
+        return model
+
+    # Otherwise a state_dict
+    state = ckpt
+    if isinstance(state, dict) and "state_dict" in state and isinstance(state["state_dict"], dict):
+        state = state["state_dict"]
+    if not isinstance(state, dict):
+        return None
+    try:
+        return build_resnet18(num_classes, state)
+    except Exception:
+        return None
+
+
+class InferenceBackend:
+    """
+    Base class for inference engines.
+
+    Backends are callable, so they can be used anywhere a model was:
+    `backend(batch)` is `backend.infer_batch(batch)`.
+    """
+
+    name = "base"
+
+    def __init__(self, settings: Optional[ModelConfig] = None):
+        self.settings = settings or ModelConfig()
+        self.source: Optional[Tuple[str, int]] = None  # (model_path, num_classes) once loaded
+        self._model_version: Optional[str] = None
+
+    def __reduce__(self):
+        # Worker processes (workers.py) receive the recipe and load their own copy,
+        # unless share_memory() has put the weights where they can attach to them
+        if self.source is None:
+            raise TypeError(f"{type(self).__name__} has no model loaded to send to a worker process")
+        return _reload_backend, (type(self), self.settings, self.source)
+
+    @property
+    def model_version(self) -> Optional[str]:
+        """Short content hash of the loaded model file; keys the prediction cache"""
+        if self._model_version is None and self.source is not None:
+            from .cache import model_version
+            self._model_version = model_version(self.source[0])
+        return self._model_version
+
+    def load(self, model_path: str, num_classes: int) -> bool:
+        """Prepare the engine for `model_path`; False if the model cannot be loaded"""
+        raise NotImplementedError
+
+    def infer_batch(self, batch: "torch.Tensor") -> "torch.Tensor":
+        """(N, 3, 224, 224) float inputs -> (N, classes) logits"""
+        raise NotImplementedError
+
+    def warmup(self, batch_sizes: Sequence[int] = (1,)):
+        """Run dummy batches so allocators and kernels are initialized before real traffic"""
+        import torch
+
+        for size in batch_sizes:
+            self.infer_batch(torch.zeros(size, *INPUT_SHAPE))
+
+    def share_memory(self) -> bool:
+        """
+        Move the weights to shared memory so worker processes attach to them instead of
+        loading their own copy; False if this backend cannot (its workers reload the model)
+        """
+        return False
+
+    def after_fork(self, num_threads: int):
+        """Re-initialize per-process state in a worker process (see workers.py)"""
+        import torch
+
+        torch.set_num_threads(num_threads)
+
+    def __call__(self, batch: "torch.Tensor") -> "torch.Tensor":
+        return self.infer_batch(batch)
+
+
+class TorchBackend(InferenceBackend):
+    """Eager/TorchScript PyTorch model with the configured precision and graph passes"""
+
+    name = "torch"
+
+    def __init__(self, settings: Optional[ModelConfig] = None):
+        super().__init__(settings)
+        self.model: Optional["nn.Module"] = None
+        self.shared_model: Optional["nn.Module"] = None  # what workers run, once share_memory() succeeded
+
+    def __reduce__(self):
+        if self.shared_model is None:
+            return super().__reduce__()
+        import torch
+
+        # Pickled by torch.multiprocessing: the tensors travel as handles to the shared memory
+        return _attach_backend, (type(self), self.settings, self.source, self.shared_model,
+                                 torch.backends.mkldnn.enabled)
+
+    def load(self, model_path: str, num_classes: int) -> bool:
+        """
+        - Reuses the compiled artifact under TORCH_HOME when model hash, torch version and settings match
+        - Otherwise loads model.pth, applies precision/graph passes and stores the artifact
+        """
+        import torch
+        from .download import file_sha256
+        from .model_cache import artifact_key, compile_settings, load_artifact, save_artifact
+
+        key = None
+        if self.settings.compiled_cache:
+            try:
+                key = artifact_key(file_sha256(model_path),
+                                   dict(compile_settings(self.settings), num_classes=num_classes))
+                cached = load_artifact(key)
+                if cached is not None:
+                    self.model, meta = cached
+                    # The artifact was optimized for the oneDNN setting its self-check chose
+                    torch.backends.mkldnn.enabled = bool(meta.get("onednn"))
+                    return True
+            except Exception:
+                key = None
+
+        model = load_model_file(model_path, num_classes)
+        if model is None:
+            return False
+        model = self._apply_precision(model, model_path)
+        model = self._apply_graph_optimizations(model)
+        if key is not None:
+            save_artifact(key, model, {"onednn": bool(torch.backends.mkldnn.enabled)})
+        self.model = model
+        return True
+
+    def infer_batch(self, batch: "torch.Tensor") -> "torch.Tensor":
+        import torch
+
+        with torch.no_grad():
+            return self.model(batch)
+
+    def share_memory(self) -> bool:
+        """
+        Shares the serving model itself when it is an eager module. Frozen TorchScript keeps its
+        weights as graph constants, which cannot be shared: workers then get one shared eager
+        copy of the model file (BatchNorm folded) and skip the freeze. INT8 packed weights
+        cannot be shared at all.
+        """
+        import torch
+
+        if self.shared_model is not None:
+            return True
+        if self.source is None or self.settings.quantization == "int8":
+            return False
+        model = self.model
+        try:
+            if isinstance(model, torch.jit.ScriptModule):
+                model = load_model_file(*self.source)
+                if model is None:
+                    return False
+                if self.settings.fold_batchnorm:
+                    from .optimize import fold_batchnorm
+                    model = fold_batchnorm(model)
+            self.shared_model = model.share_memory()
+        except Exception as e:
+            logger.warning(f"Could not move the model weights to shared memory: {e}")
+            return False
+        return True
+
+    def _apply_precision(self, model: "nn.Module", model_path: str) -> "nn.Module":
+        """Swap in the INT8 model when configured; keeps the fp32 model if quantization fails."""
+        if self.settings.quantization != "int8":
+            return model
+        try:
+            from .quantization import load_quantized_model
+            return load_quantized_model(model, model_path,
+                                        calibration_limit=self.settings.quantization_calibration_images)
+        except Exception:
+            return model
+
+    def _apply_graph_optimizations(self, model: "nn.Module") -> "nn.Module":
+        """Configured load-time passes (BN folding, channels_last, freezing, oneDNN); logs per-pass speedup."""
+        try:
+            from .optimize import optimize_model
+            model, _ = optimize_model(
+                model,
+                fold_bn=self.settings.fold_batchnorm,
+                channels_last=self.settings.channels_last,
+                freeze_graph=self.settings.freeze_model,
+                onednn=self.settings.onednn_autotune,
+            )
+        except Exception:
+            pass
+        return model
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """
+    ONNX Runtime CPU engine.
+    The model is exported from model.pth once and cached under TORCH_HOME, keyed by its hash,
+    the class count and the export settings; the exporting torch version is stored next to
+    it. Serving a cached export does not need torch: where torch is installed, an export
+    from another torch version is redone, and where it is not, the export is used as is.
+    numpy batches are answered with numpy logits, torch tensors with tensors.
+    """
+
+    name = "onnxruntime"
+
+    def __init__(self, settings: Optional[ModelConfig] = None):
+        super().__init__(settings)
+        self.session = None
+        self.input_name = "input"
+        self.model_file: Optional[str] = None
+
+    @staticmethod
+    def onnx_path(model_sha256: str, num_classes: int) -> str:
+        from .model_cache import cache_dir
+
+        payload = json.dumps({"model": model_sha256, "num_classes": num_classes, "export": ONNX_EXPORT},
+                             sort_keys=True)
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(os.path.dirname(cache_dir()), "onnx", f"{key}.onnx")
+
+    def export(self, model_path: str, num_classes: int, onnx_path: str) -> bool:
+        """Export model.pth to ONNX with a dynamic batch dimension"""
+        import torch
+
+        model = load_model_file(model_path, num_classes)
+        if model is None:
+            return False
+        os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+        tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+        kwargs = dict(
+            input_names=["input"],
+            output_names=["logits"],
+            dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}} if ONNX_EXPORT["dynamic_batch"] else None,
+            opset_version=ONNX_EXPORT["opset_version"],
+        )
+        example = (torch.randn(1, *INPUT_SHAPE),)
+        with torch.no_grad():
+            try:
+                torch.onnx.export(model, example, tmp_path, dynamo=False, **kwargs)
+            except TypeError:
+                # torch < 2.5 has only the TorchScript exporter
+                torch.onnx.export(model, example, tmp_path, **kwargs)
+        os.replace(tmp_path, onnx_path)
+        with open(f"{onnx_path}.json", "w") as f:
+            json.dump({"exporter": "torch", "exporter_version": exporter_version()}, f)
+        return True
+
+    @staticmethod
+    def stored_exporter_version(onnx_path: str) -> Optional[str]:
+        try:
+            with open(f"{onnx_path}.json") as f:
+                return json.load(f).get("exporter_version")
+        except (OSError, ValueError):
+            return None
+
+    def load(self, model_path: str, num_classes: int) -> bool:
+        import onnxruntime  # noqa: F401  (fail before exporting if it is not installed)
+        from .download import file_sha256
+        from .threads import plan_thread_budget
+
+        onnx_path = self.onnx_path(file_sha256(model_path), num_classes)
+        installed = exporter_version()
+        stale = installed is not None and self.stored_exporter_version(onnx_path) != installed
+        if (not os.path.exists(onnx_path) or stale) and not self.export(model_path, num_classes, onnx_path):
+            return False
+
+        self.model_file = onnx_path
+        self._create_session(plan_thread_budget(self.settings).intra_op)
+        return True
+
+    def _create_session(self, num_threads: int):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        self.session = ort.InferenceSession(self.model_file, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def after_fork(self, num_threads: int):
+        # ORT thread pools do not survive fork; each worker opens its own session
+        super().after_fork(num_threads)
+        self._create_session(num_threads)
+
+    def infer_batch(self, batch: "torch.Tensor") -> "torch.Tensor":
+        import numpy as np
+
+        if isinstance(batch, np.ndarray):
+            (logits,) = self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})
+            return logits
+        import torch
+
+        inputs = batch.detach().to(torch.float32).contiguous().numpy()
+        (logits,) = self.session.run(None, {self.input_name: inputs})
+        return torch.from_numpy(logits)
+
+    def warmup(self, batch_sizes: Sequence[int] = (1,)):
+        import numpy as np
+
+        for size in batch_sizes:
+            self.infer_batch(np.zeros((size, *INPUT_SHAPE), dtype=np.float32))
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend,
+}
+
+
+def create_backend(model_path: str, num_classes: int,
+                   settings: Optional[ModelConfig] = None) -> Optional[InferenceBackend]:
+    """
+    Load the configured backend; falls back to PyTorch if it is unavailable
+    (e.g. onnxruntime not installed). None if no backend can load the model.
+    """
+    settings = settings or ModelConfig()
+    names = [settings.backend] + ([TorchBackend.name] if settings.backend != TorchBackend.name else [])
+    for name in names:
+        backend_cls = BACKENDS.get(name)
+        if backend_cls is None:
+            logger.warning(f"Unknown inference backend '{name}'")
+            continue
+        backend = backend_cls(settings)
+        try:
+            if backend.load(model_path, num_classes):
+                backend.source = (model_path, num_classes)
+                return backend
+        except Exception as e:
+            logger.warning(f"Inference backend '{name}' failed to load: {e}")
+    return None
+
+
+def _reload_backend(backend_cls, settings: ModelConfig, source: Tuple[str, int]) -> InferenceBackend:
+    """Unpickle a backend by loading its model again (in a worker process)"""
+    import torch
+
+    # As in the app process, oneDNN starts disabled until the optimizer's self-check enables it
+    torch.backends.mkldnn.enabled = False
+    backend = backend_cls(settings)
+    if not backend.load(*source):
+        raise RuntimeError(f"Inference backend '{backend_cls.name}' could not load {source[0]}")
+    backend.source = source
+    return backend
+
+
+def _attach_backend(backend_cls, settings: ModelConfig, source: Tuple[str, int], model: "nn.Module",
+                    onednn: bool) -> InferenceBackend:
+    """Unpickle a backend around weights the parent put in shared memory (in a worker process)"""
+    import torch
+
+    torch.backends.mkldnn.enabled = onednn  # as chosen by the parent's self-check
+    backend = backend_cls(settings)
+    backend.model = backend.shared_model = model
+    backend.source = source
+    return backend
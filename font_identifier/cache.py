@@ -0,0 +1,195 @@
+"""
+Prediction cache for Font Identifier
+Stores results in SQLite keyed by the SHA-256 of the uploaded bytes, the model version
+and the prediction variant, so repeated uploads skip decoding and the forward pass
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+from .download import file_sha256
+from .labels import BASE_DIR
+from .settings import ModelConfig
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# Evict down to this fraction of the size cap, so eviction does not run on every insert
+EVICT_TO = 0.9
+# Log a stats line every N lookups
+STATS_EVERY = 1000
+
+_versions: Dict[tuple, str] = {}
+_versions_lock = threading.Lock()
+
+
+def model_version(model_path: str) -> str:
+    """Short content hash of the model file, memoized by path, size and mtime"""
+    stat = os.stat(model_path)
+    memo_key = (os.path.abspath(model_path), stat.st_size, stat.st_mtime_ns)
+    with _versions_lock:
+        version = _versions.get(memo_key)
+    if version is None:
+        version = file_sha256(model_path)[:16]
+        with _versions_lock:
+            _versions[memo_key] = version
+    return version
+
+
+def prediction_variant(mode: str, settings: ModelConfig, k: Optional[int] = None) -> str:
+    """Everything besides the image and the model that changes a result"""
+    k = k or settings.top_k
+    if mode == "regions":
+        return f"regions:k={k}:max={settings.max_regions}"
+    if mode == "tiled":
+        return f"tiled:k={k}:stride={settings.tile_stride}:max={settings.max_tiles}"
+    return f"{mode}:k={k}"
+
+
+class PredictionCache:
+    """
+    LRU cache of prediction results under a size cap, shared by every process using the
+    same database file. Entries for other model versions are never returned and are
+    evicted first, so swapping model.pth invalidates the cache without a flush.
+    `version` may be a callable, for a model that can change underneath (the daemon's).
+    """
+
+    def __init__(self, path: str, max_bytes: int, version: Union[str, Callable[[], str]]):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._version = version
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._bytes_saved = 0
+        self._evictions = 0
+        self._size = self._connect().execute("SELECT total(size) FROM predictions").fetchone()[0]
+
+    @property
+    def version(self) -> str:
+        return self._version() if callable(self._version) else self._version
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and process (connections must not cross a fork)
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("""CREATE TABLE IF NOT EXISTS predictions (
+                digest TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (digest, variant, model_version))""")
+            con.execute("CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions(last_used)")
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    def get(self, data: bytes, variant: str, digest: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Stored result for `data`; pass its SHA-256 hex `digest` if already computed"""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        version = self.version
+        try:
+            con = self._connect()
+            row = con.execute("SELECT result FROM predictions WHERE digest=? AND variant=? AND model_version=?",
+                              (digest, variant, version)).fetchone()
+            if row is not None:
+                con.execute("UPDATE predictions SET last_used=? WHERE digest=? AND variant=? AND model_version=?",
+                            (time.time(), digest, variant, version))
+        except sqlite3.Error as e:
+            logger.warning(f"Prediction cache lookup failed: {e}")
+            row = None
+        with self._lock:
+            if row is not None:
+                self._hits += 1
+                self._bytes_saved += len(data)
+            else:
+                self._misses += 1
+            lookups = self._hits + self._misses
+        if lookups % STATS_EVERY == 0:
+            logger.info(f"Prediction cache: {json.dumps(self.stats())}")
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, data: bytes, variant: str, result: Dict[str, Any], digest: Optional[str] = None):
+        digest = digest or hashlib.sha256(data).hexdigest()
+        payload = json.dumps(result)
+        version = self.version
+        size = len(payload) + len(digest) + len(variant) + len(version)
+        try:
+            con = self._connect()
+            con.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)",
+                        (digest, variant, version, payload, size, time.time()))
+            with self._lock:
+                self._size += size
+                over = self._size > self.max_bytes
+            if over:
+                self._evict(con)
+        except sqlite3.Error as e:
+            logger.warning(f"Prediction cache insert failed: {e}")
+
+    def _evict(self, con: sqlite3.Connection):
+        # Other processes write too: start from the real total
+        total = con.execute("SELECT total(size) FROM predictions").fetchone()[0]
+        target = self.max_bytes * EVICT_TO
+        evicted = 0
+        while total > target:
+            rows = con.execute("SELECT rowid, size FROM predictions ORDER BY model_version = ?, last_used LIMIT 256",
+                               (self.version,)).fetchall()
+            if not rows:
+                break
+            drop = []
+            for rowid, size in rows:
+                drop.append((rowid,))
+                total -= size
+                if total <= target:
+                    break
+            con.executemany("DELETE FROM predictions WHERE rowid=?", drop)
+            evicted += len(drop)
+        with self._lock:
+            self._size = total
+            self._evictions += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "bytes_saved": self._bytes_saved,
+                "evictions": self._evictions,
+                "size_bytes": int(self._size),
+                "max_bytes": self.max_bytes,
+                "model_version": self.version,
+            }
+
+
+def open_prediction_cache(settings: ModelConfig,
+                          version: Union[str, Callable[[], str], None] = None) -> Optional[PredictionCache]:
+    """
+    The configured cache, or None if disabled or unavailable. Results are keyed by `version`,
+    by default the configured model file's.
+    """
+    if not settings.prediction_cache:
+        return None
+    from .model import resolve_model_path
+
+    path = settings.prediction_cache
+    if not os.path.isabs(path):
+        path = os.path.join(BASE_DIR, path)
+    try:
+        return PredictionCache(path, settings.prediction_cache_mb * MB,
+                               version or model_version(resolve_model_path(settings.path)))
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Prediction cache disabled: {e}")
+        return None
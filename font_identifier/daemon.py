@@ -0,0 +1,466 @@
+"""
+Host-level inference daemon for Font Identifier
+Loads the model once per host and serves batched forwards to every Streamlit
+replica over a Unix domain socket
+
+Usage:
+    python daemon.py [--socket /tmp/font_identifier.sock] [--model model.pth]
+
+Framing (all integers big-endian):
+    header   magic "FI" | version u8 | kind u8 | payload length u32
+    PREDICT  n, c, h, w u32 | float32 little-endian input tensor
+    RESULT   n, classes u32 | float32 little-endian logits
+    PING     (empty)            -> PONG  JSON {"backend", "num_classes", "model_version", "pid"}
+    ERROR    UTF-8 message
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Callable, Dict, Any, Optional, Tuple
+
+import numpy as np
+import torch
+
+from .backends import InferenceBackend
+from .settings import ModelConfig
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FI"
+VERSION = 1
+HEADER = struct.Struct("!2sBBI")
+SHAPE = struct.Struct("!4I")
+RESULT_SHAPE = struct.Struct("!2I")
+MAX_PAYLOAD = 64 * 1024 * 1024  # ~110 preprocessed images per request
+
+PREDICT = 0x01
+PING = 0x02
+RESULT = 0x81
+PONG = 0x82
+ERROR = 0xFF
+
+# After a failed connection, use the in-process model for this long before probing the daemon again;
+# replicas that started without a daemon also look for one this often
+RETRY_INTERVAL = 30.0
+# The daemon may hot-swap its model: the model_version of its last PONG is trusted for this long
+VERSION_CHECK_INTERVAL = 5.0
+
+
+class DaemonError(RuntimeError):
+    """The daemon answered with an error frame"""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("Inference daemon closed the connection")
+        received += n
+    return buf
+
+
+def _frame(kind: int, payload: bytes = b"") -> bytes:
+    return HEADER.pack(MAGIC, VERSION, kind, len(payload)) + payload
+
+
+def encode_tensor(shape_struct: struct.Struct, tensor: torch.Tensor) -> bytes:
+    array = tensor.detach().to(torch.float32).contiguous().numpy().astype("<f4", copy=False)
+    return shape_struct.pack(*array.shape) + array.tobytes()
+
+
+def decode_tensor(shape_struct: struct.Struct, payload: bytearray) -> torch.Tensor:
+    shape = shape_struct.unpack_from(payload)
+    array = np.frombuffer(payload, dtype="<f4", offset=shape_struct.size)
+    if array.size != int(np.prod(shape)):
+        raise ValueError(f"Tensor payload does not match shape {shape}")
+    return torch.from_numpy(array.reshape(shape))
+
+
+# ----------------------------------------------------------------------
+# Client
+# ----------------------------------------------------------------------
+
+class DaemonClient:
+    """Thread-safe client; each thread keeps its own persistent connection"""
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.info: Dict[str, Any] = {}  # the latest PONG: which model the daemon serves
+        self.info_at = 0.0
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _request(self, kind: int, payload: bytes = b"") -> Tuple[int, bytearray]:
+        sock = self._connection()
+        try:
+            sock.sendall(_frame(kind, payload))
+            magic, version, reply_kind, length = HEADER.unpack(_recv_exact(sock, HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ConnectionError("Unexpected reply from inference daemon")
+            body = _recv_exact(sock, length)
+        except Exception:
+            self.reset()
+            raise
+        if reply_kind == ERROR:
+            raise DaemonError(body.decode("utf-8", "replace"))
+        return reply_kind, body
+
+    def ping(self) -> Dict[str, Any]:
+        _, body = self._request(PING)
+        self.info = json.loads(body.decode("utf-8"))
+        self.info_at = time.monotonic()
+        return self.info
+
+    def infer(self, batch: torch.Tensor) -> torch.Tensor:
+        """(N, C, H, W) inputs -> (N, classes) logits computed by the daemon"""
+        if batch.dim() == 3:
+            batch = batch.unsqueeze(0)
+        _, body = self._request(PREDICT, encode_tensor(SHAPE, batch))
+        return decode_tensor(RESULT_SHAPE, body)
+
+    def reset(self):
+        """Drop this thread's connection (reconnects on the next request)"""
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+
+def connect_daemon(socket_path: str, num_classes: int, timeout: float = 30.0) -> Optional[DaemonClient]:
+    """Client for a reachable daemon serving a model with `num_classes` outputs; None otherwise"""
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+    client = DaemonClient(socket_path, timeout)
+    try:
+        info = client.ping()
+    except Exception:
+        return None
+    if info.get("num_classes") != num_classes:
+        logger.warning(f"Inference daemon at {socket_path} serves {info.get('num_classes')} classes, "
+                       f"expected {num_classes}; using the in-process model")
+        return None
+    return client
+
+
+class DaemonBackend(InferenceBackend):
+    """
+    Forwards batches to the host inference daemon.
+
+    If the daemon becomes unreachable, the in-process backend from `fallback`
+    is loaded (once) and used until the daemon answers again. Every RETRY_INTERVAL
+    the daemon is probed with a PING before it is used again, so a daemon restarted
+    with another model is noticed (class count check, model_version for the cache). A model
+    the daemon hot-swapped is noticed within VERSION_CHECK_INTERVAL.
+    """
+
+    name = "daemon"
+
+    def __init__(self, client: DaemonClient, fallback: Callable[[], Optional[InferenceBackend]],
+                 settings: Optional[ModelConfig] = None):
+        super().__init__(settings)
+        self.client = client
+        self._fallback = fallback
+        self._local_backend: Optional[InferenceBackend] = None
+        self._lock = threading.Lock()
+        self._daemon_down_until = 0.0
+
+    def load(self, model_path: str, num_classes: int) -> bool:
+        return True
+
+    def __reduce__(self):
+        # A worker process connects on its own and falls back to loading `source` itself
+        return _reconnect, (self.client.socket_path, self.client.timeout, self.settings, self.source)
+
+    def local_backend(self) -> InferenceBackend:
+        with self._lock:
+            if self._local_backend is None:
+                logger.warning("Inference daemon unavailable; loading the model in-process")
+                self._local_backend = self._fallback()
+            if self._local_backend is None:
+                raise RuntimeError("Inference daemon unavailable and the model could not be loaded")
+            return self._local_backend
+
+    @property
+    def model_version(self) -> Optional[str]:
+        if self._daemon_down_until and self._local_backend is not None:
+            return self._local_backend.model_version
+        if time.monotonic() - self.client.info_at > VERSION_CHECK_INTERVAL:
+            try:
+                self.client.ping()
+            except Exception:
+                pass  # infer_batch notices and falls back
+        # Daemons predating the field: assume the configured model file
+        return self.client.info.get("model_version") or super().model_version
+
+    def _probe(self):
+        """Handshake with a daemon that was unreachable; ConnectionError if it serves another model"""
+        info = self.client.ping()
+        num_classes = self.source[1] if self.source else info.get("num_classes")
+        if info.get("num_classes") != num_classes:
+            raise ConnectionError(f"Inference daemon now serves {info.get('num_classes')} classes, "
+                                  f"expected {num_classes}")
+        logger.info(f"Inference daemon is back (model {info.get('model_version')}); using it again")
+        self._daemon_down_until = 0.0
+
+    def infer_batch(self, batch: torch.Tensor) -> torch.Tensor:
+        if time.monotonic() >= self._daemon_down_until:
+            try:
+                if self._daemon_down_until:
+                    self._probe()
+                return self.client.infer(batch)
+            except (OSError, ConnectionError) as e:
+                if not self._daemon_down_until:
+                    logger.warning(f"Inference daemon unavailable: {e}")
+                self._daemon_down_until = time.monotonic() + RETRY_INTERVAL
+        return self.local_backend().infer_batch(batch)
+
+    def warmup(self, batch_sizes=(1,)):
+        # The daemon warms up before it starts listening
+        self.client.ping()
+
+    def after_fork(self, num_threads: int):
+        super().after_fork(num_threads)
+        self.client = DaemonClient(self.client.socket_path, self.client.timeout)
+        if self._local_backend is not None:
+            self._local_backend.after_fork(num_threads)
+
+
+def _reconnect(socket_path: str, timeout: float, settings: ModelConfig,
+               source: Optional[Tuple[str, int]]) -> DaemonBackend:
+    """Unpickle a DaemonBackend (in a worker process)"""
+    from .backends import create_backend
+
+    fallback = (lambda: create_backend(*source, settings)) if source else (lambda: None)
+    backend = DaemonBackend(DaemonClient(socket_path, timeout), fallback, settings)
+    backend.source = source
+    return backend
+
+
+# ----------------------------------------------------------------------
+# Server
+# ----------------------------------------------------------------------
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        with self.server.connections_lock:
+            self.server.connections.add(self.connection)
+
+    def finish(self):
+        with self.server.connections_lock:
+            self.server.connections.discard(self.connection)
+        super().finish()
+
+    def handle(self):
+        server: "InferenceDaemon" = self.server
+        while True:
+            header = self.rfile.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            magic, version, kind, length = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or length > MAX_PAYLOAD:
+                self.wfile.write(_frame(ERROR, b"bad frame"))
+                return
+            payload = bytearray(self.rfile.read(length))
+            if len(payload) < length:
+                return
+            self.wfile.write(server.respond(kind, payload))
+
+
+class InferenceDaemon(socketserver.ThreadingUnixStreamServer):
+    """
+    Unix socket server; requests from all connections share one micro-batching dispatcher.
+    Given `load`, the model file is watched every MODEL_HOT_SWAP_INTERVAL seconds and a changed
+    one is swapped in as in a replica (hotswap.ModelManager): requests in flight finish on the
+    version they started with, and clients see the new model_version in their next PONG.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, backend: InferenceBackend, num_classes: int,
+                 settings: Optional[ModelConfig] = None, load: Optional[Callable[[], Any]] = None,
+                 prepare: Callable[[], None] = lambda: None):
+        from .hotswap import ModelManager
+
+        self.settings = settings or ModelConfig()
+        self.num_classes = num_classes
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        self._dispatchers: Dict[int, Any] = {}  # id(backend) -> its micro-batching dispatcher
+        self._dispatchers_lock = threading.Lock()
+        model_path = backend.source[0] if backend.source else ""
+        self.manager = ModelManager(backend, model_path, load or (lambda: None), self._release,
+                                    self.settings.hot_swap_interval, prepare)
+        self._dispatcher(backend)
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o660)
+        if load is not None and self.settings.hot_swap_interval > 0:
+            self.manager.watch()
+
+    @property
+    def backend(self) -> InferenceBackend:
+        return self.manager.backend
+
+    def _dispatcher(self, backend: InferenceBackend):
+        if not self.settings.batching_enabled:
+            return None
+        from .inference import InferenceDispatcher
+
+        with self._dispatchers_lock:
+            dispatcher = self._dispatchers.get(id(backend))
+            if dispatcher is None:
+                dispatcher = self._dispatchers[id(backend)] = InferenceDispatcher(
+                    backend,
+                    max_batch_size=self.settings.max_batch_size,
+                    batch_window_ms=self.settings.batch_window_ms,
+                    max_queue_depth=self.settings.max_queue_depth,
+                )
+            return dispatcher
+
+    def _release(self, backend: InferenceBackend):
+        """Close the dispatcher of a model version retired by a hot swap"""
+        with self._dispatchers_lock:
+            dispatcher = self._dispatchers.pop(id(backend), None)
+        if dispatcher is not None:
+            dispatcher.close()
+
+    def respond(self, kind: int, payload: bytearray) -> bytes:
+        try:
+            with self.manager.lease() as backend:
+                if kind == PING:
+                    info = {"backend": backend.name, "num_classes": self.num_classes,
+                            "model_version": backend.model_version, "pid": os.getpid()}
+                    return _frame(PONG, json.dumps(info).encode("utf-8"))
+                if kind == PREDICT:
+                    batch = decode_tensor(SHAPE, payload)
+                    dispatcher = self._dispatcher(backend)
+                    if dispatcher is not None:
+                        outputs = dispatcher.infer(batch)
+                    else:
+                        outputs = backend.infer_batch(batch)
+                    return _frame(RESULT, encode_tensor(RESULT_SHAPE, outputs))
+            return _frame(ERROR, f"unknown request kind {kind}".encode("utf-8"))
+        except Exception as e:
+            return _frame(ERROR, str(e).encode("utf-8"))
+
+    def server_close(self):
+        self.manager.stop()
+        super().server_close()
+        with self.connections_lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        with self._dispatchers_lock:
+            dispatchers, self._dispatchers = list(self._dispatchers.values()), {}
+        for dispatcher in dispatchers:
+            dispatcher.close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def _remove_stale_socket(socket_path: str):
+    """Remove a socket file left by a dead daemon; refuse to start if another daemon is listening"""
+    if not os.path.exists(socket_path):
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+    else:
+        raise RuntimeError(f"Another inference daemon is listening on {socket_path}")
+    finally:
+        probe.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the font model to local Streamlit replicas")
+    parser.add_argument("--socket", help="Unix socket path (default: MODEL_DAEMON_SOCKET / config)")
+    parser.add_argument("--model", help="Path to model.pth (default: config)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from .backends import create_backend
+    from .health import serving_batch_sizes
+    from .labels import read_class_names
+    from .model import get_model_settings, prepare_replacement, resolve_model_path, validate_model_file
+    from .threads import apply_thread_budget
+
+    settings = get_model_settings()
+    socket_path = args.socket or settings.daemon_socket
+    model_path = resolve_model_path(args.model or settings.path)
+
+    num_classes = len(read_class_names())
+    apply_thread_budget(settings)
+
+    def warm(candidate: InferenceBackend):
+        if settings.warmup_enabled:
+            started = time.perf_counter()
+            for _ in range(max(1, settings.warmup_rounds)):
+                candidate.warmup(serving_batch_sizes(settings))
+            logger.info("Model warmup finished in %.2fs", time.perf_counter() - started)
+
+    def load_replacement() -> Optional[InferenceBackend]:
+        """A changed model file, loaded and warmed next to the serving one (MODEL_HOT_SWAP_INTERVAL)"""
+        if not validate_model_file(model_path):
+            return None
+        replacement = create_backend(model_path, num_classes, settings)
+        if replacement is not None:
+            replacement.model_version  # hash the new file before it serves
+            warm(replacement)
+        return replacement
+
+    backend = create_backend(model_path, num_classes, settings)
+    if backend is None:
+        raise SystemExit(f"Could not load model from {model_path}")
+    warm(backend)
+
+    # Listen only once warmed up: a reachable daemon is a ready daemon
+    server = InferenceDaemon(socket_path, backend, num_classes, settings, load_replacement,
+                             lambda: prepare_replacement(settings, model_path))
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logger.info("Inference daemon (%s backend, %d classes) listening on %s", backend.name, num_classes,
+                socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Model download for Font Identifier
+Parallel HTTP range requests into a temp file that survives interruptions, the fastest of
+several mirrors, SHA-256 verification and an atomic rename into place
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 8 * 1024 * 1024  # bytes per range request
+PARALLEL_CHUNKS = 4
+PROBE_BYTES = 256 * 1024  # fetched from every mirror to pick the fastest
+READ_SIZE = 1024 * 1024
+ATTEMPTS = 3  # per chunk, across mirrors
+TIMEOUT = (10, 60)  # connect, read (seconds)
+
+
+class DownloadError(Exception):
+    pass
+
+
+@dataclass
+class Mirror:
+    url: str
+    size: Optional[int]  # None if the server did not report it
+    ranges: bool  # server honours Range requests
+    bytes_per_second: float
+
+
+def part_path(path: str) -> str:
+    return path + ".part"
+
+
+def _state_path(path: str) -> str:
+    return path + ".part.json"
+
+
+def file_sha256(path: str, chunk_size: int = READ_SIZE) -> str:
+    """Hex SHA-256 of a file, read in chunks (model files, store objects, cache keys)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_write_lock = threading.Lock()
+
+
+def _pwrite(fd: int, data: bytes, offset: int):
+    if hasattr(os, "pwrite"):
+        os.pwrite(fd, data, offset)
+        return
+    # Windows: no positional writes
+    with _write_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        os.write(fd, data)
+
+
+def _session():
+    import requests
+
+    session = requests.Session()
+    session.headers["Accept-Encoding"] = "identity"  # byte ranges must refer to the stored file
+    return session
+
+
+def probe(url: str, session=None) -> Mirror:
+    """Fetch the first PROBE_BYTES to learn size, range support and throughput"""
+    session = session or _session()
+    started = time.perf_counter()
+    with session.get(url, headers={"Range": f"bytes=0-{PROBE_BYTES - 1}"}, stream=True, timeout=TIMEOUT) as r:
+        r.raise_for_status()
+        received = 0
+        for block in r.iter_content(READ_SIZE):
+            received += len(block)
+            if received >= PROBE_BYTES:
+                break
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        if r.status_code == 206 and "/" in r.headers.get("Content-Range", ""):
+            total = r.headers["Content-Range"].rsplit("/", 1)[1]
+            return Mirror(url, int(total) if total.isdigit() else None, True, received / elapsed)
+        length = r.headers.get("Content-Length")
+        return Mirror(url, int(length) if length and length.isdigit() else None, False, received / elapsed)
+
+
+def rank_mirrors(urls: Sequence[str]) -> List[Mirror]:
+    """Probe all mirrors concurrently; reachable ones, fastest first"""
+    mirrors = []
+    with ThreadPoolExecutor(max_workers=max(1, len(urls))) as pool:
+        futures = {pool.submit(probe, url): url for url in urls}
+        for future in as_completed(futures):
+            try:
+                mirrors.append(future.result())
+            except Exception as e:
+                logger.warning(f"Model mirror {futures[future]} unavailable: {e}")
+    return sorted(mirrors, key=lambda m: m.bytes_per_second, reverse=True)
+
+
+class _PartState:
+    """Which chunks of the .part file are complete, persisted next to it for resuming"""
+
+    def __init__(self, path: str, size: int, sha256: Optional[str]):
+        self.path = _state_path(path)
+        self.key = {"size": size, "chunk_size": CHUNK_SIZE, "sha256": sha256}
+        self.done = set()
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+            if saved.get("key") == self.key and os.path.getsize(part_path(path)) == size:
+                self.done = set(saved.get("done", []))
+        except (OSError, ValueError):
+            pass
+
+    def mark(self, index: int):
+        with self._lock:
+            self.done.add(index)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"key": self.key, "done": sorted(self.done)}, f)
+            os.replace(tmp, self.path)
+
+
+def _fetch_range(session, mirrors: List[Mirror], fd: int, start: int, end: int):
+    """Write bytes [start, end] at their offset, trying the mirrors in order"""
+    error = None
+    for attempt in range(ATTEMPTS):
+        mirror = mirrors[attempt % len(mirrors)]
+        offset = start
+        try:
+            with session.get(mirror.url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=TIMEOUT) as r:
+                if r.status_code != 206:
+                    raise DownloadError(f"{mirror.url} answered {r.status_code} to a range request")
+                for block in r.iter_content(READ_SIZE):
+                    _pwrite(fd, block, offset)
+                    offset += len(block)
+            if offset != end + 1:
+                raise DownloadError(f"{mirror.url} sent {offset - start} of {end + 1 - start} bytes")
+            return
+        except Exception as e:
+            error = e
+    raise DownloadError(f"bytes {start}-{end}: {error}")
+
+
+def _download_ranges(mirrors: List[Mirror], path: str, size: int, sha256: Optional[str], workers: int):
+    part = part_path(path)
+    state = _PartState(path, size, sha256)
+    if not state.done:
+        with open(part, "wb") as f:
+            f.truncate(size)
+    chunks = [(i, start, min(start + CHUNK_SIZE, size) - 1) for i, start in enumerate(range(0, size, CHUNK_SIZE))]
+    todo = [c for c in chunks if c[0] not in state.done]
+    if len(todo) < len(chunks):
+        logger.info(f"Resuming model download: {len(chunks) - len(todo)}/{len(chunks)} chunks already present")
+
+    session = _session()
+    fd = os.open(part, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model-download") as pool:
+            futures = {pool.submit(_fetch_range, session, mirrors, fd, start, end): index
+                       for index, start, end in todo}
+            for future in as_completed(futures):
+                future.result()
+                state.mark(futures[future])
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _download_stream(mirror: Mirror, path: str):
+    """Single request for servers without range support (no resume)"""
+    with _session().get(mirror.url, stream=True, timeout=TIMEOUT) as r:
+        r.raise_for_status()
+        with open(part_path(path), "wb") as f:
+            for block in r.iter_content(READ_SIZE):
+                f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def download_model(urls: Sequence[str], path: str, sha256: Optional[str] = None,
+                   workers: int = PARALLEL_CHUNKS) -> bool:
+    """
+    Download `path` from the fastest reachable mirror in `urls`.
+    - Parallel range requests into `<path>.part`; an interrupted download resumes
+      from the completed chunks recorded in `<path>.part.json`
+    - Chunks that fail are retried on the other mirrors
+    - Verifies `sha256` when given, then renames into place, so `path` is never partial
+    Returns False if every mirror failed or the checksum does not match.
+    """
+    urls = [u for u in dict.fromkeys(urls) if u]
+    if not urls:
+        return False
+    mirrors = rank_mirrors(urls)
+    if not mirrors:
+        return False
+    best = mirrors[0]
+    logger.info(f"Downloading model from {best.url} ({best.bytes_per_second / 1e6:.1f} MB/s probe)")
+
+    ranged = [m for m in mirrors if m.ranges and m.size == best.size]
+    try:
+        if best.ranges and best.size:
+            _download_ranges(ranged, path, best.size, sha256, workers)
+        else:
+            _download_stream(best, path)
+    except Exception as e:
+        logger.warning(f"Model download failed: {e}")
+        return False
+
+    part = part_path(path)
+    if sha256:
+        actual = file_sha256(part)
+        if actual != sha256.lower():
+            logger.warning(f"Model download checksum mismatch (expected {sha256}, got {actual}); discarding")
+            for leftover in (part, _state_path(path)):
+                try:
+                    os.remove(leftover)
+                except OSError:
+                    pass
+            return False
+    else:
+        logger.warning("No MODEL_SHA256 published; the downloaded model is not verified")
+    os.replace(part, path)
+    try:
+        os.remove(_state_path(path))
+    except OSError:
+        pass
+    return True
@@ -0,0 +1,125 @@
+"""
+Model readiness tracking for Font Identifier
+Keeps a process-wide readiness state and, for services that configure one, mirrors it
+to a per-service status file the container health probe can read (see healthcheck.py)
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+def ready_file(service: str, port) -> str:
+    """
+    Status file of one service instance, e.g. /tmp/font_identifier-streamlit-8501.ready.
+    FONTID_READY_FILE overrides it (set it per container/service, not host-wide).
+    """
+    return os.getenv("FONTID_READY_FILE") or os.path.join(tempfile.gettempdir(),
+                                                          f"font_identifier-{service}-{port}.ready")
+
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """Thread-safe readiness state; only READY means the model is warmed and serving"""
+
+    def __init__(self, status_file: Optional[str] = None):
+        self.status_file = status_file
+        self._lock = threading.Lock()
+        self._state = LOADING
+        self._detail: Dict[str, Any] = {}
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def is_ready(self) -> bool:
+        return self._state == READY
+
+    def set(self, state: str, **detail):
+        with self._lock:
+            self._state = state
+            self._detail = detail
+            self._write()
+
+    def configure(self, status_file: Optional[str]):
+        """Mirror the state to `status_file` from now on (None: keep it in memory only)"""
+        with self._lock:
+            if status_file == self.status_file:
+                return
+            self.status_file = status_file
+            self._write()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._detail, state=self._state, ready=self._state == READY)
+
+    def _write(self):
+        if not self.status_file:
+            return
+        payload = dict(self._detail, state=self._state, pid=os.getpid(), updated=time.time())
+        tmp_path = f"{self.status_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.status_file)
+        except OSError as e:
+            logger.warning(f"Could not write readiness file {self.status_file}: {e}")
+
+
+# Process-wide instance; batch jobs and other tools leave it without a status file, so they
+# never overwrite the state a server's health probe reads
+readiness = Readiness()
+
+
+def serving_batch_sizes(model_config) -> Sequence[int]:
+    """Batch sizes the app produces: 1, powers of two up to max_batch_size, and the tile/region caps"""
+    sizes = {1, model_config.max_batch_size, model_config.max_tiles, model_config.max_regions}
+    size = 2
+    while size < model_config.max_batch_size:
+        sizes.add(size)
+        size *= 2
+    return sorted(sizes)
+
+
+def warmup(backend, batch_sizes: Sequence[int], rounds: int = 1,
+           state: Readiness = readiness) -> float:
+    """Run dummy batches at every size, then mark the model ready. Returns the duration in seconds."""
+    state.set(WARMING, backend=getattr(backend, "name", ""), batch_sizes=list(batch_sizes))
+    started = time.perf_counter()
+    try:
+        for _ in range(max(1, rounds)):
+            backend.warmup(batch_sizes)
+    except Exception as e:
+        state.set(FAILED, error=str(e))
+        logger.warning(f"Model warmup failed: {e}")
+        raise
+    elapsed = time.perf_counter() - started
+    state.set(READY, backend=getattr(backend, "name", ""), warmup_seconds=round(elapsed, 3))
+    logger.info("Model warmup finished in %.2fs (batch sizes %s)", elapsed, list(batch_sizes))
+    return elapsed
+
+
+def start_warmup(backend, batch_sizes: Sequence[int], rounds: int = 1,
+                 state: Readiness = readiness) -> threading.Thread:
+    """Warm up on a background thread so the UI can render while the model gets ready"""
+    state.set(WARMING, backend=getattr(backend, "name", ""), batch_sizes=list(batch_sizes))
+
+    def _run():
+        try:
+            warmup(backend, batch_sizes, rounds, state)
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=_run, name="font-model-warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,279 @@
+"""
+Model hot-swap for Font Identifier
+Watches the model file, loads and warms its replacement next to the serving model and
+switches to it in one step; the previous version is freed once no request holds it
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .health import READY, readiness
+
+logger = logging.getLogger(__name__)
+
+# Seconds between RSS samples while a replacement loads
+MEMORY_SAMPLE_INTERVAL = 0.02
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process; None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _mb(value: Optional[int]) -> Optional[float]:
+    return None if value is None else round(value / 2**20, 1)
+
+
+class MemoryMonitor:
+    """Samples RSS on a background thread while the block runs, keeping the peak"""
+
+    def __init__(self, interval: float = MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start = self.peak = self.end = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> "MemoryMonitor":
+        self.start = self.peak = rss_bytes()
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._run, name="font-model-rss", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        self.end = rss_bytes()
+
+    def _sample(self):
+        value = rss_bytes()
+        if value is not None and (self.peak is None or value > self.peak):
+            self.peak = value
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """
+    (size, mtime_ns) of the file behind `path`, following symlinks; None if missing.
+    Store links (model_store.py) keep the object's mtime, so re-linking the same
+    content is not a change, while repointing a symlink to another file is.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ModelVersion:
+    """One loaded model and the number of requests currently using it"""
+
+    def __init__(self, backend: Any, stamp: Optional[Tuple[int, int]], number: int):
+        self.backend = backend
+        self.stamp = stamp
+        self.number = number
+        self.loaded_at = time.time()
+        self.refs = 0
+        self.retired = False
+
+
+class ModelManager:
+    """
+    Double-buffered model. Requests acquire() the current version and release it when done.
+    When the model file changes, its replacement is loaded and warmed while the current
+    version keeps serving, then becomes current in one step under the lock. Requests
+    already holding the old version finish on it; once its last one releases it, its
+    dispatcher, worker pool and caches are closed (`release`) and the weights are freed.
+    Peak memory is therefore two models, for the length of the swap.
+    `prepare` runs on the changed file before it is stamped and loaded, so a step that
+    relinks it (the shared model store) is not seen as another change.
+    """
+
+    def __init__(self, backend: Any, model_path: str, load: Callable[[], Any],
+                 release: Callable[[Any], None] = lambda backend: None, interval: float = 0.0,
+                 prepare: Callable[[], None] = lambda: None):
+        self.model_path = model_path
+        self.interval = interval
+        self._load = load
+        self._release = release
+        self._prepare = prepare
+        self._lock = threading.Lock()
+        self._swap_lock = threading.Lock()  # one replacement loading at a time
+        self._current = ModelVersion(backend, file_stamp(model_path), 1)
+        self._retired: List[ModelVersion] = []
+        self._pending = None  # changed stamp seen once; swapped if unchanged at the next check
+        self._failed = None  # stamp that did not load; retried only after another change
+        self._swapping = False
+        self._swaps = 0
+        self._last_swap: Dict[str, Any] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def backend(self) -> Any:
+        return self._current.backend
+
+    @property
+    def version(self) -> int:
+        return self._current.number
+
+    def acquire(self) -> ModelVersion:
+        with self._lock:
+            version = self._current
+            version.refs += 1
+            return version
+
+    def release(self, version: ModelVersion):
+        with self._lock:
+            version.refs -= 1
+            free = version.retired and version.refs == 0
+        if free:
+            self._free(version)
+
+    @contextmanager
+    def lease(self) -> Iterator[Any]:
+        """The current backend, kept alive until the block exits even if a swap happens meanwhile"""
+        version = self.acquire()
+        try:
+            yield version.backend
+        finally:
+            self.release(version)
+
+    def watch(self) -> threading.Thread:
+        """Check the model file every `interval` seconds on a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="font-model-watch", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"Model file check failed: {e}")
+
+    def check(self) -> bool:
+        """Swap in the model file if it changed and has not changed since the previous check"""
+        stamp = file_stamp(self.model_path)
+        if stamp is None or stamp == self._current.stamp or stamp == self._failed:
+            self._pending = None
+            return False
+        if stamp != self._pending:
+            self._pending = stamp  # possibly still being written; look again next time
+            return False
+        self._pending = None
+        return self.swap()
+
+    def swap(self, load: Optional[Callable[[], Any]] = None) -> bool:
+        """
+        Load and warm the model file now (or take the backend from `load`) and make it
+        current; False (old one kept) if it fails
+        """
+        with self._swap_lock:
+            if load is None:
+                load = self._load
+                try:
+                    self._prepare()
+                except Exception as e:
+                    logger.warning(f"Preparing the changed model file failed: {e}")
+            stamp = file_stamp(self.model_path)
+            self._swapping = True
+            started = time.perf_counter()
+            try:
+                with MemoryMonitor() as memory:
+                    try:
+                        backend = load()
+                    except Exception as e:
+                        logger.warning(f"Could not load the changed model file: {e}")
+                        backend = None
+            finally:
+                self._swapping = False
+            if backend is None:
+                self._failed = stamp
+                logger.warning(f"Model file changed but did not load; still serving version {self.version}")
+                return False
+
+            with self._lock:
+                old = self._current
+                self._current = ModelVersion(backend, stamp, old.number + 1)
+                old.retired = True
+                self._retired.append(old)
+                free = old.refs == 0
+                self._swaps += 1
+                self._last_swap = {
+                    "version": self._current.number,
+                    "retired_version": old.number,
+                    "at": round(time.time(), 3),
+                    "load_seconds": round(time.perf_counter() - started, 3),
+                    "rss_before_mb": _mb(memory.start),
+                    "rss_peak_mb": _mb(memory.peak),
+                    "rss_after_load_mb": _mb(memory.end),
+                    "rss_after_release_mb": None,
+                    "requests_on_retired": old.refs,
+                }
+            logger.info(f"Model version {self._current.number} is serving "
+                        f"(loaded and warmed in {self._last_swap['load_seconds']:.2f}s, "
+                        f"RSS {_mb(memory.start)} -> peak {_mb(memory.peak)} MB); "
+                        f"version {old.number} has {old.refs} requests in flight")
+            self._publish()
+        if free:
+            self._free(old)
+        return True
+
+    def _free(self, version: ModelVersion):
+        """Close the retired version's resources on a background thread and record RSS afterwards"""
+
+        def run():
+            backend, version.backend = version.backend, None
+            if backend is not None:
+                try:
+                    self._release(backend)
+                except Exception as e:
+                    logger.warning(f"Releasing model version {version.number} failed: {e}")
+            del backend
+            gc.collect()
+            with self._lock:
+                self._retired.remove(version)
+                if self._last_swap.get("retired_version") == version.number:
+                    self._last_swap["rss_after_release_mb"] = _mb(rss_bytes())
+            logger.info(f"Released model version {version.number} (RSS {_mb(rss_bytes())} MB)")
+            self._publish()
+
+        threading.Thread(target=run, name="font-model-release", daemon=True).start()
+
+    def _publish(self):
+        """Mirror swap statistics into the readiness status file (see healthcheck.py)"""
+        backend = self.backend
+        if backend is None:
+            return
+        readiness.set(READY, backend=getattr(backend, "name", ""), hot_swap=self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self._current.number,
+                "swaps": self._swaps,
+                "swapping": self._swapping,
+                "watch_interval": self.interval,
+                "in_flight": self._current.refs,
+                "retired_in_flight": sum(v.refs for v in self._retired),
+                "last_swap": dict(self._last_swap),
+            }
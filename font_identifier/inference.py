@@ -0,0 +1,205 @@
+"""
+Shared micro-batching inference dispatcher for Font Identifier
+Collects prediction requests from all sessions and runs them as batched forwards
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# How many recent waits/batches the statistics are computed over
+STATS_WINDOW = 1024
+# Log a stats line every N batches
+STATS_LOG_EVERY = 100
+
+
+class InferenceQueueFull(RuntimeError):
+    """Raised when the dispatcher queue is at its configured depth"""
+
+
+@dataclass
+class _Request:
+    """A pending forward request (one or more images)"""
+    batch: torch.Tensor
+    future: Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def size(self) -> int:
+        return int(self.batch.shape[0])
+
+
+class InferenceDispatcher:
+    """
+    Micro-batching front for a shared model.
+
+    Callers submit input tensors of shape (N, C, H, W); a single worker thread
+    gathers requests for up to `batch_window_ms` (or until `max_batch_size`
+    rows are collected), runs one forward pass and hands every caller back
+    its own slice of the output.
+    """
+
+    def __init__(self, model: torch.nn.Module, max_batch_size: int = 16,
+                 batch_window_ms: float = 5.0, max_queue_depth: int = 256):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.batch_window = max(0.0, float(batch_window_ms)) / 1000.0
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue(maxsize=max(1, int(max_queue_depth)))
+        self._carry: Optional[_Request] = None
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=STATS_WINDOW)
+        self._batch_sizes = deque(maxlen=STATS_WINDOW)
+        self._total_requests = 0
+        self._total_batches = 0
+        self._rejected = 0
+        self._closed = False
+        self._sentinel_seen = False
+        self._thread = threading.Thread(target=self._run, name="font-inference-dispatcher", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, batch: torch.Tensor) -> Future:
+        """Queue a (N, C, H, W) tensor; the future resolves to the (N, classes) output"""
+        if self._closed:
+            raise RuntimeError("Inference dispatcher is closed")
+        if batch.dim() == 3:
+            batch = batch.unsqueeze(0)
+        request = _Request(batch=batch, future=Future())
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise InferenceQueueFull(f"Inference queue is full ({self._queue.maxsize} requests pending)")
+        return request.future
+
+    def infer(self, batch: torch.Tensor, timeout: Optional[float] = None) -> torch.Tensor:
+        """Blocking helper: submit and wait for the result"""
+        return self.submit(batch).result(timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch fill and queue wait statistics over the recent window"""
+        with self._lock:
+            waits = sorted(self._waits)
+            sizes = list(self._batch_sizes)
+            total_requests = self._total_requests
+            total_batches = self._total_batches
+            rejected = self._rejected
+
+        def _pct(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))] * 1000.0
+
+        mean_size = sum(sizes) / len(sizes) if sizes else 0.0
+        return {
+            "requests": total_requests,
+            "batches": total_batches,
+            "rejected": rejected,
+            "queue_depth": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "mean_batch_size": mean_size,
+            "mean_batch_fill": mean_size / self.max_batch_size,
+            "queue_wait_ms_mean": (sum(waits) / len(waits) * 1000.0) if waits else 0.0,
+            "queue_wait_ms_p50": _pct(0.50),
+            "queue_wait_ms_p95": _pct(0.95),
+            "queue_wait_ms_max": waits[-1] * 1000.0 if waits else 0.0,
+        }
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop the worker after draining queued requests"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # The worker is busy with a full queue; it stops once that is drained (see _collect)
+            pass
+        self._thread.join(timeout)
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _next_request(self, timeout: Optional[float]) -> Optional[_Request]:
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+        return self._queue.get(timeout=timeout) if timeout is None or timeout > 0 else self._queue.get_nowait()
+
+    def _collect(self) -> List[_Request]:
+        """Block for the first request, then gather until the window closes or the batch is full"""
+        if self._sentinel_seen and self._carry is None:
+            return []
+        try:
+            # Once closed, an empty queue means there is nothing left to drain
+            first = self._next_request(0 if self._closed else None)
+        except queue.Empty:
+            return []
+        if first is None:
+            return []
+        batch = [first]
+        rows = first.size
+        deadline = time.perf_counter() + self.batch_window
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._next_request(remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Closing: finish this batch, then stop
+                self._sentinel_seen = True
+                break
+            if rows + request.size > self.max_batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            rows += request.size
+        return batch
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            if not requests:
+                return
+            started = time.perf_counter()
+            try:
+                inputs = torch.cat([r.batch for r in requests], dim=0)
+                with torch.no_grad():
+                    outputs = self.model(inputs)
+            except Exception as e:
+                for r in requests:
+                    r.future.set_exception(e)
+                continue
+
+            offset = 0
+            for r in requests:
+                r.future.set_result(outputs[offset:offset + r.size])
+                offset += r.size
+
+            with self._lock:
+                self._waits.extend(started - r.enqueued_at for r in requests)
+                self._batch_sizes.append(int(inputs.shape[0]))
+                self._total_requests += len(requests)
+                self._total_batches += 1
+                log_now = self._total_batches % STATS_LOG_EVERY == 0
+            if log_now:
+                s = self.stats()
+                logger.info(
+                    "Inference batches: %d, mean fill %.0f%%, queue wait p50 %.1f ms / p95 %.1f ms",
+                    s["batches"], s["mean_batch_fill"] * 100, s["queue_wait_ms_p50"], s["queue_wait_ms_p95"],
+                )
@@ -0,0 +1,93 @@
+"""
+Class label helpers for Font Identifier
+Maps font classes to families and ranks model outputs (top-k fonts and families)
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Dict, Any, List
+
+import torch
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LABELS_PATH = os.path.join("data", "fontlist.txt")
+
+
+def read_class_names(path: str = LABELS_PATH) -> List[str]:
+    """Font class names, one per line of data/fontlist.txt (relative paths resolve from the app root)"""
+    if not os.path.isabs(path):
+        path = os.path.join(BASE_DIR, path)
+    if not os.path.exists(path):
+        # fallback dummy classes
+        return [f"Font_{i}" for i in range(10)]
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def family_of(class_name: str) -> str:
+    """Family part of a class name, e.g. 'AJensonPro-BoldIt' -> 'AJensonPro'"""
+    return class_name.split("-", 1)[0]
+
+
+@dataclass(frozen=True)
+class FamilyIndex:
+    """Precomputed class -> family mapping used to aggregate probabilities"""
+    families: List[str]
+    class_to_family: torch.Tensor  # (num_classes,) int64 family id per class
+
+    @property
+    def num_classes(self) -> int:
+        return int(self.class_to_family.numel())
+
+
+def build_family_index(class_names: List[str]) -> FamilyIndex:
+    """Build the class -> family index once per label set"""
+    families: List[str] = []
+    ids: Dict[str, int] = {}
+    mapping = []
+    for name in class_names:
+        family = family_of(name)
+        if family not in ids:
+            ids[family] = len(families)
+            families.append(family)
+        mapping.append(ids[family])
+    return FamilyIndex(families=families, class_to_family=torch.tensor(mapping, dtype=torch.long))
+
+
+def family_probabilities(probs: torch.Tensor, index: FamilyIndex) -> torch.Tensor:
+    """Sum (N, classes) probabilities into (N, families) with one scatter_add over the batch"""
+    n = min(probs.shape[1], index.num_classes)
+    probs = probs[:, :n]
+    target = index.class_to_family[:n].unsqueeze(0).expand(probs.shape[0], -1)
+    out = probs.new_zeros(probs.shape[0], len(index.families))
+    return out.scatter_add_(1, target, probs)
+
+
+def rank_probabilities(probs: torch.Tensor, class_names: List[str], index: FamilyIndex,
+                       k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Turn (N, classes) probabilities into per-image results:
+    top-1 font, top-k fonts and top-k families with summed confidences.
+    """
+    probs = probs[:, :len(class_names)]
+    fam_probs = family_probabilities(probs, index)
+
+    font_conf, font_idx = torch.topk(probs, min(k, probs.shape[1]), dim=1)
+    fam_conf, fam_idx = torch.topk(fam_probs, min(k, fam_probs.shape[1]), dim=1)
+
+    results = []
+    for fc, fi, gc, gi in zip(font_conf.tolist(), font_idx.tolist(), fam_conf.tolist(), fam_idx.tolist()):
+        top_fonts = [{"font": class_names[i], "confidence": c} for i, c in zip(fi, fc)]
+        results.append({
+            "font": top_fonts[0]["font"],
+            "confidence": top_fonts[0]["confidence"],
+            "top_fonts": top_fonts,
+            "top_families": [{"family": index.families[i], "confidence": c} for i, c in zip(gi, gc)],
+        })
+    return results
+
+
+def rank_predictions(outputs: torch.Tensor, class_names: List[str], index: FamilyIndex,
+                     k: int = 5) -> List[Dict[str, Any]]:
+    """rank_probabilities for raw (N, classes) model outputs"""
+    return rank_probabilities(torch.softmax(outputs.to(torch.float32), dim=1), class_names, index, k)
@@ -0,0 +1,316 @@
+"""
+Model loading for Font Identifier
+Finds or fetches the model file and loads it through the configured inference backend
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, Optional, Tuple
+
+from ._cache import cached_resource
+from .health import FAILED, LOADING, READY, readiness, serving_batch_sizes, start_warmup
+from .labels import BASE_DIR, read_class_names
+from .settings import ModelConfig
+
+if TYPE_CHECKING:
+    from .backends import InferenceBackend
+    from .hotswap import ModelManager
+
+MODEL_PATH = "model.pth"
+
+
+def get_model_settings() -> ModelConfig:
+    """Model settings from the app config (config.settings); defaults if it is not available."""
+    try:
+        from config.settings import get_config
+        return get_config().model
+    except Exception:
+        return ModelConfig()
+
+
+def resolve_model_path(path: Optional[str] = None) -> str:
+    """Absolute model path; relative paths resolve from the app root"""
+    model_path = path or MODEL_PATH
+    if not os.path.isabs(model_path):
+        model_path = os.path.join(BASE_DIR, model_path)
+    return model_path
+
+
+def published_sha256() -> Optional[str]:
+    """Expected SHA-256 of the hosted model (MODEL_SHA256 env var or model_config.py)"""
+    env_sha = os.getenv('MODEL_SHA256')
+    if env_sha:
+        return env_sha
+    try:
+        from model_config import MODEL_SHA256
+        return MODEL_SHA256
+    except Exception:
+        return None
+
+
+def download_model_from_url(model_path: str, url: str = None) -> bool:
+    """
+    Download model from URL or create a demo model.
+    This function is silent (no UI output) to avoid distracting users.
+    """
+    try:
+        if url:
+            from .download import download_model
+            return download_model([url], model_path, published_sha256())
+        else:
+            # Fallback: Create demo model with pretrained backbone
+            import torch
+            import torch.nn as nn
+            from torchvision import models as tv_models
+            model = tv_models.resnet18(weights='IMAGENET1K_V1')  # Use pretrained weights
+            num_classes = len(read_class_names())
+            model.fc = nn.Linear(model.fc.in_features, max(num_classes, 10))
+            torch.save(model.state_dict(), model_path)
+            return True
+    except Exception:
+        return False
+
+
+def is_git_lfs_pointer(file_path: str) -> bool:
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read(200)
+            return content.startswith('version https://git-lfs.github.com/spec/v1')
+    except Exception:
+        return False
+
+
+def validate_model_file(model_path: str) -> bool:
+    if not os.path.exists(model_path):
+        return False
+    if is_git_lfs_pointer(model_path):
+        return False
+    file_size = os.path.getsize(model_path)
+    if file_size < 1000:
+        return False
+    try:
+        with open(model_path, 'rb') as f:
+            header = f.read(100)
+            if not (header.startswith(b'\x80\x02') or header.startswith(b'\x80\x03') or header.startswith(b'\x80\x04') or header.startswith(b'PK')):
+                # Memory-mapped weights (weights.py) have a JSON header instead of pickle magic
+                from .weights import is_weights_file
+                return is_weights_file(model_path)
+    except Exception:
+        return False
+    return True
+
+
+def ensure_model_file(model_path: str, shared_store: bool = True) -> bool:
+    """
+    Make sure a valid model file exists, trying the shared model store, download sources
+    and finally a demo model. With `shared_store`, a model found or downloaded here is
+    kept in the store (model_store.py) and linked into place.
+    """
+    store = None
+    if shared_store:
+        from .model_store import open_model_store
+        store = open_model_store()
+
+    if validate_model_file(model_path):
+        _store_model(store, model_path)
+        return True
+    # Another app directory on this host may already have this exact model
+    sha256 = published_sha256()
+    if store is not None and sha256:
+        try:
+            if store.link_model(sha256, model_path) and validate_model_file(model_path):
+                return True
+        except OSError:
+            pass
+    model_sources = []
+    env_url = os.getenv('MODEL_DOWNLOAD_URL')
+    if env_url:
+        model_sources.append(env_url)
+    try:
+        from model_config import MODEL_DOWNLOAD_URL as CFG_URL, FALLBACK_MODEL_URLS as CFG_URLS
+        if CFG_URL:
+            model_sources.append(CFG_URL)
+        model_sources.extend(CFG_URLS)
+    except Exception:
+        pass
+    loaded = False
+    if model_sources:
+        # All mirrors are probed at once and the fastest is used; see font_identifier.download
+        from .download import download_model
+        try:
+            loaded = download_model(model_sources, model_path, sha256)
+        except Exception:
+            loaded = False
+    if loaded:
+        _store_model(store, model_path)
+    else:
+        # Final attempt: create demo model silently
+        download_model_from_url(model_path, None)
+    return validate_model_file(model_path)
+
+
+def _store_model(store, model_path: str):
+    """Move a model file into the shared store, leaving a link; failures keep the plain file"""
+    if store is None:
+        return
+    try:
+        store.adopt(model_path)
+    except Exception:
+        pass
+
+
+@cached_resource
+def get_model_manager() -> Tuple["ModelManager", list]:
+    """
+    Silent model loader for production UX, cached once per process.
+    - Uses the host inference daemon when it is reachable
+    - Validates presence/format
+    - Tries download sources or demo creation silently
+    - Attempts multiple load strategies without UI logs
+    - Watches the model file and hot-swaps a changed one (MODEL_HOT_SWAP_INTERVAL)
+    """
+    from .daemon import connect_daemon
+    from .hotswap import ModelManager
+    from .predict import release_model
+
+    classes = read_class_names()
+    readiness.set(LOADING)
+    settings = get_model_settings()
+    model_path = resolve_model_path(settings.path)
+
+    # A host inference daemon (daemon.py) saves loading a model copy per replica
+    client = connect_daemon(settings.daemon_socket, len(classes), settings.daemon_timeout)
+    if client is not None:
+        backend = daemon_backend(client, classes, settings)
+        readiness.set(READY, backend=backend.name)
+        return ModelManager(backend, model_path, lambda: None), classes
+
+    manager = ModelManager(load_local_backend(classes, settings), model_path,
+                           lambda: load_replacement_backend(classes, settings), release_model,
+                           settings.hot_swap_interval, lambda: prepare_replacement(settings))
+    if settings.hot_swap_interval > 0:
+        manager.watch()
+    if settings.daemon_socket:
+        _watch_for_daemon(manager, classes, settings)
+    return manager, classes
+
+
+def daemon_backend(client, classes: list, settings: ModelConfig) -> "InferenceBackend":
+    """The daemon behind `client`, falling back to loading the model here while it is down"""
+    from .daemon import DaemonBackend
+
+    backend = DaemonBackend(client, lambda: load_local_backend(classes, settings), settings)
+    backend.source = (resolve_model_path(settings.path), len(classes))
+    return backend
+
+
+def _watch_for_daemon(manager: "ModelManager", classes: list, settings: ModelConfig):
+    """
+    Switch to a host daemon that starts after this process did, probing for it every
+    RETRY_INTERVAL seconds; the in-process model is then released like a hot-swapped one.
+    """
+    from .daemon import RETRY_INTERVAL, connect_daemon
+
+    def run():
+        while True:
+            time.sleep(RETRY_INTERVAL)
+            client = connect_daemon(settings.daemon_socket, len(classes), settings.daemon_timeout)
+            if client is None:
+                continue
+            backend = daemon_backend(client, classes, settings)
+            manager.stop()  # the daemon hot-swaps its own model file (MODEL_HOT_SWAP_INTERVAL)
+            if manager.swap(load=lambda: backend):
+                return
+
+    threading.Thread(target=run, name="font-daemon-probe", daemon=True).start()
+
+
+def load_model_and_classes() -> Tuple[Optional["InferenceBackend"], list]:
+    """
+    The current model and class names, loaded once per process by get_model_manager().
+    With hot swap on (MODEL_HOT_SWAP_INTERVAL), a model kept from an earlier call is
+    released once it has been replaced, and predicting with it then raises RuntimeError:
+    call this again for each unit of work, or hold the model with model_lease().
+    """
+    manager, classes = get_model_manager()
+    return manager.backend, classes
+
+
+@contextmanager
+def model_lease() -> Iterator[Tuple[Optional["InferenceBackend"], list]]:
+    """(model, class_names) pinned for the block; a version swapped out meanwhile is freed afterwards"""
+    manager, classes = get_model_manager()
+    with manager.lease() as backend:
+        yield backend, classes
+
+
+def load_local_backend(classes: list, settings: ModelConfig, warm: bool = True) -> Optional["InferenceBackend"]:
+    """
+    Load, optimize and warm up the model in this process. With `warm` False, readiness is
+    left LOADING for the caller, which warms the model up itself and then marks it READY.
+    """
+    import torch
+    from .backends import create_backend
+    from .threads import apply_thread_budget
+
+    # Ensure we have a valid file; try to obtain one silently. If still invalid, return None
+    model_path = resolve_model_path(settings.path)
+    if not ensure_model_file(model_path, settings.shared_store):
+        readiness.set(FAILED, error="no valid model file")
+        return None
+
+    # oneDNN starts disabled; the load-time optimizer re-enables it after a self-check
+    torch.backends.mkldnn.enabled = False
+    apply_thread_budget(settings)
+    backend = create_backend(model_path, len(classes), settings)
+    if backend is None:
+        # If load fails, return None to disable prediction features
+        readiness.set(FAILED, error="model could not be loaded")
+        return None
+
+    # Inference workers start from a clean forkserver process and load their own copy,
+    # from the compiled artifact create_backend() has just stored
+    if settings.worker_processes > 0:
+        from .predict import get_worker_pool
+        get_worker_pool(backend)
+
+    # Readiness stays false (health probe + dashboard status) until warmup finishes
+    if not warm:
+        return backend
+    if settings.warmup_enabled:
+        start_warmup(backend, serving_batch_sizes(settings), settings.warmup_rounds)
+    else:
+        readiness.set(READY, backend=backend.name)
+    return backend
+
+
+def prepare_replacement(settings: ModelConfig, model_path: Optional[str] = None):
+    """Move a changed model file into the shared store before the hot swap stamps and loads it"""
+    model_path = model_path or resolve_model_path(settings.path)
+    if settings.shared_store and validate_model_file(model_path):
+        from .model_store import open_model_store
+        _store_model(open_model_store(), model_path)
+
+
+def load_replacement_backend(classes: list, settings: ModelConfig) -> Optional["InferenceBackend"]:
+    """
+    Load and warm a changed model file for a hot swap, leaving the serving model and the
+    readiness state alone. None if the new file is not a usable model.
+    """
+    from .backends import create_backend
+
+    model_path = resolve_model_path(settings.path)
+    if not validate_model_file(model_path):
+        return None
+    backend = create_backend(model_path, len(classes), settings)
+    if backend is None:
+        return None
+    if settings.worker_processes > 0:
+        from .predict import get_worker_pool
+        get_worker_pool(backend)
+    if settings.warmup_enabled:
+        for _ in range(max(1, settings.warmup_rounds)):
+            backend.warmup(serving_batch_sizes(settings))
+    return backend
@@ -0,0 +1,114 @@
+"""
+Compiled model artifact cache for Font Identifier
+Stores the traced, frozen and optimized model under TORCH_HOME, keyed by the
+SHA-256 of the model file, the torch version and the optimization settings
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple
+
+# torch is imported where it is used: the ONNX Runtime backend keeps its exports next to these
+if TYPE_CHECKING:
+    import torch
+    import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUBDIR = os.path.join("font_identifier", "compiled")
+# Artifacts kept per cache directory; older ones are pruned on save
+KEEP_ARTIFACTS = 3
+# ModelConfig fields that change the compiled artifact
+COMPILE_SETTINGS = (
+    "quantization",
+    "quantization_calibration_images",
+    "fold_batchnorm",
+    "channels_last",
+    "freeze_model",
+    "onednn_autotune",
+)
+
+
+def torch_home() -> str:
+    """TORCH_HOME, or torch's default cache directory"""
+    default = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.join("~", ".cache")), "torch")
+    return os.path.expanduser(os.getenv("TORCH_HOME", default))
+
+
+def cache_dir() -> str:
+    return os.path.join(torch_home(), CACHE_SUBDIR)
+
+
+def compile_settings(model_config) -> Dict[str, Any]:
+    """The subset of ModelConfig that affects the compiled model"""
+    return {name: getattr(model_config, name) for name in COMPILE_SETTINGS}
+
+
+def artifact_key(model_sha256: str, settings: Dict[str, Any]) -> str:
+    import torch
+
+    payload = json.dumps({"model": model_sha256, "torch": torch.__version__, "settings": settings},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def artifact_path(key: str) -> str:
+    return os.path.join(cache_dir(), f"{key}.pt")
+
+
+def load_artifact(key: str) -> Optional[Tuple["torch.jit.ScriptModule", Dict[str, Any]]]:
+    """(model, metadata) for a cached artifact, or None on a miss; corrupt entries are removed"""
+    import torch
+
+    path = artifact_path(key)
+    if not os.path.exists(path):
+        return None
+    extra = {"meta.json": ""}
+    try:
+        model = torch.jit.load(path, map_location="cpu", _extra_files=extra)
+        os.utime(path)  # mark as recently used for pruning
+        return model.eval(), json.loads(extra["meta.json"] or "{}")
+    except Exception as e:
+        logger.warning(f"Discarding unreadable compiled model {path}: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+
+def save_artifact(key: str, model: "nn.Module", meta: Optional[Dict[str, Any]] = None) -> bool:
+    """Trace/freeze the model if needed and store it atomically; returns False on failure"""
+    import torch
+
+    try:
+        if not isinstance(model, torch.jit.ScriptModule):
+            with torch.no_grad():
+                model = torch.jit.freeze(torch.jit.trace(model.eval(), torch.randn(1, 3, 224, 224)))
+        os.makedirs(cache_dir(), exist_ok=True)
+        path = artifact_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.jit.save(model, tmp_path, _extra_files={"meta.json": json.dumps(meta or {})})
+        os.replace(tmp_path, path)
+        prune_artifacts()
+        return True
+    except Exception as e:
+        logger.warning(f"Could not cache compiled model: {e}")
+        return False
+
+
+def prune_artifacts(keep: int = KEEP_ARTIFACTS):
+    """Remove all but the `keep` most recently used artifacts"""
+    directory = cache_dir()
+    try:
+        entries = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".pt")]
+    except OSError:
+        return
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for path in entries[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
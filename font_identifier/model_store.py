@@ -0,0 +1,310 @@
+"""
+Shared model store for Font Identifier
+Keeps each model file once under TORCH_HOME, addressed by its SHA-256, and links it into
+every app directory that uses it, so containers and releases on one host share a copy
+
+Layout of the store ($TORCH_HOME/font_identifier/store):
+    objects/ab/ab12...ef    file contents, named by SHA-256
+    index.json              per object: size, kind, source model, last use and the paths linked to it
+    index.lock              held (flock) while the index is read and rewritten
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .download import file_sha256
+from .model_cache import torch_home
+
+try:
+    import fcntl
+except ImportError:  # Windows: index updates are not serialized between processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STORE_SUBDIR = os.path.join("font_identifier", "store")
+# Unreferenced objects younger than this survive gc, so a deploy that has just added a
+# model but not linked it yet does not lose it
+GC_GRACE_SECONDS = 3600
+
+
+def store_dir() -> str:
+    return os.path.join(torch_home(), STORE_SUBDIR)
+
+
+def _same_file(a: str, b: str) -> bool:
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+def _signature(path: str) -> List[int]:
+    """Size and mtime: what a write through any of an object's links changes"""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class ModelStore:
+    """
+    Content-addressed model files shared between app directories.
+    - add() moves a file's content into the store and puts a link in its place
+    - link() places a stored object at a path: hardlink, else symlink (another
+      filesystem, e.g. a container image vs. a volume), else a copy
+    - gc() deletes objects that no app directory links to any more
+    Converted weights (weights.py) are stored as objects of kind "weights" with the
+    model they were made from as their source, and are linked along with it.
+
+    A hardlinked app file is the object itself, so its mode is left alone and an
+    in-place `cp` over it still works; the object is then no longer what its name
+    says, which find() and link() notice (size/mtime) before trusting it. Replace a
+    linked model with a rename (cp to a temp name, then mv) to leave the other app
+    directories that share it untouched.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or store_dir()
+        self.index_path = os.path.join(self.root, "index.json")
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    def has(self, sha256: str) -> bool:
+        return os.path.isfile(self.object_path(sha256.lower()))
+
+    @contextmanager
+    def _index(self, write: bool = True) -> Iterator[Dict[str, Any]]:
+        """The index, locked for the duration and (unless `write` is False) written back afterwards"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "index.lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = {"objects": {}}
+            yield index
+            if not write:
+                return
+            tmp = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.index_path)
+
+    def _ingest(self, path: str, sha256: str):
+        """Put the content of `path` at its object path (no-op if already stored)"""
+        target = self.object_path(sha256)
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(path, tmp)  # same filesystem: the app file already is the object
+        except OSError:
+            shutil.copy2(path, tmp)  # keeps the mtime that converted weights are stamped with
+            os.chmod(tmp, 0o444)  # only a copy: a hardlink's mode is the app file's
+        os.replace(tmp, target)
+
+    def _intact(self, sha256: str) -> bool:
+        """
+        Whether the object still holds the content it is named after. One that was
+        written to in place through a link is dropped from the store (the links keep
+        the new content), so it is neither reported by find() nor linked elsewhere.
+        """
+        target = self.object_path(sha256)
+        with self._index() as index:
+            entry = index["objects"].get(sha256, {})
+            if entry.get("stat") in (None, _signature(target)):
+                return True
+            if file_sha256(target) == sha256:  # touched, not rewritten
+                entry["stat"] = _signature(target)
+                return True
+            logger.warning(f"Stored object {sha256[:16]} was modified in place through a link; dropping it")
+            os.remove(target)
+            del index["objects"][sha256]
+            return False
+
+    def add(self, path: str, kind: str = "model", source: Optional[str] = None) -> str:
+        """Store the file at `path`, link it back in place and return its SHA-256"""
+        sha256 = file_sha256(path)
+        self._ingest(path, sha256)
+        with self._index() as index:
+            entry = index["objects"].setdefault(sha256, {
+                "size": os.path.getsize(path), "kind": kind, "added": time.time(), "refs": [],
+            })
+            if source:
+                entry["source"] = source
+            entry.setdefault("stat", _signature(self.object_path(sha256)))
+        self.link(sha256, path)
+        logger.info(f"Stored {path} as {sha256[:16]} ({entry['size'] / 1e6:.1f} MB)")
+        return sha256
+
+    def link(self, sha256: str, dest: str) -> bool:
+        """Place the stored object at `dest`, replacing whatever is there; False if not stored"""
+        sha256 = sha256.lower()
+        target = self.object_path(sha256)
+        if not os.path.isfile(target) or not self._intact(sha256):
+            return False
+        dest = os.path.abspath(dest)
+        if not _same_file(dest, target):
+            tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+            try:
+                os.link(target, tmp)
+            except OSError:
+                try:
+                    os.symlink(target, tmp)
+                except OSError:
+                    shutil.copy2(target, tmp)
+            os.replace(tmp, dest)
+        with self._index() as index:
+            entry = index["objects"].setdefault(sha256, {
+                "size": os.path.getsize(target), "kind": "model", "added": time.time(), "refs": [],
+            })
+            entry["last_used"] = time.time()
+            if dest not in entry["refs"]:
+                entry["refs"].append(dest)
+        return True
+
+    def find(self, path: str) -> Optional[str]:
+        """SHA-256 of the object `path` is already linked to, without hashing it"""
+        path = os.path.abspath(path)
+        with self._index(write=False) as index:
+            found = next((sha256 for sha256, entry in index["objects"].items()
+                          if path in entry["refs"] and _same_file(path, self.object_path(sha256))), None)
+        return found if found is not None and self._intact(found) else None
+
+    def derived(self, source: str, kind: str = "weights") -> Optional[str]:
+        """The stored object of `kind` made from model `source`, if any"""
+        with self._index(write=False) as index:
+            for sha256, entry in index["objects"].items():
+                if entry.get("source") == source and entry.get("kind") == kind and self.has(sha256):
+                    return sha256
+        return None
+
+    def link_model(self, sha256: str, model_path: str) -> bool:
+        """Link a stored model, and its converted weights if stored, into an app directory"""
+        from .weights import weights_path
+
+        sha256 = sha256.lower()
+        if not self.link(sha256, model_path):
+            return False
+        converted = self.derived(sha256)
+        if converted is not None:
+            self.link(converted, weights_path(model_path))
+        return True
+
+    def adopt(self, model_path: str) -> str:
+        """
+        Store a model file found in an app directory (and its up-to-date converted weights),
+        replacing both with links. Cheap when the file is already a link into the store.
+        """
+        from .weights import fresh_weights_path
+
+        sha256 = self.find(model_path) or self.add(model_path)
+        converted = fresh_weights_path(model_path)
+        if converted is not None and self.find(converted) is None:
+            self.add(converted, kind="weights", source=sha256)
+        return sha256
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        with self._index(write=False) as index:
+            return index["objects"]
+
+    def gc(self, grace: float = GC_GRACE_SECONDS, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Drop links that no longer point at their object (the app directory was removed or
+        the file replaced), then delete objects with no links left. Hardlinked objects with
+        a link count above one are kept even if the index does not know the link.
+        """
+        now = time.time()
+        removed: List[str] = []
+        freed = 0
+        with self._index() as index:
+            objects = index["objects"]
+            for sha256, entry in list(objects.items()):
+                target = self.object_path(sha256)
+                if not os.path.isfile(target):
+                    removed.append(sha256)
+                    if not dry_run:
+                        del objects[sha256]
+                    continue
+                live = [ref for ref in entry["refs"] if _same_file(ref, target)]
+                if not dry_run:
+                    entry["refs"] = live
+                recent = now - max(entry.get("last_used", 0), entry.get("added", 0)) < grace
+                if live or recent or os.stat(target).st_nlink > 1:
+                    continue
+                removed.append(sha256)
+                freed += entry["size"]
+                if not dry_run:
+                    os.remove(target)
+                    del objects[sha256]
+
+            # Files from interrupted adds, or objects the index lost track of
+            objects_dir = os.path.join(self.root, "objects")
+            for dirpath, _, filenames in os.walk(objects_dir):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    if name in objects or now - os.path.getmtime(path) < grace:
+                        continue
+                    if os.stat(path).st_nlink > 1:
+                        continue
+                    removed.append(name)
+                    freed += os.path.getsize(path)
+                    if not dry_run:
+                        os.remove(path)
+            kept = sum(1 for sha256 in objects if sha256 not in removed)
+        return {"removed": removed, "freed_bytes": freed, "kept": kept}
+
+
+def open_model_store() -> Optional[ModelStore]:
+    """The store under TORCH_HOME, or None if it cannot be created (read-only cache dir)"""
+    store = ModelStore()
+    try:
+        os.makedirs(store.root, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Model store {store.root} unavailable: {e}")
+        return None
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared, content-addressed model store")
+    parser.add_argument("--add", metavar="PATH", help="Store a model file and replace it with a link")
+    parser.add_argument("--link", nargs=2, metavar=("SHA256", "PATH"), help="Link a stored model to PATH")
+    parser.add_argument("--list", action="store_true", help="Show stored objects and their links")
+    parser.add_argument("--gc", action="store_true", help="Delete objects no app directory links to")
+    parser.add_argument("--grace", type=float, default=GC_GRACE_SECONDS,
+                        help="Seconds an unlinked object is kept after its last use")
+    parser.add_argument("--dry-run", action="store_true", help="With --gc: only report")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    store = ModelStore()
+    if args.add:
+        print(store.adopt(args.add))
+    if args.link:
+        if not store.link_model(*args.link):
+            parser.exit(1, f"{args.link[0]} is not in {store.root}\n")
+    if args.gc:
+        report = store.gc(args.grace, args.dry_run)
+        print(json.dumps({"removed": report["removed"], "freed_mb": round(report["freed_bytes"] / 1e6, 1),
+                          "kept": report["kept"], "dry_run": args.dry_run}, indent=2))
+    if args.list or not (args.add or args.link or args.gc):
+        for sha256, entry in sorted(store.entries().items(), key=lambda item: -item[1].get("last_used", 0)):
+            source = f" from {entry['source'][:16]}" if entry.get("source") else ""
+            print(f"{sha256[:16]}  {entry['kind']:<7} {entry['size'] / 1e6:>7.1f} MB{source}")
+            for ref in entry["refs"]:
+                print(f"    {ref}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Near-duplicate result reuse for Font Identifier
+Perceptual difference hashes (dHash) of uploads in a BK-tree, so the same text re-captured
+at another scale or JPEG quality reuses the stored prediction instead of running the model;
+hash matches are confirmed by comparing small grayscale thumbnails
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from .settings import ModelConfig
+
+# 16x16 gradient bits. The hash only finds candidates: it follows the layout of the text,
+# so the same text in another weight of the same font can be as close as a rescaled copy
+HASH_SIZE = 16
+# Relative aspect-ratio difference beyond which two images never match
+MAX_ASPECT_DIFFERENCE = 0.05
+# Candidates are confirmed by the mean squared difference of grayscale thumbnails this high
+# (at most THUMBNAIL_MAX_WIDTH wide). Measured on rendered text: rescaled (0.5x-1.5x) and
+# JPEG-recompressed (q30+) copies stay below ~180, Regular vs Bold of the same text and
+# font (DejaVu, Source Code Pro) is above ~420
+THUMBNAIL_HEIGHT = 16
+THUMBNAIL_MAX_WIDTH = 128
+MAX_THUMBNAIL_MSE = 300.0
+
+
+def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: sign of horizontal gradients on a blurred, downscaled grayscale image"""
+    gray = image.convert("L")
+    # Low-pass first so the hash depends on layout and stroke weight, not on how the
+    # box filter's cell edges happen to fall at a given scale
+    gray = gray.filter(ImageFilter.GaussianBlur(max(gray.size) / (8 * hash_size)))
+    small = gray.resize((hash_size + 1, hash_size), Image.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def thumbnail_size(image: Image.Image) -> Tuple[int, int]:
+    width = max(1, round(THUMBNAIL_HEIGHT * image.width / max(1, image.height)))
+    if width <= THUMBNAIL_MAX_WIDTH:
+        return width, THUMBNAIL_HEIGHT
+    return THUMBNAIL_MAX_WIDTH, max(1, round(THUMBNAIL_MAX_WIDTH * image.height / max(1, image.width)))
+
+
+def thumbnail(image: Image.Image, size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """Grayscale thumbnail (box-averaged, aspect ratio kept) for confirming a hash match"""
+    return np.asarray(image.convert("L").resize(size or thumbnail_size(image), Image.BOX))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance; insert-only"""
+
+    def __init__(self):
+        self.root: Optional[Tuple[int, Dict[int, Any]]] = None
+        self.size = 0
+
+    def add(self, value: int):
+        if self.root is None:
+            self.root = (value, {})
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                self.size += 1
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> Iterator[Tuple[int, int]]:
+        """(distance, hash) for every stored hash within `max_distance`"""
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                yield distance, node_value
+            # Triangle inequality: only subtrees at distance d +/- max_distance can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+
+
+class NearDuplicateIndex:
+    """
+    Bounded LRU map of (dHash, variant) -> prediction with a BK-tree for radius search.
+    A stored result is reused only if the aspect ratio matches and the thumbnails are
+    within MAX_THUMBNAIL_MSE. Evicted hashes stay in the tree as dead entries until they
+    outnumber the live ones, then the tree is rebuilt from the live set.
+    Results are copied in and out, so a caller editing its result leaves the index alone.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_distance: int = 24):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[float, np.ndarray, Dict[str, Any]]]" = OrderedDict()
+        self._live: Dict[int, int] = {}  # hash -> number of entries using it
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def lookup(self, image: Image.Image, variant: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """(hash, stored result of the closest near-duplicate or None); pass the hash to add()"""
+        value = dhash(image)
+        aspect = image.width / max(1, image.height)
+        thumbnails: Dict[Tuple[int, int], np.ndarray] = {}
+        found = None
+        with self._lock:
+            candidates = sorted(self._tree.search(value, self.max_distance))
+            for _, candidate in candidates:
+                entry = self._entries.get((candidate, variant))
+                if entry is None or abs(entry[0] - aspect) > MAX_ASPECT_DIFFERENCE * aspect:
+                    continue
+                stored = entry[1]
+                if stored.shape not in thumbnails:
+                    thumbnails[stored.shape] = thumbnail(image, (stored.shape[1], stored.shape[0])).astype(np.float32)
+                if float(np.mean((thumbnails[stored.shape] - stored) ** 2)) > MAX_THUMBNAIL_MSE:
+                    continue
+                self._entries.move_to_end((candidate, variant))
+                self._hits += 1
+                found = entry[2]
+                break
+            else:
+                self._misses += 1
+        return value, None if found is None else copy.deepcopy(found)
+
+    def add(self, value: int, image: Image.Image, variant: str, result: Dict[str, Any]):
+        aspect = image.width / max(1, image.height)
+        small = thumbnail(image)
+        result = copy.deepcopy(result)
+        with self._lock:
+            key = (value, variant)
+            if key not in self._entries:
+                self._live[value] = self._live.get(value, 0) + 1
+                self._tree.add(value)
+            self._entries[key] = (aspect, small, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                (old, _), _ = self._entries.popitem(last=False)
+                self._live[old] -= 1
+                if not self._live[old]:
+                    del self._live[old]
+            if self._tree.size > 2 * len(self._live) + 64:
+                self._rebuild()
+
+    def _rebuild(self):
+        tree = BKTree()
+        for value in self._live:
+            tree.add(value)
+        self._tree = tree
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+            }
+
+
+def build_near_duplicate_index(settings: ModelConfig) -> Optional[NearDuplicateIndex]:
+    """Index from ModelConfig, or None when disabled (near_duplicate_entries = 0)"""
+    if settings.near_duplicate_entries < 1:
+        return None
+    return NearDuplicateIndex(settings.near_duplicate_entries, settings.near_duplicate_distance)
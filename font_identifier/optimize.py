@@ -0,0 +1,173 @@
+"""
+Load-time model optimization for Font Identifier
+Folds BatchNorm into convolutions, converts to channels_last, freezes the module
+and re-enables oneDNN when a self-check shows it is stable and faster on this host
+"""
+
+import copy
+import logging
+import time
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+# Benchmark settings for the per-pass timing
+BENCH_WARMUP = 2
+BENCH_RUNS = 5
+INPUT_SHAPE = (1, 3, 224, 224)
+
+
+@dataclass
+class PassResult:
+    """Timing of one optimization pass (batch-1 forward, median ms)"""
+    name: str
+    applied: bool
+    ms_before: float
+    ms_after: float
+    note: str = ""
+
+    @property
+    def speedup(self) -> float:
+        return self.ms_before / self.ms_after if self.ms_after else 0.0
+
+
+class ChannelsLast(nn.Module):
+    """Feeds the wrapped model channels_last inputs"""
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model.to(memory_format=torch.channels_last)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+
+def benchmark(model: nn.Module, example: torch.Tensor, runs: int = BENCH_RUNS) -> float:
+    """Median forward latency in milliseconds"""
+    timings = []
+    with torch.no_grad():
+        for i in range(BENCH_WARMUP + runs):
+            started = time.perf_counter()
+            model(example)
+            if i >= BENCH_WARMUP:
+                timings.append((time.perf_counter() - started) * 1000.0)
+    return sorted(timings)[len(timings) // 2]
+
+
+def fold_batchnorm(model: nn.Module) -> nn.Module:
+    """Fold every Conv2d -> BatchNorm2d pair into a single Conv2d (eval mode only)"""
+    import torch.fx
+    from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+    traced = torch.fx.symbolic_trace(copy.deepcopy(model).eval())
+    modules = dict(traced.named_modules())
+    for node in list(traced.graph.nodes):
+        if node.op != "call_module" or not isinstance(modules.get(node.target), nn.BatchNorm2d):
+            continue
+        conv = node.args[0]
+        if not (isinstance(conv, torch.fx.Node) and conv.op == "call_module"
+                and isinstance(modules.get(conv.target), nn.Conv2d) and len(conv.users) == 1):
+            continue
+        fused = fuse_conv_bn_eval(modules[conv.target], modules[node.target])
+        parent, _, name = conv.target.rpartition(".")
+        setattr(traced.get_submodule(parent) if parent else traced, name, fused)
+        node.replace_all_uses_with(conv)
+        traced.graph.erase_node(node)
+    traced.graph.lint()
+    traced.delete_all_unused_submodules()
+    traced.recompile()
+    return traced
+
+
+def freeze(model: nn.Module, example: torch.Tensor) -> torch.jit.ScriptModule:
+    """Trace and freeze: parameters become constants and the graph is simplified"""
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(model.eval(), example))
+
+
+def onednn_self_check(model: nn.Module, example: torch.Tensor) -> Tuple[bool, float, float]:
+    """
+    Compare the model with oneDNN disabled and enabled.
+    Returns (use_onednn, ms_without, ms_with); oneDNN is kept only if outputs match and it is faster.
+    """
+    import torch.backends.mkldnn as mkldnn
+
+    if not mkldnn.is_available():
+        return False, 0.0, 0.0
+    previous = mkldnn.enabled
+    try:
+        mkldnn.enabled = False
+        with torch.no_grad():
+            reference = model(example)
+        ms_without = benchmark(model, example)
+
+        mkldnn.enabled = True
+        with torch.no_grad():
+            outputs = [model(example) for _ in range(3)]
+        stable = all(torch.allclose(reference, o, rtol=1e-3, atol=1e-3) for o in outputs)
+        ms_with = benchmark(model, example)
+    except Exception:
+        mkldnn.enabled = previous
+        return False, 0.0, 0.0
+
+    use = stable and ms_with < ms_without
+    mkldnn.enabled = use
+    return use, ms_without, ms_with
+
+
+def optimize_model(model: nn.Module, fold_bn: bool = True, channels_last: bool = False,
+                   freeze_graph: bool = True, onednn: bool = True) -> Tuple[nn.Module, List[PassResult]]:
+    """
+    Run the enabled passes in order and log the speedup of each.
+    A pass that fails or makes the model slower is skipped. Already scripted
+    models (e.g. the INT8 model) only get the oneDNN check.
+    """
+    example = torch.randn(*INPUT_SHAPE)
+    results: List[PassResult] = []
+    current = benchmark(model, example)
+    started_ms = current
+
+    passes = []
+    if not isinstance(model, torch.jit.ScriptModule):
+        if fold_bn:
+            passes.append(("fold_batchnorm", fold_batchnorm))
+        if channels_last:
+            passes.append(("channels_last", ChannelsLast))
+        if freeze_graph:
+            passes.append(("freeze", lambda m: freeze(m, example)))
+
+    for name, apply in passes:
+        try:
+            candidate = apply(model)
+            with torch.no_grad():
+                if not torch.allclose(model(example), candidate(example), rtol=1e-3, atol=1e-3):
+                    raise ValueError("outputs changed")
+            after = benchmark(candidate, example)
+        except Exception as e:
+            results.append(PassResult(name, False, current, current, note=str(e)))
+            continue
+        # Freezing is kept even when neutral; it also saves per-call Python overhead under load
+        keep = after <= current or name == "freeze"
+        results.append(PassResult(name, keep, current, after, note="" if keep else "slower, skipped"))
+        if keep:
+            model, current = candidate, after
+
+    if onednn:
+        use, ms_without, ms_with = onednn_self_check(model, example)
+        results.append(PassResult("onednn", use, ms_without, ms_with if use else ms_without,
+                                  note="" if use else "kept disabled"))
+        if use:
+            current = ms_with
+
+    for r in results:
+        logger.info("Model optimization %-15s %s %.1f ms -> %.1f ms (%.2fx)%s",
+                    r.name, "applied" if r.applied else "skipped", r.ms_before, r.ms_after,
+                    r.speedup, f" [{r.note}]" if r.note else "")
+    if results:
+        logger.info("Model optimization total: %.1f ms -> %.1f ms (%.2fx)",
+                    started_ms, current, started_ms / current if current else 0.0)
+    return model, results
@@ -0,0 +1,400 @@
+"""
+Font prediction for Font Identifier
+Top-k fonts and families for whole images, text regions, wide strips and batches
+"""
+
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import torch
+from PIL import Image
+
+from ._cache import cached_resource, release_resources
+from .cache import PredictionCache, open_prediction_cache, prediction_variant
+from .inference import InferenceDispatcher
+from .labels import FamilyIndex, build_family_index, rank_predictions, rank_probabilities
+from .model import get_model_settings
+from .neardup import NearDuplicateIndex, build_near_duplicate_index
+from .preprocessing import open_image, prepare_image, preprocess, preprocess_tiles
+from .segmentation import crop_regions, find_text_regions
+from .settings import ModelConfig
+from .singleflight import SingleFlight, image_digest
+
+if TYPE_CHECKING:
+    from .backends import InferenceBackend
+    from .workers import WorkerPool
+
+
+@cached_resource
+def get_inference_dispatcher(model: "InferenceBackend") -> Optional[InferenceDispatcher]:
+    """
+    One micro-batching dispatcher per loaded model, shared by every session.
+    Returns None when batching is disabled in config.
+    """
+    settings = get_model_settings()
+    if model is None or not settings.batching_enabled:
+        return None
+    return InferenceDispatcher(
+        model,
+        max_batch_size=settings.max_batch_size,
+        batch_window_ms=settings.batch_window_ms,
+        max_queue_depth=settings.max_queue_depth,
+    )
+
+
+@cached_resource
+def get_worker_pool(model: "InferenceBackend") -> Optional["WorkerPool"]:
+    """
+    Process pool that decodes, preprocesses and classifies whole images outside this
+    interpreter's GIL. Returns None when worker processes are disabled or unsupported.
+    """
+    settings = get_model_settings()
+    if model is None or settings.worker_processes < 1:
+        return None
+    try:
+        from .threads import available_cores
+        from .workers import WorkerPool
+
+        threads = settings.worker_threads or max(1, available_cores() // settings.worker_processes)
+        return WorkerPool(
+            model,
+            prepare_image,
+            processes=settings.worker_processes,
+            threads_per_worker=threads,
+            max_batch_size=settings.max_batch_size,
+            max_queue_depth=settings.max_queue_depth,
+            warmup_sizes=(1,) if settings.warmup_enabled else (),
+        )
+    except Exception:
+        # e.g. worker processes cannot be started here: keep inference in-process
+        return None
+
+
+@cached_resource
+def get_family_index(class_names: list) -> FamilyIndex:
+    """Class -> family index, built once alongside the model."""
+    return build_family_index(class_names)
+
+
+@cached_resource
+def get_prediction_cache(model: "InferenceBackend") -> Optional[PredictionCache]:
+    """Result cache for uploads, bound to the loaded model's version; None when disabled."""
+    if model is None:
+        return None
+    # Asked per lookup: a daemon-backed model reports the version the daemon (or its fallback) serves
+    return open_prediction_cache(get_model_settings(), lambda: model.model_version or "unknown")
+
+
+@cached_resource
+def get_near_duplicate_index(model: "InferenceBackend") -> Optional[NearDuplicateIndex]:
+    """Perceptual-hash index of recent results for this model; None when disabled."""
+    if model is None:
+        return None
+    return build_near_duplicate_index(get_model_settings())
+
+
+@cached_resource
+def get_single_flight(model: "InferenceBackend") -> SingleFlight:
+    """Coalesces concurrent predictions of identical content on this model."""
+    return SingleFlight()
+
+
+@cached_resource
+def get_preprocess_pool() -> ThreadPoolExecutor:
+    """Shared thread pool for decoding/preprocessing uploads (PIL releases the GIL)."""
+    return ThreadPoolExecutor(max_workers=get_model_settings().preprocess_workers,
+                              thread_name_prefix="font-preprocess")
+
+
+def release_model(model: "InferenceBackend"):
+    """Drain and close the dispatcher and worker pool of a retired model and drop its caches."""
+    for resource in release_resources(model):
+        close = getattr(resource, "close", None)
+        if callable(close):
+            close()
+
+
+def run_model(model: "InferenceBackend", batch: torch.Tensor) -> torch.Tensor:
+    """Forward a (N, C, H, W) batch through the shared dispatcher, or directly if batching is off."""
+    dispatcher = get_inference_dispatcher(model)
+    if dispatcher is not None:
+        return dispatcher.infer(batch)
+    with torch.no_grad():
+        return model(batch)
+
+
+def failed_prediction(label: str) -> Dict[str, Any]:
+    return {"font": label, "confidence": 0.0, "top_fonts": [], "top_families": []}
+
+
+def predict_font_topk(image: Image.Image, model: "InferenceBackend", class_names: list,
+                      k: Optional[int] = None, digest: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Top-1 font plus top-k fonts and font families for one image.
+    Identical images requested at the same time (e.g. a shared link) share one forward.
+    Pass `digest` when the caller already hashed the content (e.g. the uploaded bytes)
+    to skip hashing the decoded pixels.
+    """
+    if model is None:
+        return failed_prediction("Model not available")
+    k = k or get_model_settings().top_k
+    try:
+        key = ("whole", k, digest or image_digest(image))
+    except Exception:
+        return failed_prediction("Unknown Font")
+    return get_single_flight(model).do(key, lambda: _predict_font_topk(image, model, class_names, k))
+
+
+def _predict_font_topk(image: Image.Image, model: "InferenceBackend", class_names: list,
+                       k: Optional[int] = None) -> Dict[str, Any]:
+    if model is None:
+        return failed_prediction("Model not available")
+    try:
+        worker_pool = get_worker_pool(model)
+        if worker_pool is not None:
+            outputs = worker_pool.infer(image)
+        else:
+            model_input = preprocess(image).unsqueeze(0).to(torch.float32)
+            outputs = run_model(model, model_input)
+        return rank_predictions(outputs, class_names, get_family_index(class_names),
+                                k or get_model_settings().top_k)[0]
+    except Exception:
+        return failed_prediction("Unknown Font")
+
+
+def predict_font_regions(image: Image.Image, model: "InferenceBackend", class_names: list,
+                         k: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Segment the image into text lines/word blocks, classify all crops in one batch
+    and merge their probabilities (area-weighted) into an image-level result.
+    The result has predict_font_topk keys plus `regions`, a per-block breakdown.
+    """
+    if model is None:
+        return dict(failed_prediction("Model not available"), regions=[])
+    try:
+        settings = get_model_settings()
+        k = k or settings.top_k
+        regions = find_text_regions(image, max_regions=settings.max_regions)
+        crops = crop_regions(image, regions)
+        batch = torch.stack(list(get_preprocess_pool().map(prepare_image, crops)))
+        probs = torch.softmax(run_model(model, batch).to(torch.float32), dim=1)
+
+        weights = torch.tensor([r.area for r in regions], dtype=probs.dtype)
+        merged = (probs * (weights / weights.sum()).unsqueeze(1)).sum(dim=0, keepdim=True)
+
+        family_index = get_family_index(class_names)
+        result = rank_probabilities(merged, class_names, family_index, k)[0]
+        per_region = rank_probabilities(probs, class_names, family_index, k)
+        result["regions"] = [dict(r, box=list(region.box), line=region.line)
+                             for region, r in zip(regions, per_region)]
+        return result
+    except Exception:
+        return dict(failed_prediction("Unknown Font"), regions=[])
+
+
+def predict_font_tiled(image: Image.Image, model: "InferenceBackend", class_names: list,
+                       k: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Aspect-preserving mode for wide text strips: resize to the input height,
+    cut overlapping square tiles, run them as one batch and average the logits.
+    """
+    if model is None:
+        return failed_prediction("Model not available")
+    try:
+        settings = get_model_settings()
+        tiles = preprocess_tiles(image.convert("RGB"), stride=settings.tile_stride,
+                                 max_tiles=settings.max_tiles)
+        outputs = run_model(model, tiles.to(torch.float32)).mean(dim=0, keepdim=True)
+        result = rank_predictions(outputs, class_names, get_family_index(class_names), k or settings.top_k)[0]
+        result["tiles"] = int(tiles.shape[0])
+        return result
+    except Exception:
+        return failed_prediction("Unknown Font")
+
+
+PREDICT_MODES: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "whole": _predict_font_topk,
+    "regions": predict_font_regions,
+    "tiled": predict_font_tiled,
+}
+
+
+def predict_font_bytes(data: bytes, model: "InferenceBackend", class_names: list, mode: str = "whole",
+                       k: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Predict an uploaded file (whole image, text regions or tiled strip, see PREDICT_MODES).
+    Results are cached by content hash, so a repeated upload skips decoding and the model;
+    a near-duplicate of a recent upload (rescaled, recompressed) reuses that result, and
+    concurrent requests for the same file share one computation.
+    Raises ValueError for a mode not in PREDICT_MODES.
+    """
+    if mode not in PREDICT_MODES:
+        raise ValueError(f"Unknown prediction mode {mode!r}; expected one of {', '.join(PREDICT_MODES)}")
+    variant = prediction_variant(mode, get_model_settings(), k)
+    digest = hashlib.sha256(data).hexdigest()
+    return get_single_flight(model).do((variant, digest), lambda: _predict_font_bytes(
+        data, digest, model, class_names, mode, k, variant))
+
+
+def _predict_font_bytes(data: bytes, digest: str, model: "InferenceBackend", class_names: list, mode: str,
+                        k: Optional[int], variant: str) -> Dict[str, Any]:
+    cache = get_prediction_cache(model)
+    if cache is not None:
+        hit = cache.get(data, variant, digest)
+        if hit is not None:
+            return hit
+    try:
+        image = open_image(data).convert("RGB")
+    except Exception:
+        return failed_prediction("Unknown Font")
+
+    index = get_near_duplicate_index(model)
+    if index is not None:
+        image_hash, near = index.lookup(image, variant)
+        if near is not None:
+            return near
+    result = PREDICT_MODES[mode](image, model, class_names, k)
+    if result["top_fonts"]:
+        if cache is not None:
+            cache.put(data, variant, result, digest)
+        if index is not None:
+            index.add(image_hash, image, variant, result)
+    return result
+
+
+def predict_font(image: Image.Image, model: "InferenceBackend", class_names: list) -> Tuple[str, float]:
+    result = predict_font_topk(image, model, class_names)
+    return result["font"], result["confidence"]
+
+
+def iter_predict_fonts(images: Iterable, model: "InferenceBackend",
+                       class_names: list) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    """
+    Batched prediction over many images.
+    - Decodes/preprocesses in the shared thread pool, a bounded number of images ahead
+    - Runs the model once per batch of up to `max_batch_size` images
+    - Yields [(index, result), ...] as each batch completes (see predict_font_topk)
+    - Byte sources are looked up in the prediction cache first; hits skip the model
+    """
+    if model is None:
+        for i, _ in enumerate(images):
+            yield [(i, failed_prediction("Model not available"))]
+        return
+
+    cache = get_prediction_cache(model)
+    if cache is None:
+        yield from _iter_predict_fonts(images, model, class_names)
+        return
+
+    variant = prediction_variant("whole", get_model_settings())
+    hits = []
+    in_flight = {}  # position among the misses -> (index, bytes), for storing results
+
+    def misses():
+        position = 0
+        for i, source in enumerate(images):
+            data = source if isinstance(source, bytes) else None
+            hit = cache.get(data, variant) if data is not None else None
+            if hit is not None:
+                hits.append((i, hit))
+                continue
+            in_flight[position] = (i, data)
+            position += 1
+            yield source
+
+    for batch in _iter_predict_fonts(misses(), model, class_names):
+        results = hits[:]
+        hits.clear()
+        for position, result in batch:
+            i, data = in_flight.pop(position)
+            if data is not None and result["top_fonts"]:
+                cache.put(data, variant, result)
+            results.append((i, result))
+        yield sorted(results, key=lambda r: r[0])
+    if hits:
+        yield hits
+
+
+def _iter_predict_fonts(images: Iterable, model: "InferenceBackend",
+                        class_names: list) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    settings = get_model_settings()
+    batch_size = settings.max_batch_size
+    family_index = get_family_index(class_names)
+    worker_pool = get_worker_pool(model)
+    if worker_pool is not None:
+        yield from _iter_predict_fonts_pool(images, worker_pool, class_names, family_index, settings)
+        return
+
+    pool = get_preprocess_pool()
+    sources = enumerate(images)
+    pending = deque()
+
+    def fill():
+        # Keep two batches in flight so decoding overlaps with inference
+        for i, source in sources:
+            pending.append((i, pool.submit(prepare_image, source)))
+            if len(pending) >= 2 * batch_size:
+                return
+
+    fill()
+    while pending:
+        chunk = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+        fill()
+
+        results, ready, tensors = [], [], []
+        for i, future in chunk:
+            try:
+                tensors.append(future.result())
+                ready.append(i)
+            except Exception:
+                results.append((i, failed_prediction("Unknown Font")))
+
+        if tensors:
+            try:
+                outputs = run_model(model, torch.stack(tensors))
+                results.extend(zip(ready, rank_predictions(outputs, class_names, family_index, settings.top_k)))
+            except Exception:
+                results.extend((i, failed_prediction("Unknown Font")) for i in ready)
+
+        yield sorted(results, key=lambda r: r[0])
+
+
+def _iter_predict_fonts_pool(images: Iterable, worker_pool: "WorkerPool", class_names: list,
+                             family_index: FamilyIndex,
+                             settings: ModelConfig) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    """iter_predict_fonts on the worker processes: decoding and forwards both happen in the pool"""
+    batch_size = settings.max_batch_size
+    sources = enumerate(images)
+    pending = deque()
+
+    def fill():
+        for i, source in sources:
+            try:
+                pending.append((i, worker_pool.submit(source)))
+            except Exception:
+                pending.append((i, None))
+            if len(pending) >= 2 * batch_size:
+                return
+
+    fill()
+    while pending:
+        chunk = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+        fill()
+        results = []
+        for i, future in chunk:
+            try:
+                outputs = future.result()
+                results.append((i, rank_predictions(outputs, class_names, family_index, settings.top_k)[0]))
+            except Exception:
+                results.append((i, failed_prediction("Unknown Font")))
+        yield results
+
+
+def predict_fonts(images: Iterable, model: "InferenceBackend", class_names: list) -> List[Dict[str, Any]]:
+    """Predict many images at once; returns one predict_font_topk-style result per image, in input order."""
+    results = {}
+    for batch in iter_predict_fonts(images, model, class_names):
+        results.update(batch)
+    return [results[i] for i in sorted(results)]
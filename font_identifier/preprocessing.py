@@ -0,0 +1,77 @@
+"""
+Image preprocessing for Font Identifier
+Turns uploads (PIL images, paths, bytes, file-like objects) into model input tensors
+"""
+
+import io
+from functools import lru_cache
+
+import torch
+from PIL import Image
+
+# Model input size (square)
+INPUT_SIZE = 224
+
+
+@lru_cache(maxsize=None)
+def _transform(resize: bool):
+    # torchvision is only imported once an image is actually preprocessed
+    from torchvision import transforms
+
+    steps = [transforms.Grayscale(num_output_channels=3)]  # if fonts were grayscale
+    if resize:
+        steps.append(transforms.Resize((INPUT_SIZE, INPUT_SIZE)))  # adjust to match training size
+    steps += [
+        transforms.ToTensor(),
+        transforms.Normalize([0.5], [0.5]),  # adjust if you used different normalization
+    ]
+    return transforms.Compose(steps)
+
+
+# Define preprocessing (must match training setup!)
+def preprocess(image: Image.Image):
+    return _transform(True)(image)
+
+def tile_offsets(width: int, stride: int, max_tiles: int, size: int = INPUT_SIZE) -> list:
+    """Left edges of square tiles covering [0, width); evenly thinned to at most max_tiles."""
+    if width <= size:
+        return [0]
+    last = width - size
+    offsets = list(range(0, last + 1, max(1, stride)))
+    if offsets[-1] != last:
+        offsets.append(last)
+    if len(offsets) > max_tiles:
+        step = (len(offsets) - 1) / max(1, max_tiles - 1)
+        offsets = [offsets[round(i * step)] for i in range(max_tiles)]
+    return offsets
+
+# Aspect-preserving variant for wide text strips
+def preprocess_tiles(image: Image.Image, stride: int = INPUT_SIZE // 2, max_tiles: int = 16) -> torch.Tensor:
+    """
+    Resize to the model's input height keeping the aspect ratio, then cut
+    overlapping square tiles. Returns a (tiles, 3, H, W) tensor.
+    Strips narrower than a tile are padded with the background colour.
+    """
+    gray = image.convert("L")
+    width = max(1, round(gray.width * INPUT_SIZE / gray.height))
+    gray = gray.resize((width, INPUT_SIZE), Image.BILINEAR)
+    if width < INPUT_SIZE:
+        background = sorted(gray.getdata())[len(gray.getdata()) // 2]
+        canvas = Image.new("L", (INPUT_SIZE, INPUT_SIZE), background)
+        canvas.paste(gray, ((INPUT_SIZE - width) // 2, 0))
+        gray, width = canvas, INPUT_SIZE
+
+    strip = _transform(False)(gray)
+    return torch.stack([strip[:, :, x:x + INPUT_SIZE] for x in tile_offsets(width, stride, max_tiles)])
+
+def open_image(source) -> Image.Image:
+    """PIL image from a PIL image, path, bytes or file-like object"""
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray)):
+        return Image.open(io.BytesIO(source))
+    return Image.open(source)
+
+def prepare_image(source) -> torch.Tensor:
+    """Decode an upload (PIL image, path, bytes or file-like) into a model input tensor."""
+    return preprocess(open_image(source).convert("RGB")).to(torch.float32)
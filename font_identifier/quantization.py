@@ -0,0 +1,187 @@
+"""
+INT8 quantized inference for Font Identifier
+Static post-training quantization of the convolutions, dynamic quantization of the fc head
+
+Usage (accuracy/latency report against fp32):
+    python quantization.py --model model.pth
+"""
+
+import argparse
+import copy
+import glob
+import json
+import os
+import time
+from typing import Dict, Any, Iterator, List, Optional
+
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from .labels import BASE_DIR
+from .preprocessing import INPUT_SIZE, preprocess
+
+CALIBRATION_DIR = os.path.join(BASE_DIR, "data", "syn_train_one_font")
+REPORT_DIRS = [
+    os.path.join(BASE_DIR, "data", "test_img"),
+    os.path.join(BASE_DIR, "data", "real_test_sample"),
+]
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def quantized_cache_path(model_path: str) -> str:
+    """Where the INT8 model for a given model file is cached (model.pth -> model.int8.pt)"""
+    root, _ = os.path.splitext(model_path)
+    return root + ".int8.pt"
+
+
+def _source_stamp(model_path: str, calibration_limit: int) -> Dict[str, Any]:
+    stat = os.stat(model_path)
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime), "calibration_limit": calibration_limit,
+            "torch": torch.__version__}
+
+
+def _quant_engine() -> str:
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError("No quantized engine available in this torch build")
+
+
+def image_files(directory: str, limit: Optional[int] = None) -> List[str]:
+    """Image files under a directory (recursive), sorted for reproducibility"""
+    files = sorted(f for f in glob.glob(os.path.join(directory, "**", "*"), recursive=True)
+                   if f.lower().endswith(IMAGE_EXTENSIONS))
+    return files[:limit] if limit else files
+
+
+def image_batches(files: List[str], batch_size: int = 16) -> Iterator[torch.Tensor]:
+    """Preprocessed (N, 3, 224, 224) batches for a list of image files"""
+    for start in range(0, len(files), batch_size):
+        tensors = [preprocess(Image.open(f).convert("RGB")) for f in files[start:start + batch_size]]
+        yield torch.stack(tensors).to(torch.float32)
+
+
+def quantize_model(model: nn.Module, calibration_dir: str = CALIBRATION_DIR,
+                   calibration_limit: int = 128) -> torch.jit.ScriptModule:
+    """
+    Post-training quantization:
+    - convolutions: static INT8, observers calibrated on `calibration_dir`
+    - fc head: dynamic INT8
+    Returns a traced TorchScript module that can be saved and reloaded without the Python graph.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    engine = _quant_engine()
+    torch.backends.quantized.engine = engine
+    example = torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE)
+
+    # Keep the head out of static quantization; it is dynamically quantized below
+    qconfig_mapping = get_default_qconfig_mapping(engine).set_module_name("fc", None)
+    prepared = prepare_fx(copy.deepcopy(model).eval(), qconfig_mapping, (example,))
+
+    files = image_files(calibration_dir, calibration_limit)
+    if not files:
+        raise FileNotFoundError(f"No calibration images found in {calibration_dir}")
+    with torch.no_grad():
+        for batch in image_batches(files):
+            prepared(batch)
+
+    quantized = quantize_dynamic(convert_fx(prepared), {nn.Linear}, dtype=torch.qint8)
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(quantized, example).eval())
+
+
+def load_quantized_model(model: nn.Module, model_path: str, calibration_dir: str = CALIBRATION_DIR,
+                         calibration_limit: int = 128) -> torch.jit.ScriptModule:
+    """INT8 model for `model_path`, from the on-disk cache when it matches, otherwise quantized and cached"""
+    cache_path = quantized_cache_path(model_path)
+    stamp = _source_stamp(model_path, calibration_limit)
+
+    if os.path.exists(cache_path):
+        extra = {"source.json": ""}
+        try:
+            torch.backends.quantized.engine = _quant_engine()
+            cached = torch.jit.load(cache_path, map_location="cpu", _extra_files=extra)
+            if json.loads(extra["source.json"] or "{}") == stamp:
+                return cached
+        except Exception:
+            pass
+
+    quantized = quantize_model(model, calibration_dir, calibration_limit)
+    tmp_path = cache_path + ".tmp"
+    torch.jit.save(quantized, tmp_path, _extra_files={"source.json": json.dumps(stamp)})
+    os.replace(tmp_path, cache_path)
+    return quantized
+
+
+def _timed_predictions(model: nn.Module, files: List[str]):
+    preds, elapsed = [], 0.0
+    with torch.no_grad():
+        for batch in image_batches(files, batch_size=1):
+            started = time.perf_counter()
+            outputs = model(batch)
+            elapsed += time.perf_counter() - started
+            preds.append(int(outputs.argmax(dim=1)))
+    return preds, elapsed
+
+
+def compare_models(reference: nn.Module, candidate: nn.Module,
+                   directories: List[str] = REPORT_DIRS) -> Dict[str, Any]:
+    """Top-1 agreement and batch-1 latency of `candidate` against `reference`, per directory"""
+    report = {}
+    for directory in directories:
+        files = image_files(directory)
+        if not files:
+            continue
+        ref_preds, ref_time = _timed_predictions(reference, files)
+        cand_preds, cand_time = _timed_predictions(candidate, files)
+        agree = sum(a == b for a, b in zip(ref_preds, cand_preds))
+        report[os.path.relpath(directory, BASE_DIR)] = {
+            "images": len(files),
+            "top1_agreement": agree / len(files),
+            "fp32_ms_per_image": ref_time / len(files) * 1000.0,
+            "int8_ms_per_image": cand_time / len(files) * 1000.0,
+            "speedup": ref_time / cand_time if cand_time else 0.0,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the font model to INT8 and compare it with fp32")
+    parser.add_argument("--model", default=os.path.join(BASE_DIR, "model.pth"), help="Path to model.pth")
+    parser.add_argument("--calibration-dir", default=CALIBRATION_DIR)
+    parser.add_argument("--calibration-limit", type=int, default=128, help="Calibration images to use")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    from .backends import load_model_file
+    from .labels import read_class_names
+    from .settings import ModelConfig
+    from .threads import apply_thread_budget
+
+    apply_thread_budget(ModelConfig())  # same automatic budget as the app
+    model = load_model_file(args.model, len(read_class_names()))
+    if model is None:
+        raise SystemExit(f"Could not load model from {args.model}")
+
+    started = time.perf_counter()
+    quantized = load_quantized_model(model, args.model, args.calibration_dir, args.calibration_limit)
+    print(f"INT8 model ready in {time.perf_counter() - started:.1f}s -> {quantized_cache_path(args.model)}")
+    print(f"Size: fp32 {os.path.getsize(args.model) / 1e6:.1f} MB, "
+          f"int8 {os.path.getsize(quantized_cache_path(args.model)) / 1e6:.1f} MB")
+
+    report = compare_models(model, quantized)
+    for name, row in report.items():
+        print(f"{name:<24} images={row['images']:<4} top1 agreement={row['top1_agreement']:.1%}  "
+              f"fp32={row['fp32_ms_per_image']:.1f} ms  int8={row['int8_ms_per_image']:.1f} ms  "
+              f"speedup={row['speedup']:.2f}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Text-region segmentation for Font Identifier
+Finds text lines and word blocks in screenshots using projection profiles
+"""
+
+import math
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Profiles are computed on a copy reduced to at most this many pixels on the long side
+ANALYSIS_MAX_SIDE = 1600
+# Minimum grey-level difference from the background that counts as ink
+MIN_INK_CONTRAST = 40
+# Lines shorter than this (in analysis pixels) are treated as noise
+MIN_LINE_HEIGHT = 6
+# Word gap relative to line height; smaller gaps are letter spacing
+WORD_GAP_RATIO = 0.25
+# Padding around each crop relative to line height
+CROP_PADDING_RATIO = 0.15
+
+
+@dataclass
+class TextRegion:
+    """A word block found in an image"""
+    box: Tuple[int, int, int, int]  # left, top, right, bottom in original pixels
+    line: int  # index of the text line the block belongs to
+
+    @property
+    def area(self) -> int:
+        left, top, right, bottom = self.box
+        return (right - left) * (bottom - top)
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """(start, end) pairs of consecutive True values; end is exclusive"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges.reshape(-1, 2)
+
+
+def _merge_runs(runs: np.ndarray, max_gap: int) -> np.ndarray:
+    """Merge runs separated by at most `max_gap` positions"""
+    if len(runs) < 2:
+        return runs
+    gaps = runs[1:, 0] - runs[:-1, 1]
+    breaks = np.flatnonzero(gaps > max_gap)
+    starts = runs[np.concatenate(([0], breaks + 1)), 0]
+    ends = runs[np.concatenate((breaks, [len(runs) - 1])), 1]
+    return np.stack([starts, ends], axis=1)
+
+
+def ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Boolean ink mask; the median grey level is taken as background, so light and dark themes both work"""
+    diff = np.abs(gray.astype(np.int16) - int(np.median(gray)))
+    threshold = max(MIN_INK_CONTRAST, int(np.percentile(diff, 99.5)) // 2)
+    return diff >= threshold
+
+
+def find_text_regions(image: Image.Image, max_regions: int = 24) -> List[TextRegion]:
+    """
+    Split an image into word blocks, in reading order.
+    - Horizontal projection profile -> text lines
+    - Vertical profile inside each line -> word blocks
+    - At most `max_regions` blocks are kept (largest first); the whole image
+      is returned as a single region if no text is found
+    """
+    width, height = image.size
+    gray_image = image.convert("L")
+    factor = max(1, math.ceil(max(width, height) / ANALYSIS_MAX_SIDE))
+    if factor > 1:
+        gray_image = gray_image.reduce(factor)
+    mask = ink_mask(np.asarray(gray_image))
+
+    rows = mask.sum(axis=1)
+    lines = _merge_runs(_runs(rows >= max(1, mask.shape[1] // 500)), max_gap=1)
+    lines = lines[(lines[:, 1] - lines[:, 0]) >= MIN_LINE_HEIGHT]
+
+    regions: List[TextRegion] = []
+    for line_no, (top, bottom) in enumerate(lines):
+        line_height = int(bottom - top)
+        cols = _runs(mask[top:bottom].any(axis=0))
+        words = _merge_runs(cols, max_gap=max(2, int(line_height * WORD_GAP_RATIO)))
+        pad = int(line_height * CROP_PADDING_RATIO)
+        for left, right in words:
+            box = (
+                max(0, (int(left) - pad) * factor),
+                max(0, (int(top) - pad) * factor),
+                min(width, (int(right) + pad) * factor),
+                min(height, (int(bottom) + pad) * factor),
+            )
+            regions.append(TextRegion(box=box, line=line_no))
+
+    if not regions:
+        return [TextRegion(box=(0, 0, width, height), line=0)]
+    if len(regions) > max_regions:
+        keep = sorted(regions, key=lambda r: r.area, reverse=True)[:max_regions]
+        regions = sorted(keep, key=lambda r: (r.line, r.box[0]))
+    return regions
+
+
+def crop_regions(image: Image.Image, regions: List[TextRegion]) -> List[Image.Image]:
+    """Crop each region out of the image"""
+    return [image.crop(region.box) for region in regions]
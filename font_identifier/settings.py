@@ -0,0 +1,57 @@
+"""
+Model settings for Font Identifier
+The model section of the app configuration; config.settings loads it from the environment
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass
+class ModelConfig:
+    """Model configuration"""
+    path: str = "model.pth"
+    device: str = "auto"  # auto, cpu, cuda
+    backend: str = "torch"  # torch, onnxruntime
+    confidence_threshold: float = 0.5
+    max_image_size: int = 2048  # pixels
+    top_k: int = 5  # fonts/families listed per prediction
+    max_regions: int = 24  # text blocks classified per image when segmenting
+    tile_stride: int = 112  # pixels between sliding-window tiles (tiles are 224 wide)
+    max_tiles: int = 16  # tiles per image in sliding-window mode
+    quantization: str = "none"  # none, int8 (cached next to the model file)
+    quantization_calibration_images: int = 128
+    # Load-time graph optimization passes
+    fold_batchnorm: bool = True
+    channels_last: bool = False
+    freeze_model: bool = True
+    onednn_autotune: bool = True  # enable oneDNN only if a self-check shows it stable and faster
+    compiled_cache: bool = True  # reuse the optimized TorchScript artifact under TORCH_HOME
+    shared_store: bool = True  # keep model files once under TORCH_HOME, linked into the app dir
+    # Thread budget (0 = automatic from the available cores)
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    expected_concurrency: int = 1  # forwards running at the same time
+    split_cores: bool = False  # divide cores between concurrent forwards
+    # Startup warmup (dummy batches at every served batch size) before reporting ready
+    warmup_enabled: bool = True
+    warmup_rounds: int = 2
+    # Micro-batching dispatcher shared by all sessions
+    batching_enabled: bool = True
+    max_batch_size: int = 16
+    batch_window_ms: float = 5.0  # how long to wait for more requests
+    max_queue_depth: int = 256  # pending requests before new ones are rejected
+    preprocess_workers: int = 4  # threads decoding/preprocessing multi-image uploads
+    # Inference worker processes (0 = run in the app process)
+    worker_processes: int = 0
+    worker_threads: int = 0  # torch threads per worker (0 = cores / worker_processes)
+    # Host inference daemon (daemon.py); used when reachable, empty path disables it
+    daemon_socket: str = "/tmp/font_identifier.sock"
+    daemon_timeout: float = 30.0  # seconds per request
+    # Prediction cache keyed by upload SHA-256 + model version; empty path disables it
+    prediction_cache: str = "prediction_cache.db"
+    prediction_cache_mb: int = 64  # size cap; least recently used entries are evicted
+    # In-memory perceptual-hash index reusing results for near-duplicate uploads (0 entries = off)
+    near_duplicate_entries: int = 4096
+    near_duplicate_distance: int = 24  # max differing bits of the 256-bit dHash (candidates are then verified)
+    # Reload a changed model file in the background and swap it in (seconds between checks, 0 = off)
+    hot_swap_interval: float = 0.0
@@ -0,0 +1,77 @@
+"""
+Single-flight coalescing for Font Identifier
+Concurrent predictions of the same content share one computation: the first caller
+runs it and everyone else arriving while it is in flight waits for its result
+"""
+
+import copy
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Log a stats line every N calls
+STATS_EVERY = 1000
+
+
+def image_digest(image: Image.Image) -> str:
+    """Content hash of decoded pixels (mode and size included)"""
+    digest = hashlib.sha256(f"{image.mode}:{image.size}".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """
+    Deduplicates in-flight calls by key. Results are not kept once the call finishes
+    (that is the prediction cache's job); this only collapses simultaneous duplicates.
+    Callers that joined a call get their own deep copy of a snapshot taken when it
+    finished, so one caller mutating its result (e.g. adding per-request fields),
+    the first one included, does not affect the others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._executed = 0
+        self._coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self._executed += 1
+            else:
+                self._coalesced += 1
+            calls = self._executed + self._coalesced
+        if calls % STATS_EVERY == 0:
+            logger.info(f"Single-flight: {self.stats()}")
+
+        if not leader:
+            return copy.deepcopy(call.result())
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(copy.deepcopy(result))  # the leader's caller keeps the only reference to `result`
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "executed": self._executed,
+                "coalesced": self._coalesced,  # forwards saved
+                "in_flight": len(self._calls),
+            }
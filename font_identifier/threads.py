@@ -0,0 +1,126 @@
+"""
+Thread budget management for Font Identifier
+Sizes torch intra-op/inter-op thread pools from the available cores and the
+expected number of concurrent forwards (calibration: threads.py at the app root)
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+_interop_configured = False
+
+
+@dataclass
+class ThreadBudget:
+    """Threads per forward (intra-op) and for parallel graph branches (inter-op)"""
+    cores: int
+    intra_op: int
+    inter_op: int
+    concurrency: int
+
+
+def available_cores() -> int:
+    """CPU cores usable by this process, honouring affinity masks and cgroup CPU quotas (containers)"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cores = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cores = min(cores, max(1, int(quota)))
+    return max(1, cores)
+
+
+def plan_thread_budget(model_config, cores: Optional[int] = None) -> ThreadBudget:
+    """
+    Thread budget for the configured settings; 0 means automatic:
+    - intra-op: all cores, or cores / expected_concurrency with split_cores so
+      concurrent forwards do not oversubscribe each other
+    - inter-op: 1 (ResNet has no parallel branches worth scheduling)
+    """
+    cores = cores or available_cores()
+    concurrency = max(1, model_config.expected_concurrency)
+    intra = model_config.intra_op_threads
+    if intra <= 0:
+        intra = max(1, cores // concurrency) if model_config.split_cores else cores
+    inter = model_config.inter_op_threads if model_config.inter_op_threads > 0 else 1
+    return ThreadBudget(cores=cores, intra_op=intra, inter_op=inter, concurrency=concurrency)
+
+
+def apply_thread_budget(model_config) -> ThreadBudget:
+    """Configure torch's thread pools; inter-op threads can only be set once per process"""
+    global _interop_configured
+    import torch
+
+    budget = plan_thread_budget(model_config)
+    torch.set_num_threads(budget.intra_op)
+    if not _interop_configured:
+        try:
+            torch.set_num_interop_threads(budget.inter_op)
+        except RuntimeError:
+            # Already fixed once parallel work has started
+            pass
+        _interop_configured = True
+    logger.info("Thread budget: %d cores, %d intra-op x %d concurrent forwards, %d inter-op",
+                budget.cores, budget.intra_op, budget.concurrency, budget.inter_op)
+    return budget
+
+
+def measure_throughput(model, intra_op: int, concurrency: int, batch_size: int = 1,
+                       duration: float = 3.0) -> float:
+    """Images per second with `concurrency` threads forwarding batches at `intra_op` threads each"""
+    import torch
+
+    torch.set_num_threads(intra_op)
+    batch = torch.randn(batch_size, 3, 224, 224)
+    with torch.no_grad():
+        model(batch)  # warm up
+    counts = [0] * concurrency
+    stop = time.perf_counter() + duration
+
+    def _worker(i: int):
+        torch.set_num_threads(intra_op)
+        with torch.no_grad():
+            while time.perf_counter() < stop:
+                model(batch)
+                counts[i] += batch_size
+
+    workers = [threading.Thread(target=_worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def candidate_settings(cores: int) -> List[tuple]:
+    """(intra_op, concurrency) pairs that use at most all cores"""
+    intra_options = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+    return [(intra, concurrency) for concurrency in (1, 2, 4) for intra in intra_options
+            if intra * concurrency <= cores]
+
@@ -0,0 +1,360 @@
+"""
+Memory-mapped model weights for Font Identifier
+Stores the ResNet-18 weights in the safetensors layout (JSON header + raw little-endian
+tensors) with the architecture, class count and preprocessing in the header metadata.
+Loading maps the file and builds the model on top of the mapped pages: no unpickling,
+no copies and no random initialization of weights that are overwritten anyway.
+
+Weights can also be stored at reduced precision for distribution (fp16, or int8 with a
+per-output-channel scale for conv/linear weights); they are expanded to fp32 at load.
+
+Usage:
+    python weights.py --model model.pth               # writes model.safetensors next to it
+    python weights.py --model model.pth --benchmark   # load time + resident memory, .pth vs mapped
+    python weights.py --model model.pth --precision int8   # writes model.int8.safetensors
+    python weights.py --model model.pth --report      # size and accuracy of fp16/int8 vs fp32
+"""
+
+import argparse
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import subprocess
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+from .preprocessing import INPUT_SIZE
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS_SUFFIX = ".safetensors"
+ARCHITECTURE = "resnet18"
+# Must match font_identifier.preprocessing
+PREPROCESSING = {"input_size": INPUT_SIZE, "grayscale": True, "mean": [0.5], "std": [0.5]}
+# Header sanity limit; real headers for ResNet-18 are ~10 KB
+MAX_HEADER_BYTES = 16 * 1024 * 1024
+PRECISIONS = ("fp32", "fp16", "int8")
+# Per-channel scales of an int8 tensor are stored under "<name>:scale"
+SCALE_SUFFIX = ":scale"
+
+DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+DTYPE_NAMES = {dtype: name for name, dtype in DTYPES.items()}
+
+
+def weights_path(model_path: str, precision: str = "fp32") -> str:
+    """Where the weights for a model file live (model.pth -> model.safetensors, model.int8.safetensors)"""
+    root, _ = os.path.splitext(model_path)
+    return root + ("" if precision == "fp32" else f".{precision}") + WEIGHTS_SUFFIX
+
+
+def _source_stamp(model_path: str) -> Dict[str, str]:
+    stat = os.stat(model_path)
+    return {"source_size": str(stat.st_size), "source_mtime": str(int(stat.st_mtime))}
+
+
+def read_header(path: str) -> Tuple[Dict[str, Any], int]:
+    """(header, offset of the tensor data); raises ValueError if `path` is not a weights file"""
+    with open(path, "rb") as f:
+        prefix = f.read(8)
+        if len(prefix) < 8:
+            raise ValueError(f"{path}: too short for a weights file")
+        (length,) = struct.unpack("<Q", prefix)
+        if not 2 <= length <= MAX_HEADER_BYTES:
+            raise ValueError(f"{path}: not a weights file")
+        raw = f.read(length)
+    if not raw.startswith(b"{"):
+        raise ValueError(f"{path}: not a weights file")
+    return json.loads(raw), 8 + length
+
+
+def is_weights_file(path: str) -> bool:
+    try:
+        read_header(path)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def save_weights(state_dict: Dict[str, torch.Tensor], path: str, metadata: Dict[str, str]):
+    """Write tensors in the safetensors layout, atomically"""
+    tensors = {name: t.detach().cpu().contiguous() for name, t in state_dict.items()}
+    # Largest element size first: with an 8-byte aligned data start, every tensor is
+    # aligned to its own element size, which torch.frombuffer needs
+    order = sorted(tensors, key=lambda name: (-tensors[name].element_size(), name))
+    header: Dict[str, Any] = {"__metadata__": metadata}
+    offset = 0
+    for name in order:
+        t = tensors[name]
+        size = t.numel() * t.element_size()
+        header[name] = {"dtype": DTYPE_NAMES[t.dtype], "shape": list(t.shape), "data_offsets": [offset, offset + size]}
+        offset += size
+    raw = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    raw += b" " * (-len(raw) % 8)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(struct.pack("<Q", len(raw)))
+        f.write(raw)
+        for name in order:
+            t = tensors[name]
+            if t.numel():
+                f.write(t.reshape(-1).view(torch.uint8).numpy().tobytes())
+    os.replace(tmp, path)
+
+
+def load_weights(path: str) -> Tuple[Dict[str, torch.Tensor], Dict[str, str]]:
+    """
+    (state_dict, metadata) with every tensor a view of a private (copy-on-write) mapping
+    of the file: pages are read lazily and shared with the page cache until written.
+    """
+    header, data_start = read_header(path)
+    metadata = header.pop("__metadata__", {})
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    state = {}
+    for name, info in header.items():
+        dtype = DTYPES.get(info.get("dtype"))
+        if dtype is None:
+            raise ValueError(f"{path}: {name} has unknown dtype {info.get('dtype')!r}")
+        begin, end = info["data_offsets"]
+        shape = info["shape"]
+        count = math.prod(shape)
+        if not 0 <= begin <= end or end - begin != count * torch.empty((), dtype=dtype).element_size():
+            raise ValueError(f"{path}: {name} has offsets {begin}-{end} that do not match its shape {shape}")
+        if data_start + end > size:
+            raise ValueError(f"{path}: truncated ({size} bytes, {name} ends at {data_start + end})")
+        if not count:
+            state[name] = torch.empty(shape, dtype=dtype)
+            continue
+        state[name] = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + begin).reshape(shape)
+    return state, metadata
+
+
+def encode_state(state: Dict[str, torch.Tensor], precision: str) -> Dict[str, torch.Tensor]:
+    """
+    Reduce precision at rest:
+    - fp16: every floating-point tensor as half
+    - int8: conv/linear weights as symmetric int8 with one fp32 scale per output channel;
+      biases and batch-norm statistics (~0.1% of the bytes) stay fp32
+    """
+    if precision == "fp32":
+        return dict(state)
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}")
+    encoded = {}
+    for name, t in state.items():
+        if not t.is_floating_point():
+            encoded[name] = t
+        elif precision == "fp16":
+            encoded[name] = t.to(torch.float16)
+        elif t.dim() >= 2:
+            flat = t.detach().float().reshape(t.shape[0], -1)
+            scale = (flat.abs().amax(dim=1) / 127.0).clamp(min=1e-12)
+            encoded[name] = torch.round(flat / scale[:, None]).clamp(-127, 127).to(torch.int8).reshape(t.shape)
+            encoded[name + SCALE_SUFFIX] = scale
+        else:
+            encoded[name] = t
+    return encoded
+
+
+def decode_state(state: Dict[str, torch.Tensor], precision: str) -> Dict[str, torch.Tensor]:
+    """fp32 state_dict from encode_state output (fp32 tensors are passed through untouched)"""
+    if precision == "fp32":
+        return state
+    decoded = {}
+    for name, t in state.items():
+        if name.endswith(SCALE_SUFFIX):
+            continue
+        scale = state.get(name + SCALE_SUFFIX)
+        if scale is not None:
+            decoded[name] = t.to(torch.float32) * scale.reshape(-1, *([1] * (t.dim() - 1)))
+        elif t.is_floating_point() and t.dtype != torch.float32:
+            decoded[name] = t.to(torch.float32)
+        else:
+            decoded[name] = t
+    return decoded
+
+
+def build_resnet18(num_classes: int, state: Dict[str, torch.Tensor]) -> nn.Module:
+    """
+    ResNet-18 with `state` loaded. When `state` covers every parameter the module is
+    built on the meta device and the tensors are adopted as-is (assign=True), so no
+    weights are allocated, initialized or copied.
+    """
+    from torchvision import models as tv_models
+
+    def new_model():
+        model = tv_models.resnet18(weights=None)
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+        return model
+
+    try:
+        with torch.device("meta"):
+            model = new_model()
+        if set(model.state_dict()) <= set(state):
+            model.load_state_dict(state, strict=False, assign=True)
+            return model.eval()
+    except (AttributeError, TypeError, RuntimeError):
+        # torch < 2.1 (no meta device context / assign), or shape mismatches
+        pass
+    model = new_model()
+    model.load_state_dict(state, strict=False)
+    return model.eval()
+
+
+def load_weights_model(path: str, num_classes: int) -> nn.Module:
+    state, metadata = load_weights(path)
+    state = decode_state(state, metadata.get("precision", "fp32"))
+    if metadata.get("architecture", ARCHITECTURE) != ARCHITECTURE:
+        raise ValueError(f"{path}: unsupported architecture {metadata.get('architecture')!r}")
+    stored_classes = int(metadata.get("num_classes", num_classes))
+    if stored_classes != num_classes:
+        logger.warning(f"{path} has {stored_classes} classes but the label file has {num_classes}")
+    spec = json.loads(metadata.get("preprocessing", "{}"))
+    if spec and spec != PREPROCESSING:
+        logger.warning(f"{path} was trained with preprocessing {spec}, serving uses {PREPROCESSING}")
+    return build_resnet18(stored_classes, state)
+
+
+def fresh_weights_path(model_path: str) -> Optional[str]:
+    """The converted sibling of `model_path` if it exists and was made from this exact file"""
+    path = weights_path(model_path)
+    if path == model_path or not os.path.exists(path):
+        return None
+    try:
+        header, _ = read_header(path)
+        metadata = header.get("__metadata__", {})
+        stamp = _source_stamp(model_path)
+        if all(metadata.get(key) == value for key, value in stamp.items()):
+            return path
+        logger.warning(f"Ignoring {path}: it was converted from a different {os.path.basename(model_path)}")
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable {path}: {e}")
+    return None
+
+
+def convert(model_path: str, num_classes: int, output: Optional[str] = None, precision: str = "fp32") -> str:
+    """One-shot conversion of a .pth checkpoint (state_dict or pickled ResNet-18) or weights file"""
+    from .backends import load_model_file
+
+    model = load_model_file(model_path, num_classes, prefer_mapped=False)
+    if model is None:
+        raise ValueError(f"Could not load {model_path}")
+    state = model.state_dict()
+    reference = build_resnet18(num_classes, {}).state_dict()
+    if set(state) != set(reference) or any(state[k].shape != reference[k].shape for k in reference):
+        raise ValueError(f"{model_path} is not a ResNet-18 with {num_classes} classes")
+
+    output = output or weights_path(model_path, precision)
+    metadata = {
+        "format": "pt",
+        "architecture": ARCHITECTURE,
+        "num_classes": str(num_classes),
+        "preprocessing": json.dumps(PREPROCESSING),
+        "precision": precision,
+    }
+    # Only the full-precision sibling is picked up automatically in place of model.pth
+    if precision == "fp32" and os.path.abspath(output) == os.path.abspath(weights_path(model_path)):
+        metadata.update(_source_stamp(model_path))
+    save_weights(encode_state(state, precision), output, metadata)
+    return output
+
+
+def precision_report(model_path: str, num_classes: int, precisions=("fp16", "int8")) -> Dict[str, Any]:
+    """Artifact size and accuracy against the fp32 model for each reduced precision"""
+    from .backends import load_model_file
+    from .quantization import REPORT_DIRS, image_batches, image_files
+
+    reference = load_model_file(model_path, num_classes, prefer_mapped=False)
+    if reference is None:
+        raise ValueError(f"Could not load {model_path}")
+    files = [f for directory in REPORT_DIRS for f in image_files(directory)]
+    with torch.no_grad():
+        reference_probs = torch.cat([torch.softmax(reference(batch), dim=1) for batch in image_batches(files)]) \
+            if files else None
+
+    report = {"source": {"path": model_path, "mb": round(os.path.getsize(model_path) / 1e6, 2)}}
+    for precision in ("fp32",) + tuple(precisions):
+        output = convert(model_path, num_classes, weights_path(model_path, precision), precision)
+        row: Dict[str, Any] = {"path": output, "mb": round(os.path.getsize(output) / 1e6, 2)}
+        row["size_vs_fp32"] = round(row["mb"] / report["fp32"]["mb"], 3) if precision != "fp32" else 1.0
+        if reference_probs is not None and precision != "fp32":
+            candidate = load_weights_model(output, num_classes)
+            with torch.no_grad():
+                probs = torch.cat([torch.softmax(candidate(batch), dim=1) for batch in image_batches(files)])
+            row["images"] = len(files)
+            row["top1_agreement"] = round(float((probs.argmax(1) == reference_probs.argmax(1)).float().mean()), 4)
+            row["max_prob_diff"] = round(float((probs - reference_probs).abs().max()), 6)
+        report[precision] = row
+    return report
+
+
+def _measure_load(path: str, num_classes: int) -> Dict[str, float]:
+    """Load in a fresh interpreter (imports excluded): seconds and resident memory growth (MB)"""
+    code = (
+        "import json, resource, time\n"
+        "import torch, torchvision.models\n"
+        "from font_identifier.backends import load_model_file\n"
+        "def rss(): return int(open('/proc/self/statm').read().split()[1]) * resource.getpagesize() / 2**20\n"
+        "rss0, start = rss(), time.perf_counter()\n"
+        f"model = load_model_file({path!r}, {num_classes}, prefer_mapped=False)\n"
+        "print(json.dumps({'load_s': round(time.perf_counter() - start, 4), 'rss_mb': round(rss() - rss0, 1)}))\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # where font_identifier is importable
+    out = subprocess.run([sys.executable, "-c", code], cwd=root,
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert model.pth to memory-mapped weights")
+    parser.add_argument("--model", help="Path to model.pth (default: config)")
+    parser.add_argument("--output", help="Output path (default: next to the model, .safetensors)")
+    parser.add_argument("--precision", choices=PRECISIONS, default="fp32",
+                        help="Storage precision; fp16/int8 shrink downloads and are expanded to fp32 at load")
+    parser.add_argument("--benchmark", action="store_true", help="Compare load time and resident memory")
+    parser.add_argument("--report", action="store_true", help="Write fp32/fp16/int8 artifacts and compare them")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from .labels import read_class_names
+    from .model import get_model_settings, resolve_model_path
+
+    model_path = args.model or resolve_model_path(get_model_settings().path)
+    num_classes = len(read_class_names())
+    if args.report:
+        report = precision_report(model_path, num_classes)
+        for name, row in report.items():
+            accuracy = (f"  top1 agreement={row['top1_agreement']:.1%}  max prob diff={row['max_prob_diff']:.4f}"
+                        if "top1_agreement" in row else "")
+            print(f"{name:<7} {row['mb']:>7.1f} MB  {row['path']}{accuracy}")
+        return
+
+    output = convert(model_path, num_classes, args.output, args.precision)
+    print(f"Wrote {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+    if args.benchmark:
+        report = {"pth": _measure_load(model_path, num_classes), "mapped": _measure_load(output, num_classes)}
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
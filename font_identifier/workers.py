@@ -0,0 +1,320 @@
+"""
+Process-pool inference workers for Font Identifier
+Decoding, preprocessing and forwards run in worker processes, outside the GIL of the
+Streamlit interpreter; the workers share one copy of the model weights
+"""
+
+import itertools
+import logging
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import torch
+import torch.multiprocessing as mp
+
+from .inference import InferenceQueueFull
+
+logger = logging.getLogger(__name__)
+
+# Jobs are retried once on a restarted worker; a job that kills a worker twice is failed
+MAX_ATTEMPTS = 2
+# How often the supervisor checks worker liveness when idle
+POLL_INTERVAL = 0.05
+# Imported once by the fork server, so starting (or restarting) a worker does not repeat it
+FORKSERVER_PRELOAD = ["torch", "torch.multiprocessing", "font_identifier.backends", "font_identifier.preprocessing"]
+
+
+def worker_context():
+    """
+    forkserver where available, else spawn. Workers are never forked from the app process:
+    by the time the pool starts it has run forwards (optimizer benchmarks, oneDNN self-check,
+    warmup), and OpenMP thread pools do not survive fork. The torch.multiprocessing context
+    sends tensors in shared memory as handles, so workers map the parent's weights.
+    """
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload(FORKSERVER_PRELOAD)
+        return ctx
+    return mp.get_context("spawn")
+
+
+class WorkerCrashed(RuntimeError):
+    """Raised for a job whose worker process died while running it"""
+
+
+@dataclass
+class _Job:
+    job_id: int
+    source: Any
+    future: Future
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class _Worker:
+    """Parent-side handle of one worker process"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.tasks = None
+        self.results = None
+        self.outstanding: Dict[int, _Job] = {}
+
+
+def _worker_main(backend, prepare: Callable, tasks, results, num_threads: int,
+                 max_batch_size: int, warmup_sizes: Sequence[int]):
+    """Worker loop: take up to `max_batch_size` queued jobs, run them as one batch, send back logits"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl+C and shuts us down
+    parent = mp.parent_process()
+    backend.after_fork(num_threads)
+    if warmup_sizes:
+        backend.warmup(warmup_sizes)
+
+    while True:
+        try:
+            item = tasks.get(timeout=1.0)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                break  # parent was killed without shutting us down
+            continue
+        if item is None:
+            break
+        items = [item]
+        while len(items) < max_batch_size:
+            try:
+                item = tasks.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                tasks.put(None)
+                break
+            items.append(item)
+
+        ready, tensors = [], []
+        for job_id, source in items:
+            try:
+                tensors.append(prepare(source))
+                ready.append(job_id)
+            except Exception as e:
+                results.send((job_id, None, f"preprocessing failed: {e}"))
+        if not tensors:
+            continue
+        try:
+            outputs = backend.infer_batch(torch.stack(tensors)).to(torch.float32).numpy()
+            for job_id, row in zip(ready, outputs):
+                results.send((job_id, row, None))
+        except Exception as e:
+            for job_id in ready:
+                results.send((job_id, None, f"inference failed: {e}"))
+
+
+class WorkerPool:
+    """
+    Pool of inference processes.
+
+    Workers are started from a fork server (see worker_context). The parent moves the
+    model weights to shared memory once (backend.share_memory()) and every worker,
+    restarted ones included, attaches to them, so N workers cost one copy of the
+    weights. Backends that cannot share (ONNX Runtime sessions, INT8 packed weights)
+    are sent as a recipe instead and each worker loads its own copy; with the
+    compiled artifact cache (model_cache.py) that is a quick load. Callers submit raw
+    inputs (bytes, paths, PIL images); a supervisor thread hands them to the least
+    busy worker, collects the logits and restarts workers that die.
+    """
+
+    def __init__(self, backend, prepare: Callable, processes: int = 2, threads_per_worker: int = 1,
+                 max_batch_size: int = 16, max_queue_depth: int = 256,
+                 warmup_sizes: Sequence[int] = ()):
+        self.backend = backend
+        self.prepare = prepare
+        self.threads_per_worker = max(1, int(threads_per_worker))
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.warmup_sizes = tuple(warmup_sizes)
+        self._ctx = worker_context()
+        self.shared_weights = backend.share_memory()
+        self._pending: "queue.Queue[_Job]" = queue.Queue(maxsize=max(1, int(max_queue_depth)))
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._completed = 0
+        self._failed = 0
+        self._restarts = 0
+        self._rejected = 0
+
+        self._workers: List[_Worker] = [_Worker(i) for i in range(max(1, int(processes)))]
+        for worker in self._workers:
+            self._start(worker)
+        self._thread = threading.Thread(target=self._supervise, name="font-worker-supervisor", daemon=True)
+        self._thread.start()
+        logger.info("Started %d inference worker processes (%d threads each, %s)",
+                    len(self._workers), self.threads_per_worker,
+                    "shared weights" if self.shared_weights else "one model copy each")
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, source: Any) -> Future:
+        """Queue one image (bytes, path, file-like or PIL image); the future resolves to (1, classes) logits"""
+        if self._closed:
+            raise RuntimeError("Worker pool is closed")
+        job = _Job(job_id=next(self._ids), source=source, future=Future())
+        try:
+            self._pending.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise InferenceQueueFull(f"Worker pool queue is full ({self._pending.maxsize} pending)")
+        return job.future
+
+    def infer(self, source: Any, timeout: Optional[float] = None) -> torch.Tensor:
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(source).result(timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "alive": sum(1 for w in self._workers if w.process is not None and w.process.is_alive()),
+                "queue_depth": self._pending.qsize(),
+                "in_flight": sum(len(w.outstanding) for w in self._workers),
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "restarts": self._restarts,
+                "shared_weights": self.shared_weights,
+            }
+
+    def close(self, timeout: float = 5.0):
+        """Stop the workers; jobs that have not finished are failed"""
+        if self._closed:
+            return
+        self._closed = True
+        self._thread.join(timeout)
+        for worker in self._workers:
+            self._stop(worker, timeout)
+            self._fail(worker.outstanding.values(), RuntimeError("Worker pool is closed"))
+            worker.outstanding.clear()
+        while True:
+            try:
+                job = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            self._fail([job], RuntimeError("Worker pool is closed"))
+
+    # ------------------------------------------------------------------
+    # Supervisor
+    # ------------------------------------------------------------------
+
+    def _start(self, worker: _Worker):
+        worker.tasks = self._ctx.Queue()
+        receiver, sender = self._ctx.Pipe(duplex=False)
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.backend, self.prepare, worker.tasks, sender, self.threads_per_worker,
+                  self.max_batch_size, self.warmup_sizes),
+            name=f"font-inference-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        sender.close()
+        worker.results = receiver
+
+    def _stop(self, worker: _Worker, timeout: float):
+        if worker.process is None:
+            return
+        try:
+            worker.tasks.put(None)
+        except Exception:
+            pass
+        worker.process.join(timeout)
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(timeout)
+        worker.tasks.cancel_join_thread()
+        worker.tasks.close()
+        worker.results.close()
+
+    def _restart(self, worker: _Worker):
+        exitcode = worker.process.exitcode
+        worker.tasks.cancel_join_thread()
+        worker.tasks.close()
+        worker.results.close()
+        jobs = list(worker.outstanding.values())
+        worker.outstanding.clear()
+        with self._lock:
+            self._restarts += 1
+        logger.warning(f"Inference worker {worker.index} died (exit code {exitcode}); restarting "
+                       f"with {len(jobs)} jobs in flight")
+        self._start(worker)
+
+        retry = [job for job in jobs if job.attempts < MAX_ATTEMPTS]
+        self._fail([job for job in jobs if job.attempts >= MAX_ATTEMPTS],
+                   WorkerCrashed(f"Inference worker {worker.index} died (exit code {exitcode})"))
+        for job in retry:
+            self._send(worker, job)
+
+    def _send(self, worker: _Worker, job: _Job):
+        job.attempts += 1
+        worker.outstanding[job.job_id] = job
+        worker.tasks.put((job.job_id, job.source))
+
+    def _fail(self, jobs, error: Exception):
+        for job in jobs:
+            if not job.future.done():
+                job.future.set_exception(error)
+                with self._lock:
+                    self._failed += 1
+
+    def _collect(self, worker: _Worker) -> bool:
+        """Drain results from one worker; False if its pipe is closed (worker died)"""
+        try:
+            while worker.results.poll():
+                job_id, logits, error = worker.results.recv()
+                job = worker.outstanding.pop(job_id, None)
+                if job is None or job.future.done():
+                    continue
+                if error is None:
+                    job.future.set_result(torch.from_numpy(logits).unsqueeze(0))
+                    with self._lock:
+                        self._completed += 1
+                else:
+                    self._fail([job], RuntimeError(error))
+        except (EOFError, OSError):
+            return False
+        return True
+
+    def _dispatch(self):
+        """Hand pending jobs to the least busy workers, up to one batch each in flight"""
+        while True:
+            worker = min(self._workers, key=lambda w: len(w.outstanding))
+            if len(worker.outstanding) >= self.max_batch_size:
+                return
+            try:
+                job = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            if job.future.set_running_or_notify_cancel():
+                self._send(worker, job)
+
+    def _supervise(self):
+        while not self._closed:
+            handles = [w.results for w in self._workers] + [w.process.sentinel for w in self._workers]
+            try:
+                wait(handles, timeout=POLL_INTERVAL)
+                for worker in self._workers:
+                    alive = self._collect(worker)
+                    if not alive or not worker.process.is_alive():
+                        self._collect(worker)  # results sent just before it exited
+                        self._restart(worker)
+                self._dispatch()
+            except Exception as e:
+                logger.warning(f"Worker pool supervisor error: {e}")
+                time.sleep(POLL_INTERVAL)
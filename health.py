@@ -0,0 +1,8 @@
+"""
+Model readiness tracking for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.health
+"""
+
+from font_identifier.health import (  # noqa: F401
+    FAILED, LOADING, READY, WARMING, Readiness, readiness, ready_file, serving_batch_sizes, start_warmup, warmup,
+)
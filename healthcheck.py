@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Container health probe for Font Identifier
+Healthy only when the Streamlit server responds AND the model has finished warming up.
+
+Exit codes: 0 healthy, 1 not ready / unhealthy
+"""
+
+import json
+import os
+import sys
+import urllib.request
+
+from font_identifier.health import READY, ready_file
+
+PORT = os.getenv("STREAMLIT_SERVER_PORT", "8501")
+BASE_URL = os.getenv("HEALTHCHECK_URL", "http://localhost:{}".format(PORT))
+TIMEOUT = 10
+
+
+def _get(path: str, timeout: float = TIMEOUT) -> bool:
+    try:
+        with urllib.request.urlopen(BASE_URL + path, timeout=timeout) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+
+def _read_status() -> dict:
+    try:
+        with open(ready_file("streamlit", PORT)) as f:
+            status = json.load(f)
+        os.kill(int(status.get("pid", 0)), 0)  # stale file from a previous process?
+        return status
+    except Exception:
+        return {}
+
+
+def main() -> int:
+    if not (_get("/_stcore/health") or _get("/")):
+        print("server: down")
+        return 1
+
+    status = _read_status()
+    if not status:
+        # The model loads on the first script run; trigger one so the app warms up without a visitor
+        _get("/_stcore/script-health-check", timeout=2)
+        print("model: not loaded")
+        return 1
+
+    print(f"model: {status.get('state')}")
+    return 0 if status.get("state") == READY else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""
+Shared micro-batching inference dispatcher for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.inference
+"""
+
+from font_identifier.inference import InferenceDispatcher, InferenceQueueFull  # noqa: F401
@@ -4,32 +4,41 @@ import json
 import sqlite3
 import hashlib
 import base64
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple
 from datetime import datetime, timedelta
 import streamlit as st
 from PIL import Image
 import streamlit.components.v1 as components
-from torchvision import models as tv_models
-import torch
-import torch.nn as nn
-
-st.set_page_config(
-    page_title="Font Identifier & Recorder", 
-    layout="wide",
-    page_icon="🖋️",
-    initial_sidebar_state="auto",
-    menu_items={
-        'Get Help': 'https://github.com/your-repo/issues',
-        'Report a bug': 'https://github.com/your-repo/issues',
-        'About': "# Font Identifier\nAI-powered font identification with screen recording capabilities."
-    }
+
+from font_identifier.backends import InferenceBackend
+from font_identifier.health import FAILED, LOADING, READY, readiness, ready_file
+# Core library (no Streamlit); re-exported here for scripts that imported them from main
+from font_identifier.model import load_model_and_classes, model_lease, read_class_names  # noqa: F401
+from font_identifier.predict import (  # noqa: F401
+    get_family_index,
+    iter_predict_fonts,
+    predict_font,
+    predict_font_bytes,
+    predict_font_regions,
+    predict_font_tiled,
+    predict_font_topk,
+    predict_fonts,
 )
 
-try: 
-    import utils 
-    HAS_UTILS = True 
-except Exception:
-    HAS_UTILS = False
+def configure_page():
+    """Page config must be the first Streamlit call of every script run."""
+    st.set_page_config(
+        page_title="Font Identifier & Recorder", 
+        layout="wide",
+        page_icon="🖋️",
+        initial_sidebar_state="auto",
+        menu_items={
+            'Get Help': 'https://github.com/your-repo/issues',
+            'Report a bug': 'https://github.com/your-repo/issues',
+            'About': "# Font Identifier\nAI-powered font identification with screen recording capabilities."
+        }
+    )
+
 # ====================================================
 #               EVENT LOOP SAFETY (ASYNCIO)
 # ====================================================
@@ -48,30 +57,20 @@ os.environ["STREAMLIT_WATCH_SYSTEM_PYTHON"] = "false"
 
 # Path for recordings
 RECORDINGS_DIR = os.path.join("backend", "recordings")
-os.makedirs(RECORDINGS_DIR, exist_ok=True)
-
-# ====================================================
-#               TORCH CPU FIXES
-# ====================================================
-try:
-    import torch.backends.mkldnn as mkldnn
-    mkldnn.enabled = False
-except Exception:
-    pass
 
 # ====================================================
 #                 CONSTANTS / PATHS
 # ====================================================
 APP_BRAND = "🖋️ Font Identifier"
 DB_PATH = "app_users.db"
-MODEL_PATH = "model.pth"
-LABELS_PATH = os.path.join("data", "fontlist.txt")
 
 # -----------------------------
 # === PWA AND MOBILE SETUP ===
 
-# PWA Meta tags and manifest
-st.markdown("""
+def inject_styles():
+    """PWA tags and the global stylesheet, injected on every script run."""
+    # PWA Meta tags and manifest
+    st.markdown("""
 <meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
 <meta name="theme-color" content="#6366f1">
 <meta name="apple-mobile-web-app-capable" content="yes">
@@ -95,10 +94,10 @@ st.markdown("""
     });
   }
 </script>
-""", unsafe_allow_html=True)
+    """, unsafe_allow_html=True)
 
-# === GLOBAL APP DESIGN (Dark + Mixed Colors + Glassmorphism + Mobile Responsive) ===
-st.markdown("""
+    # === GLOBAL APP DESIGN (Dark + Mixed Colors + Glassmorphism + Mobile Responsive) ===
+    st.markdown("""
 <style>
 /* ===== Root Colors ===== */
 :root {
@@ -421,7 +420,7 @@ p {
   }
 }
 </style>
-""", unsafe_allow_html=True)
+    """, unsafe_allow_html=True)
 
 
 
@@ -445,8 +444,6 @@ def init_db():
     con.commit()
     con.close()
 
-init_db()
-
 def _hash_password(password: str, salt: Optional[str] = None) -> str:
     """Salted SHA-256 (simple, dependency-free). Format: salt$hash"""
     if salt is None:
@@ -506,161 +503,6 @@ def authenticate(username: str, password: str) -> bool:
     except Exception:
         return False
 
-# ====================================================
-#                 MODEL & INFERENCE
-# ====================================================
-
-def read_class_names() -> list:
-    path = LABELS_PATH
-    if not os.path.isabs(path):
-        path = os.path.join(os.path.dirname(__file__), path)
-    if not os.path.exists(path):
-        # fallback dummy classes
-        return [f"Font_{i}" for i in range(10)]
-    with open(path, "r", encoding="utf-8") as f:
-        return [line.strip() for line in f if line.strip()]
-
-def download_model_from_url(model_path: str, url: str = None) -> bool:
-    """
-    Download model from URL or create a demo model.
-    This function is silent (no UI output) to avoid distracting users.
-    """
-    try:
-        if url:
-            import requests
-            response = requests.get(url, stream=True, timeout=60)
-            response.raise_for_status()
-            with open(model_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            return True
-        else:
-            # Fallback: Create demo model with pretrained backbone
-            model = tv_models.resnet18(weights='IMAGENET1K_V1')  # Use pretrained weights
-            num_classes = len(read_class_names())
-            model.fc = nn.Linear(model.fc.in_features, max(num_classes, 10))
-            torch.save(model.state_dict(), model_path)
-            return True
-    except Exception:
-        return False
-
-def is_git_lfs_pointer(file_path: str) -> bool:
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read(200)
-            return content.startswith('version https://git-lfs.github.com/spec/v1')
-    except Exception:
-        return False
-
-def validate_model_file(model_path: str) -> bool:
-    if not os.path.exists(model_path):
-        return False
-    if is_git_lfs_pointer(model_path):
-        return False
-    file_size = os.path.getsize(model_path)
-    if file_size < 1000:
-        return False
-    try:
-        with open(model_path, 'rb') as f:
-            header = f.read(100)
-            if not (header.startswith(b'\x80\x02') or header.startswith(b'\x80\x03') or header.startswith(b'\x80\x04') or header.startswith(b'PK')):
-                return False
-    except Exception:
-        return False
-    return True
-
-@st.cache_resource
-def load_model_and_classes() -> Tuple[torch.nn.Module, list]:
-    """
-    Silent model loader for production UX.
-    - Validates presence/format
-    - Tries download sources or demo creation silently
-    - Attempts multiple load strategies without UI logs
-    """
-    classes = read_class_names()
-
-    # Resolve model path
-    model_path = MODEL_PATH
-    if not os.path.isabs(model_path):
-        model_path = os.path.join(os.path.dirname(__file__), model_path)
-
-    # Ensure we have a valid file; try to obtain one silently
-    if not validate_model_file(model_path):
-        model_sources = []
-        env_url = os.getenv('MODEL_DOWNLOAD_URL')
-        if env_url:
-            model_sources.append(env_url)
-        try:
-            from model_config import MODEL_DOWNLOAD_URL as CFG_URL, FALLBACK_MODEL_URLS as CFG_URLS
-            if CFG_URL:
-                model_sources.append(CFG_URL)
-            model_sources.extend(CFG_URLS)
-        except Exception:
-            pass
-        loaded = False
-        for url in model_sources:
-            if url and download_model_from_url(model_path, url):
-                loaded = True
-                break
-        if not loaded:
-            # Final attempt: create demo model silently
-            download_model_from_url(model_path, None)
-
-    # If still invalid, return None
-    if not validate_model_file(model_path):
-        return None, classes
-
-    # Try to load without exposing strategies to the user
-    try:
-        ckpt = torch.load(model_path, map_location="cpu", weights_only=False)
-        if isinstance(ckpt, nn.Module):
-            model = ckpt
-            try:
-                model.eval()
-            except Exception:
-                pass
-            return model, classes
-    except Exception:
-        pass
-
-    # Fallback: assume state_dict
-    model = tv_models.resnet18(weights=None)
-    model.fc = nn.Linear(model.fc.in_features, len(classes))
-    try:
-        state = torch.load(model_path, map_location="cpu", weights_only=True)
-        if isinstance(state, dict) and "state_dict" in state and isinstance(state["state_dict"], dict):
-            state = state["state_dict"]
-        model.load_state_dict(state, strict=False)
-    except Exception:
-        # If load fails, return None to disable prediction features
-        return None, classes
-    model.eval()
-    return model, classes
-
-def preprocess_fallback(image: Image.Image) -> torch.Tensor:
-    """Used only if utils.preprocess is unavailable."""
-    from torchvision import transforms
-    t = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-    ])
-    return t(image)
-
-def predict_font(image: Image.Image, model: torch.nn.Module, class_names: list) -> Tuple[str, float]:
-    if model is None:
-        return "Model not available", 0.0
-    try:
-        model_input = (utils.preprocess(image) if HAS_UTILS else preprocess_fallback(image)).unsqueeze(0)
-        model_input = model_input.to(torch.float32)
-        with torch.no_grad():
-            outputs = model(model_input)
-            probs = torch.softmax(outputs, dim=1)
-            conf, idx = torch.max(probs, 1)
-        return class_names[idx.item()], float(conf.item())
-    except Exception:
-        return "Unknown Font", 0.0
-
 # ====================================================
 #                 NAV / ROUTING HELPERS
 # ====================================================
@@ -852,7 +694,7 @@ def page_login():
             st.error("Invalid username or password.")
 
 
-def page_dashboard(model: torch.nn.Module, class_names: list):
+def page_dashboard(model: InferenceBackend, class_names: list):
     if not st.session_state.get("logged_in"):
         st.warning("Please log in to access the dashboard.")
         set_query_params(nav="login")
@@ -863,25 +705,73 @@ def page_dashboard(model: torch.nn.Module, class_names: list):
     with c1: st.markdown('<div class="kpi">Current User<br><b>{}</b></div>'.format(st.session_state["username"]), unsafe_allow_html=True)
     with c2: st.markdown('<div class="kpi">Predictions Today<br><b>—</b></div>', unsafe_allow_html=True)
     
-    # Third KPI can show a neutral status to avoid noisy UI
-    with c3: st.markdown('<div class="kpi">Status<br><b>Ready</b></div>', unsafe_allow_html=True)
+    # Third KPI reflects model readiness (warmup runs in the background after a deploy)
+    status = {READY: "Ready", LOADING: "Loading…", FAILED: "Unavailable"}.get(readiness.state, "Warming up…")
+    if model is None:
+        status = "Unavailable"
+    with c3: st.markdown('<div class="kpi">Status<br><b>{}</b></div>'.format(status), unsafe_allow_html=True)
 
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.subheader("Run a Prediction")
 
-    uploaded = st.file_uploader("Upload an image of text", type=["jpg", "jpeg", "png"], disabled=(model is None))
-    if uploaded and model is not None:
-        image = Image.open(uploaded).convert("RGB")
+    uploads = st.file_uploader("Upload images of text", type=["jpg", "jpeg", "png"],
+                               accept_multiple_files=True, disabled=(model is None))
+    if len(uploads) == 1 and model is not None:
+        image = Image.open(uploads[0]).convert("RGB")
         st.image(image, caption="Uploaded image", use_container_width=True)
+        mode = st.radio("Analysis mode", ["Whole image", "Text lines & words", "Wide strip (sliding window)"],
+                        horizontal=True,
+                        help="Whole image: classify the upload as one block (the original behaviour). "
+                             "Lines & words: classify each word block and combine the votes. "
+                             "Wide strip: keep the aspect ratio and average overlapping square tiles.")
         if st.button("🔍 Predict Font", type="primary"):
             with st.spinner("Analyzing font..."):
                 try:
-                    name, conf = predict_font(image, model, class_names)
-                    st.success(f"Predicted Font: **{name}**")
-                    st.caption(f"Confidence: {conf:.2%}")
+                    modes = {"Text lines & words": "regions", "Wide strip (sliding window)": "tiled"}
+                    result = predict_font_bytes(uploads[0].getvalue(), model, class_names,
+                                                mode=modes.get(mode, "whole"))
+                    st.success(f"Predicted Font: **{result['font']}**")
+                    st.caption(f"Confidence: {result['confidence']:.2%}")
+                    if result["top_fonts"]:
+                        col_fonts, col_families = st.columns(2)
+                        with col_fonts:
+                            st.markdown("**Top fonts**")
+                            st.dataframe([{"Font": r["font"], "Confidence": f"{r['confidence']:.2%}"}
+                                          for r in result["top_fonts"]], hide_index=True)
+                        with col_families:
+                            st.markdown("**Top families**")
+                            st.dataframe([{"Family": r["family"], "Confidence": f"{r['confidence']:.2%}"}
+                                          for r in result["top_families"]], hide_index=True)
+                    if len(result.get("regions", [])) > 1:
+                        with st.expander(f"Per-region breakdown ({len(result['regions'])} regions)"):
+                            st.dataframe([{
+                                "Line": r["line"] + 1,
+                                "Box": ", ".join(str(v) for v in r["box"]),
+                                "Font": r["font"],
+                                "Confidence": f"{r['confidence']:.2%}",
+                            } for r in result["regions"]], hide_index=True)
                 except Exception as e:
                     st.error("Prediction failed. Please try another image.")
-    elif uploaded and model is None:
+    elif uploads and model is not None:
+        st.caption(f"{len(uploads)} images selected")
+        if st.button(f"🔍 Predict {len(uploads)} Fonts", type="primary"):
+            progress = st.progress(0.0, text="Analyzing fonts...")
+            table = st.empty()
+            rows = []
+            try:
+                for batch in iter_predict_fonts((u.getvalue() for u in uploads), model, class_names):
+                    rows.extend({
+                        "File": uploads[i].name,
+                        "Predicted Font": r["font"],
+                        "Confidence": f"{r['confidence']:.2%}",
+                        "Family": r["top_families"][0]["family"] if r["top_families"] else "—",
+                        "Family Confidence": f"{r['top_families'][0]['confidence']:.2%}" if r["top_families"] else "—",
+                    } for i, r in batch)
+                    progress.progress(len(rows) / len(uploads), text=f"Analyzed {len(rows)}/{len(uploads)}")
+                    table.dataframe(rows, use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.error("Prediction failed. Please try other images.")
+    elif uploads and model is None:
         st.error("Prediction unavailable at the moment.")
 
     st.markdown('</div>', unsafe_allow_html=True)
@@ -1116,6 +1006,11 @@ def page_saved_recordings():
 # ====================================================
 
 def main():
+    configure_page()
+    # This server's status file for the container health probe (healthcheck.py)
+    readiness.configure(ready_file("streamlit", st.get_option("server.port")))
+    inject_styles()
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
     try:
         # Initialize session state for payment selection
         if "selected_payment" not in st.session_state:
@@ -1127,12 +1022,15 @@ def main():
         # Load model & class names once
         global model, class_names
         model, class_names = load_model_and_classes()
+        get_family_index(class_names)
         
         # If user is logged in → sidebar navigation
         if st.session_state.get("logged_in"):
             choice = sidebar_nav_logged_in()
             if choice == "Dashboard":
-                page_dashboard(model, class_names)
+                # Pinned for this run: a model hot-swapped meanwhile is released once the run finishes
+                with model_lease() as (model, class_names):
+                    page_dashboard(model, class_names)
             elif choice == "Screen Record":
                 page_screen_record()
             elif choice == "Saved Recordings":
@@ -0,0 +1,9 @@
+"""
+Compiled model artifact cache for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.model_cache
+"""
+
+from font_identifier.model_cache import (  # noqa: F401
+    artifact_key, artifact_path, cache_dir, compile_settings, load_artifact, prune_artifacts, save_artifact,
+    torch_home,
+)
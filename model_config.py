@@ -3,8 +3,15 @@
 
 # Primary model download URL (set this to your hosted model URL)
 MODEL_DOWNLOAD_URL = None  # e.g., "https://your-domain.com/models/font_model.pth"
+# A reduced-precision artifact from `python weights.py --precision int8` (4x smaller) can be
+# hosted instead of model.pth; it is recognised by content and expanded to fp32 at load
 
-# Alternative model URLs (tried in order if primary fails)
+# SHA-256 of the hosted model file (e.g. `sha256sum model.pth`); downloads that do not
+# match are discarded. Can also be set with the MODEL_SHA256 environment variable
+MODEL_SHA256 = None
+
+# Alternative model URLs (all mirrors are probed concurrently and the fastest is used;
+# chunks that fail on one mirror are retried on the others)
 FALLBACK_MODEL_URLS = [
     # Add your backup URLs here
     # "https://github.com/your-repo/releases/download/v1.0/model.pth",
@@ -0,0 +1,9 @@
+"""
+Shared model store for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.model_store
+"""
+
+from font_identifier.model_store import ModelStore, main, open_model_store, store_dir  # noqa: F401
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Load-time model optimization for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.optimize
+"""
+
+from font_identifier.optimize import PassResult, benchmark, fold_batchnorm, optimize_model  # noqa: F401
@@ -0,0 +1,11 @@
+"""
+INT8 quantized inference for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.quantization
+"""
+
+from font_identifier.quantization import (  # noqa: F401
+    CALIBRATION_DIR, compare_models, load_quantized_model, main, quantize_model, quantized_cache_path,
+)
+
+if __name__ == "__main__":
+    main()
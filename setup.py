@@ -79,6 +79,7 @@ setup(
     extras_require={
         "dev": dev_requirements,
         "gpu": ["torch[cuda]", "torchvision[cuda]"],
+        "onnx": ["onnxruntime>=1.16.0", "onnx>=1.14.0"],
         "payment": ["paypalrestsdk>=1.13.1", "stripe>=10.6.0"],
     },
     entry_points={
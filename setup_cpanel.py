@@ -169,9 +169,9 @@ os.environ.update({{
     'STREAMLIT_SERVER_ENABLE_CORS': 'true',
     'STREAMLIT_SERVER_ENABLE_XSRF_PROTECTION': 'false',
     'PYTHONPATH': str(app_dir),
-    'TORCH_HOME': str(app_dir / 'torch_cache'),
-    'MPLBACKEND': 'Agg',
-    'OMP_NUM_THREADS': '1'
+    # Per-account cache shared by every install, so model files and compiled artifacts are kept once
+    'TORCH_HOME': os.environ.get('TORCH_HOME', str(Path.home() / '.cache' / 'torch')),
+    'MPLBACKEND': 'Agg'
 }})
 
 def application(environ, start_response):
@@ -280,11 +280,13 @@ RewriteRule ^(.*)$ /font_identifier/wsgi.py/$1 [QSA,L]
             fontlist_path.write_text('\\n'.join(fonts))
             print("   ✅ Default font list created")
             
-        # Create empty model file if needed  
+        # Move an uploaded model into the shared store (one copy per account, linked into each install);
+        # without one, the app links a stored model matching MODEL_SHA256 or downloads it on first start
         model_path = self.current_dir / 'model.pth'
-        if not model_path.exists():
-            model_path.touch()
-            print("   ✅ Empty model file created")
+        venv_python = self.current_dir / 'venv' / 'bin' / 'python'
+        if model_path.exists() and model_path.stat().st_size > 1000:
+            if self.run_command(f"{venv_python} model_store.py --add {model_path}") is not None:
+                print("   ✅ Model added to the shared model store")
             
         # Create database file if needed
         db_path = self.current_dir / 'app_users.db'
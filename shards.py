@@ -0,0 +1,372 @@
+"""
+Sharded work queue for Font Identifier batch jobs
+Splits a manifest into shards on a shared filesystem; nodes claim shards through lease
+files, checkpoint results per shard and merge the outputs once every shard is done
+
+Layout of a work directory:
+    plan.json               shard count, item count and source, written once by the planner
+    shards/00000.jsonl      the items of each shard
+    leases/00000.lease      held while a node works on a shard (mtime = heartbeat)
+    results/00000.<lease>.partial
+                            results written so far by one lease holder (the checkpoint)
+    results/00000.jsonl     renamed from the holder's .partial when the shard is complete
+    nodes/<node>.json       per-node throughput
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLost(Exception):
+    """Another node took over a shard whose lease had expired"""
+
+
+def _write_atomic(path: str, data: str):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Lease:
+    """
+    Exclusive claim on a resource via O_EXCL file creation, which is atomic on local
+    filesystems and NFSv3+. A lease whose mtime is older than `ttl` is expired and can
+    be taken over by renaming it away. Two nodes can both see it expired; the second
+    rename then moves the first node's fresh lease, which the second node notices and
+    puts back (os.link does not overwrite) instead of claiming the resource.
+    """
+
+    def __init__(self, path: str, owner: str, ttl: float):
+        self.path = path
+        self.owner = owner
+        self.ttl = ttl
+        self.id = uuid.uuid4().hex  # names this holder's files, e.g. its shard checkpoint
+        self.token = f"{owner}:{self.id}"
+
+    def acquire(self) -> bool:
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            if not self._expired(self.path):
+                return False
+            moved = f"{self.path}.expired.{uuid.uuid4().hex}"
+            try:
+                os.rename(self.path, moved)
+            except FileNotFoundError:
+                return False
+            if not self._expired(moved):
+                # Another node took it over between our check and our rename: give it back
+                try:
+                    os.link(moved, self.path)
+                except OSError:
+                    pass  # a third node already holds a new lease; the one we moved is lost
+                os.unlink(moved)
+                return False
+            os.unlink(moved)
+            logger.warning(f"Took over expired lease {self.path}")
+            return self.acquire()
+        with os.fdopen(fd, "w") as f:
+            f.write(self.token)
+        return True
+
+    def _expired(self, path: str) -> bool:
+        try:
+            return time.time() - os.stat(path).st_mtime > self.ttl
+        except FileNotFoundError:
+            return True
+
+    def held(self) -> bool:
+        try:
+            with open(self.path, "r") as f:
+                return f.read() == self.token
+        except FileNotFoundError:
+            return False
+
+    def renew(self) -> bool:
+        """Refresh the heartbeat; False if the lease is no longer ours"""
+        if not self.held():
+            return False
+        os.utime(self.path)
+        return True
+
+    def release(self):
+        if self.held():
+            os.unlink(self.path)
+
+
+class Shard:
+    """
+    One claimed shard: pending items after the checkpoint, result writer, completion.
+    Each lease holder writes its own .partial file, so a node that lost its lease
+    without noticing yet never appends to (or truncates) the new holder's results.
+    """
+
+    def __init__(self, queue: "ShardQueue", index: int, lease: Lease):
+        self.queue = queue
+        self.index = index
+        self.lease = lease
+        self.items_path = queue.path("shards", f"{index:05d}.jsonl")
+        self.partial_path = queue.path("results", f"{index:05d}.{lease.id}.partial")
+        self.done = self._checkpoint()
+        self.written = 0
+        self.errors = 0
+        self._out = open(self.partial_path, "a", encoding="utf-8")
+
+    def _partials(self) -> List[str]:
+        """Checkpoint files of this shard from every holder so far"""
+        prefix = f"{self.index:05d}."
+        return [self.queue.path("results", name) for name in os.listdir(self.queue.path("results"))
+                if name.startswith(prefix) and name.endswith(".partial")]
+
+    def _checkpoint(self) -> int:
+        """
+        Start from the longest checkpoint a previous holder left: copy its complete result
+        lines (not a torn last line left by a crash) into this holder's file
+        """
+        best, done, keep = None, 0, 0
+        for path in self._partials():
+            count, size = 0, 0
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    count += 1
+                    size += len(line)
+            if count > done:
+                best, done, keep = path, count, size
+        if best is not None:
+            with open(best, "rb") as src, open(self.partial_path, "wb") as dst:
+                while keep > 0:
+                    chunk = src.read(min(keep, 1 << 20))
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    keep -= len(chunk)
+            logger.info(f"Shard {self.index:05d}: resuming after {done} checkpointed items")
+        return done
+
+    def pending_items(self) -> Iterator[Dict[str, Any]]:
+        with open(self.items_path, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if i >= self.done:
+                    yield json.loads(line)
+
+    def write(self, result: Dict[str, Any]):
+        self._out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.written += 1
+        self.errors += result.get("error") is not None
+
+    def checkpoint(self):
+        """Make written results durable; raises LeaseLost if the shard was taken over"""
+        self._out.flush()
+        os.fsync(self._out.fileno())
+        if not self.lease.held():
+            raise LeaseLost(f"shard {self.index:05d}")
+
+    def complete(self):
+        self.checkpoint()
+        self._out.close()
+        os.replace(self.partial_path, self.queue.path("results", f"{self.index:05d}.jsonl"))
+        for path in self._partials():
+            try:
+                os.remove(path)  # checkpoints of earlier holders
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        if not self._out.closed:
+            self._out.close()
+        self.queue._drop(self.lease)
+
+
+class ShardQueue:
+    """Coordinator-free shard queue shared by every node pointing at `work_dir`"""
+
+    def __init__(self, work_dir: str, node_id: Optional[str] = None, lease_ttl: float = 300.0,
+                 poll_interval: float = 5.0):
+        self.work_dir = work_dir
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_ttl = lease_ttl
+        self.poll_interval = min(poll_interval, lease_ttl / 3)
+        self.stats = {"node": self.node_id, "shards": 0, "images": 0, "errors": 0, "seconds": 0.0}
+        for sub in ("shards", "leases", "results", "nodes"):
+            os.makedirs(self.path(sub), exist_ok=True)
+
+        self._held: List[Lease] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._renew_loop, name="shard-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.work_dir, *parts)
+
+    def _renew_loop(self):
+        while not self._stop.wait(self.lease_ttl / 3):
+            with self._lock:
+                held = list(self._held)
+            for lease in held:
+                if not lease.renew():
+                    logger.warning(f"Lost lease {lease.path}")
+
+    def _hold(self, lease: Lease):
+        with self._lock:
+            self._held.append(lease)
+
+    def _drop(self, lease: Lease):
+        with self._lock:
+            if lease in self._held:
+                self._held.remove(lease)
+        lease.release()
+
+    # ------------------------------------------------------------------
+    # Planning
+    # ------------------------------------------------------------------
+
+    def plan(self, items: Iterable[Dict[str, Any]], shard_size: int = 1000,
+             source: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Split `items` into shards unless another node already did; every node calls this.
+        `items` is only consumed by the node that wins the planning lease.
+        """
+        plan_path = self.path("plan.json")
+        lease = Lease(self.path("leases", "plan.lease"), self.node_id, self.lease_ttl)
+        while not os.path.exists(plan_path):
+            if lease.acquire():
+                self._hold(lease)
+                try:
+                    self._write_shards(items, shard_size, source)
+                finally:
+                    self._drop(lease)
+            else:
+                time.sleep(min(1.0, self.poll_interval))
+        with open(plan_path, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        if source is not None and plan.get("source") != source:
+            logger.warning(f"Work dir was planned for {plan.get('source')!r}, not {source!r}; using the existing plan")
+        return plan
+
+    def _write_shards(self, items: Iterable[Dict[str, Any]], shard_size: int, source: Optional[str]):
+        shards = total = 0
+        out = None
+        for item in items:
+            if total % shard_size == 0:
+                if out is not None:
+                    out.close()
+                    os.replace(out.name, out.name[:-len(".tmp")])
+                out = open(self.path("shards", f"{shards:05d}.jsonl.tmp"), "w", encoding="utf-8")
+                shards += 1
+            out.write(json.dumps(item, ensure_ascii=False) + "\n")
+            total += 1
+        if out is not None:
+            out.close()
+            os.replace(out.name, out.name[:-len(".tmp")])
+        _write_atomic(self.path("plan.json"), json.dumps(
+            {"shards": shards, "items": total, "shard_size": shard_size, "source": source,
+             "planned_by": self.node_id, "planned_at": time.time()}))
+        logger.info(f"Planned {total} items in {shards} shards of up to {shard_size}")
+
+    # ------------------------------------------------------------------
+    # Claiming
+    # ------------------------------------------------------------------
+
+    def _num_shards(self) -> int:
+        with open(self.path("plan.json"), "r", encoding="utf-8") as f:
+            return json.load(f)["shards"]
+
+    def _is_done(self, index: int) -> bool:
+        return os.path.exists(self.path("results", f"{index:05d}.jsonl"))
+
+    def remaining(self) -> List[int]:
+        return [i for i in range(self._num_shards()) if not self._is_done(i)]
+
+    def claim(self) -> Optional[Shard]:
+        """
+        Claim the next unfinished shard. While the remaining shards are held by other
+        nodes this waits, in case one of them dies and its lease expires.
+        Returns None when every shard is done.
+        """
+        while True:
+            remaining = self.remaining()
+            if not remaining:
+                return None
+            for index in remaining:
+                lease = Lease(self.path("leases", f"{index:05d}.lease"), self.node_id, self.lease_ttl)
+                if lease.acquire():
+                    # It may have been finished between listing and claiming
+                    if self._is_done(index):
+                        lease.release()
+                        continue
+                    self._hold(lease)
+                    return Shard(self, index, lease)
+            time.sleep(self.poll_interval)
+
+    # ------------------------------------------------------------------
+    # Throughput and merging
+    # ------------------------------------------------------------------
+
+    def record(self, shard: Shard, seconds: float):
+        """Add a finished shard to this node's throughput stats"""
+        stats = self.stats
+        stats["shards"] += 1
+        stats["images"] += shard.written
+        stats["errors"] += shard.errors
+        stats["seconds"] = round(stats["seconds"] + seconds, 2)
+        stats["images_per_second"] = round(stats["images"] / stats["seconds"], 2) if stats["seconds"] else 0.0
+        stats["updated_at"] = time.time()
+        _write_atomic(self.path("nodes", f"{self.node_id}.json"), json.dumps(stats))
+        logger.info(f"Shard {shard.index:05d} done: {shard.written} images in {seconds:.1f}s "
+                    f"({shard.written / seconds if seconds else 0.0:.1f} images/s)")
+
+    def node_stats(self) -> List[Dict[str, Any]]:
+        stats = []
+        for name in sorted(os.listdir(self.path("nodes"))):
+            if name.endswith(".json"):
+                with open(self.path("nodes", name), "r", encoding="utf-8") as f:
+                    stats.append(json.load(f))
+        return stats
+
+    def merge(self, output: str) -> bool:
+        """
+        Concatenate the shard results in manifest order into `output`.
+        Only one node merges; returns False if shards are unfinished or another node is merging.
+        """
+        if self.remaining():
+            return False
+        lease = Lease(self.path("leases", "merge.lease"), self.node_id, self.lease_ttl)
+        if not lease.acquire():
+            return False
+        self._hold(lease)
+        try:
+            tmp = f"{output}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as out:
+                for index in range(self._num_shards()):
+                    with open(self.path("results", f"{index:05d}.jsonl"), "rb") as f:
+                        while True:
+                            chunk = f.read(1 << 20)
+                            if not chunk:
+                                break
+                            out.write(chunk)
+            os.replace(tmp, output)
+        finally:
+            self._drop(lease)
+        logger.info(f"Merged {self._num_shards()} shards into {output}")
+        return True
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            held = list(self._held)
+        for lease in held:
+            self._drop(lease)
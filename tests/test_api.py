@@ -0,0 +1,146 @@
+import asyncio
+import threading
+
+import pytest
+
+from api import MAX_HEADER_BYTES, ApiServer, HttpError, parse_multipart, read_request
+
+BOUNDARY = "----fontid7MA4YWxk"
+
+
+class Writer:
+    def __init__(self):
+        self.written = bytearray()
+
+    def write(self, data):
+        self.written += data
+
+
+def _read(raw: bytes, max_body: int = 1024):
+    async def run():
+        reader = asyncio.StreamReader(limit=MAX_HEADER_BYTES)
+        reader.feed_data(raw)
+        reader.feed_eof()
+        writer = Writer()
+        return await read_request(reader, writer, max_body), writer
+
+    return asyncio.run(run())
+
+
+def _status(raw: bytes, max_body: int = 1024) -> int:
+    with pytest.raises(HttpError) as error:
+        _read(raw, max_body)
+    return error.value.status
+
+
+def _multipart(*parts, boundary=BOUNDARY, preamble=b"") -> bytes:
+    body = preamble
+    for disposition, data in parts:
+        body += (f"--{boundary}\r\nContent-Disposition: form-data; {disposition}\r\n"
+                 f"Content-Type: image/png\r\n\r\n").encode("latin-1") + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode("latin-1")
+
+
+def test_multipart_parts_keep_their_bytes():
+    body = _multipart(('name="file"; filename="a.png"', b"\x89PNG\r\n\r\nbinary\r\n--almost"),
+                      ('name="images"; filename="b c.png"', b""),
+                      preamble=b"ignored preamble\r\n")
+    parts = parse_multipart(body, f'multipart/form-data; boundary="{BOUNDARY}"')
+    assert parts == [("file", "a.png", b"\x89PNG\r\n\r\nbinary\r\n--almost"), ("images", "b c.png", b"")]
+
+
+def test_multipart_stops_at_the_closing_delimiter():
+    body = _multipart(('name="file"; filename="a.png"', b"one")) + b"--" + BOUNDARY.encode() + b"\r\n\r\nafter"
+    assert parse_multipart(body, f"multipart/form-data; boundary={BOUNDARY}") == [("file", "a.png", b"one")]
+
+
+def test_multipart_part_without_headers_end_is_skipped():
+    body = f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=file".encode() + _multipart(
+        ('name="file"; filename="b.png"', b"two"))
+    assert parse_multipart(body, f"multipart/form-data; boundary={BOUNDARY}") == [("file", "b.png", b"two")]
+
+
+def test_multipart_without_boundary_is_a_bad_request():
+    with pytest.raises(HttpError) as error:
+        parse_multipart(b"--x\r\n\r\ndata\r\n--x--", "multipart/form-data")
+    assert error.value.status == 400
+
+
+def test_content_length_body_and_keep_alive():
+    request, _ = _read(b"POST /v1/predict?k=3 HTTP/1.1\r\nContent-Length: 5\r\nConnection: close\r\n\r\nhello")
+    assert (request.method, request.path, request.query, request.body) == ("POST", "/v1/predict", {"k": ["3"]},
+                                                                           b"hello")
+    assert not request.keep_alive
+
+
+def test_expect_continue_is_answered():
+    request, writer = _read(b"POST / HTTP/1.1\r\nExpect: 100-continue\r\nContent-Length: 2\r\n\r\nok")
+    assert bytes(writer.written) == b"HTTP/1.1 100 Continue\r\n\r\n"
+    assert request.body == b"ok"
+
+
+def test_chunked_body_with_extensions_and_trailers():
+    raw = (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+           b"5;name=value\r\nhello\r\n7\r\n, world\r\n0\r\nX-Trailer: 1\r\n\r\n")
+    request, _ = _read(raw)
+    assert request.body == b"hello, world"
+
+
+@pytest.mark.parametrize("length, status", [("11", 413), ("-1", 400), ("1_0", 400), ("abc", 400), ("", 400)])
+def test_content_length_limits_and_garbage(length, status):
+    assert _status(f"POST / HTTP/1.1\r\nContent-Length: {length}\r\n\r\n0123456789a".encode(), max_body=10) == status
+
+
+@pytest.mark.parametrize("chunks, status", [
+    (b"b\r\n0123456789a\r\n0\r\n\r\n", 413),
+    (b"6\r\n012345\r\n6\r\n6789ab\r\n0\r\n\r\n", 413),  # the limit counts the whole body
+    (b"zz\r\nxx\r\n0\r\n\r\n", 400),
+    (b"-1\r\nx\r\n0\r\n\r\n", 400),
+    (b"0x2\r\nxx\r\n0\r\n\r\n", 400),
+    (b"2\r\nxxyy0\r\n\r\n", 400),  # chunk longer than its size
+    (b"\r\n", 400),
+])
+def test_bad_chunked_bodies(chunks, status):
+    assert _status(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n" + chunks, max_body=10) == status
+
+
+def test_post_without_length_and_malformed_request_line():
+    assert _status(b"POST / HTTP/1.1\r\nHost: x\r\n\r\n") == 411
+    assert _status(b"GARBAGE\r\n\r\n") == 400
+
+
+def test_closed_connection_is_not_a_request():
+    assert _read(b"")[0] is None
+    assert _read(b"GET / HTTP/1.1\r\nHost")[0] is None
+
+
+class ReadyService:
+    """Just enough of PredictionService for routing /healthz"""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.ready.set()
+        self.cache = self.near_duplicates = None
+
+
+@pytest.mark.parametrize("raw, status", [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"POST /v1/predict HTTP/1.1\r\nContent-Length: -4\r\n\r\n", 400),
+    (b"POST /v1/predict HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n" + b"f" * 70000 + b"\r\n", 400),
+    (b"GET /healthz HTTP/1.1\r\nX-Big: " + b"a" * 70000 + b"\r\n\r\n", 431),
+    (b"POST /v1/predict HTTP/1.1\r\nContent-Length: 2000\r\n\r\n", 413),
+    (b"GET /healthz HTTP/1.1\r\n\r\n", 200),
+], ids=["request-line", "negative-length", "endless-chunk-size", "huge-header", "too-large", "healthz"])
+def test_server_answers_malformed_requests_with_an_error_status(raw, status):
+    async def run():
+        server = await asyncio.start_server(ApiServer(ReadyService(), 1024).handle_connection,
+                                            "127.0.0.1", 0, limit=MAX_HEADER_BYTES)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(raw)
+            await writer.drain()
+            status_line = await asyncio.wait_for(reader.readline(), 5)
+            writer.close()
+            return status_line
+
+    assert asyncio.run(run()).startswith(f"HTTP/1.1 {status} ".encode())
@@ -0,0 +1,150 @@
+import json
+import os
+from multiprocessing.pool import ThreadPool
+
+import pytest
+import torch
+from PIL import Image
+
+from batch import BatchRunner, Job, iter_jobs, iter_jsonl, run_sharded, write_results
+from font_identifier.preprocessing import prepare_image
+
+CLASSES = ["Arial-Regular", "Arial-Bold", "Roboto-Regular", "Times-Italic"]
+SHADES = [0, 80, 160, 240]
+
+
+class ShadeModel:
+    """Predicts class i for an image of the i-th shade and counts the images it saw"""
+
+    def __init__(self, tmp_path):
+        path = str(tmp_path / "reference.png")
+        means = []
+        for shade in SHADES:
+            Image.new("RGB", (30, 20), (shade,) * 3).save(path)
+            means.append(prepare_image(path).mean())
+        self.means = torch.stack(means)
+        self.seen = 0
+
+    def __call__(self, batch):
+        self.seen += batch.shape[0]
+        shade = (batch.mean(dim=(1, 2, 3)).unsqueeze(1) - self.means.unsqueeze(0)).abs().argmin(dim=1)
+        return torch.nn.functional.one_hot(shade, len(CLASSES)).to(torch.float32) * 10
+
+
+def _images(tmp_path, count):
+    os.makedirs(tmp_path / "images", exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = str(tmp_path / "images" / f"{i:03d}.png")
+        Image.new("RGB", (30, 20), (SHADES[i % 4],) * 3).save(path)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def pool():
+    with ThreadPool(3) as pool:
+        yield pool
+
+
+def test_results_come_out_in_input_order(tmp_path, pool):
+    paths = _images(tmp_path, 11)
+    model = ShadeModel(tmp_path)
+    runner = BatchRunner(model, CLASSES, batch_size=3, top_k=2)
+    results = list(runner.run((Job(id=f"job-{i}", path=p) for i, p in enumerate(paths)), pool))
+    assert [r["id"] for r in results] == [f"job-{i}" for i in range(11)]
+    assert [r["font"] for r in results] == [CLASSES[i % 4] for i in range(11)]
+    assert all(r["error"] is None for r in results)
+    assert [r["timings"]["batch_size"] for r in results] == [3] * 9 + [2] * 2
+
+
+def test_unreadable_files_get_an_error_line_and_do_not_stop_the_batch(tmp_path, pool):
+    paths = _images(tmp_path, 3)
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    jobs = [Job("a", paths[0]), Job("missing", str(tmp_path / "missing.png")), Job("broken", str(broken)),
+            Job("b", paths[1])]
+    results = list(BatchRunner(ShadeModel(tmp_path), CLASSES, batch_size=4).run(jobs, pool))
+
+    assert [r["id"] for r in results] == ["a", "missing", "broken", "b"]
+    assert results[1]["error"].startswith("FileNotFoundError")
+    assert results[2]["error"].startswith("UnidentifiedImageError")
+    assert "font" not in results[1] and "font" not in results[2]
+    assert [results[0]["font"], results[3]["font"]] == [CLASSES[0], CLASSES[1]]
+    assert results[0]["timings"]["batch_size"] == 2
+
+
+def test_a_failing_forward_marks_its_batch_only(tmp_path, pool):
+    paths = _images(tmp_path, 4)
+    model = ShadeModel(tmp_path)
+    calls = []
+
+    def flaky(batch):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("out of memory")
+        return model(batch)
+
+    results = list(BatchRunner(flaky, CLASSES, batch_size=2).run([Job(str(i), p) for i, p in enumerate(paths)], pool))
+    assert [r["error"] for r in results] == ["RuntimeError: out of memory"] * 2 + [None] * 2
+    assert [r.get("font") for r in results] == [None, None, CLASSES[2], CLASSES[3]]
+
+
+def test_write_results_counts_errors(tmp_path):
+    out = tmp_path / "out.jsonl"
+    with open(out, "w", encoding="utf-8") as f:
+        summary = write_results([{"id": "a", "error": None}, {"id": "b", "error": "OSError: gone"}], f)
+    assert (summary["images"], summary["errors"]) == (2, 1)
+    assert [json.loads(line)["id"] for line in out.read_text().splitlines()] == ["a", "b"]
+
+
+def test_jsonl_jobs_accept_objects_and_bare_paths(tmp_path):
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text('{"id": "first", "path": "a.png"}\n\n"sub/b.png"\n{"image": "/abs/c.png"}\n', encoding="utf-8")
+    assert [(j.id, j.path) for j in iter_jobs(str(jobs))] == [
+        ("first", str(tmp_path / "a.png")),
+        ("sub/b.png", str(tmp_path / "sub" / "b.png")),
+        ("/abs/c.png", "/abs/c.png"),
+    ]
+
+    jobs.write_text('{"id": "x"}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="jobs.jsonl:1: job has no 'path'"):
+        list(iter_jsonl(str(jobs)))
+
+
+def test_sharded_run_resumes_and_skips_completed_work(tmp_path, pool):
+    from shards import ShardQueue
+
+    _images(tmp_path, 10)
+    source = str(tmp_path / "images")
+    work_dir = str(tmp_path / "work")
+    output = str(tmp_path / "results.jsonl")
+
+    # a node crashed after checkpointing three results of the first shard
+    crashed = ShardQueue(work_dir, node_id="crashed", lease_ttl=60)
+    crashed.plan(({"id": job.id, "path": os.path.abspath(job.path)} for job in iter_jobs(source)), 4,
+                 source=source)
+    crashed._stop.set()
+    shard = crashed.claim()
+    for item in list(shard.pending_items())[:3]:
+        shard.write({"id": item["id"], "path": item["path"], "error": None, "font": "from-checkpoint"})
+    shard.checkpoint()
+    os.utime(shard.lease.path, (0, 0))
+
+    model = ShadeModel(tmp_path)
+    runner = BatchRunner(model, CLASSES, batch_size=2)
+    run_sharded(source, runner, pool, work_dir, output, shard_size=4, node_id="node-b")
+    assert model.seen == 7
+
+    with open(output, encoding="utf-8") as f:
+        results = [json.loads(line) for line in f]
+    assert [r["id"] for r in results] == [f"{i:03d}.png" for i in range(10)]
+    assert [r["font"] for r in results[:3]] == ["from-checkpoint"] * 3
+    assert [r["font"] for r in results[3:]] == [CLASSES[i % 4] for i in range(3, 10)]
+
+    # everything is done: a restarted node runs nothing and merges the same output
+    run_sharded(source, runner, pool, work_dir, output, shard_size=4, node_id="node-c")
+    assert model.seen == 7
+    with open(output, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == results
+    shard._out.close()
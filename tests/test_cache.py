@@ -0,0 +1,67 @@
+import json
+import time
+
+from font_identifier.cache import PredictionCache
+
+
+VARIANT = "whole:k=5"
+
+
+def _result(name):
+    return {"font": name * 100, "confidence": 0.5, "top_fonts": [], "top_families": []}
+
+
+def _fill(cache, names):
+    for name in names:
+        cache.put(name.encode(), VARIANT, _result(name))
+        time.sleep(0.01)  # distinct last_used stamps
+
+
+def _room_for(entries, version="v1"):
+    """A size cap holding `entries` results, evicting one at a time past that"""
+    size = len(json.dumps(_result("a"))) + 64 + len(VARIANT) + len(version)
+    return int(size * (entries + 0.8))
+
+
+def test_evicts_least_recently_used_under_the_size_cap(tmp_path):
+    cache = PredictionCache(str(tmp_path / "cache.db"), _room_for(5), "v1")
+    _fill(cache, "abcde")
+    assert cache.get(b"a", VARIANT) == _result("a")  # now more recent than b
+    time.sleep(0.01)
+
+    _fill(cache, "f")
+    assert cache.get(b"b", VARIANT) is None
+    for name in "acdef":
+        assert cache.get(name.encode(), VARIANT) == _result(name)
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size_bytes"] <= cache.max_bytes
+
+
+def test_other_model_versions_are_evicted_first(tmp_path):
+    path = str(tmp_path / "cache.db")
+    old = PredictionCache(path, 1 << 20, "v1")
+    _fill(old, "abc")
+    current = PredictionCache(path, _room_for(5), "v2")
+    _fill(current, "defgh")  # a, b and c make room, although they were used more recently than d and e
+    for name in "abc":
+        assert old.get(name.encode(), VARIANT) is None
+    for name in "defgh":
+        assert current.get(name.encode(), VARIANT) == _result(name)
+
+
+def test_entries_survive_reopening_and_are_keyed_by_model_version(tmp_path):
+    path = str(tmp_path / "cache.db")
+    PredictionCache(path, 1 << 20, "v1").put(b"a", VARIANT, _result("a"))
+
+    assert PredictionCache(path, 1 << 20, "v1").get(b"a", VARIANT) == _result("a")
+    assert PredictionCache(path, 1 << 20, "v1").get(b"a", "regions:k=5:max=24") is None
+    assert PredictionCache(path, 1 << 20, "v2").get(b"a", VARIANT) is None
+
+
+def test_version_can_follow_a_changing_model(tmp_path):
+    versions = ["v1"]
+    cache = PredictionCache(str(tmp_path / "cache.db"), 1 << 20, lambda: versions[-1])
+    cache.put(b"a", VARIANT, _result("a"))
+    versions.append("v2")
+    assert cache.get(b"a", VARIANT) is None
+    assert cache.stats()["model_version"] == "v2"
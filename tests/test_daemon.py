@@ -0,0 +1,151 @@
+import socket
+import threading
+import time
+
+import pytest
+import torch
+
+from font_identifier import daemon
+from font_identifier.backends import InferenceBackend
+from font_identifier.daemon import (ERROR, HEADER, MAGIC, MAX_PAYLOAD, PREDICT, RESULT_SHAPE, SHAPE, VERSION,
+                                    DaemonBackend, DaemonClient, InferenceDaemon, _recv_exact, connect_daemon,
+                                    decode_tensor, encode_tensor)
+from font_identifier.settings import ModelConfig
+
+CLASSES = 3
+
+
+class SumBackend(InferenceBackend):
+    """Logits are the input sum times (1, 2, 3); records the batch sizes it ran"""
+
+    name = "sum"
+
+    def __init__(self, version="v1"):
+        super().__init__()
+        self._model_version = version
+        self.batches = []
+
+    def infer_batch(self, batch):
+        self.batches.append(int(batch.shape[0]))
+        return batch.flatten(1).sum(1, keepdim=True) * torch.arange(1, CLASSES + 1, dtype=torch.float32)
+
+
+@pytest.fixture
+def serve(tmp_path):
+    started = []
+
+    def start(backend=None, load=None, **settings):
+        path = str(tmp_path / "daemon.sock")
+        server = InferenceDaemon(path, backend or SumBackend(), CLASSES, ModelConfig(**settings), load)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def test_tensor_round_trip_keeps_shape_and_converts_to_float32():
+    tensor = torch.randn(2, 3, 4, 5, dtype=torch.float64)
+    decoded = decode_tensor(SHAPE, bytearray(encode_tensor(SHAPE, tensor)))
+    assert decoded.dtype == torch.float32
+    assert decoded.shape == (2, 3, 4, 5)
+    assert torch.equal(decoded, tensor.float())
+
+
+def test_empty_batch_round_trips():
+    payload = encode_tensor(RESULT_SHAPE, torch.zeros(0, CLASSES))
+    assert len(payload) == RESULT_SHAPE.size
+    assert decode_tensor(RESULT_SHAPE, bytearray(payload)).shape == (0, CLASSES)
+
+
+def test_payload_not_matching_its_shape_is_rejected():
+    payload = bytearray(encode_tensor(SHAPE, torch.zeros(1, 3, 2, 2)))
+    with pytest.raises(ValueError):
+        decode_tensor(SHAPE, payload[:-4])
+
+
+def test_short_read_is_a_connection_error():
+    left, right = socket.socketpair()
+    with left, right:
+        right.sendall(b"FI\x01")
+        right.close()
+        with pytest.raises(ConnectionError):
+            _recv_exact(left, HEADER.size)
+
+
+def test_oversized_frame_gets_an_error_and_the_connection_closes(serve):
+    server = serve()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(server.server_address)
+        sock.sendall(HEADER.pack(MAGIC, VERSION, PREDICT, MAX_PAYLOAD + 1))
+        magic, version, kind, length = HEADER.unpack(_recv_exact(sock, HEADER.size))
+        assert (magic, kind) == (MAGIC, ERROR)
+        assert _recv_exact(sock, length) == b"bad frame"
+        assert sock.recv(1) == b""
+
+
+def test_bad_tensor_is_answered_with_an_error_frame(serve):
+    server = serve(batching_enabled=False)
+    client = DaemonClient(server.server_address, timeout=5)
+    with pytest.raises(daemon.DaemonError):
+        client._request(PREDICT, SHAPE.pack(1, 3, 2, 2))
+    # the connection stays usable
+    assert client.infer(torch.ones(1, 3, 2, 2)).tolist() == [[12.0, 24.0, 36.0]]
+
+
+@pytest.mark.parametrize("batching_enabled", [False, True])
+def test_daemon_backend_forwards_to_the_daemon(serve, batching_enabled):
+    backend = SumBackend("daemon-model")
+    server = serve(backend, batching_enabled=batching_enabled)
+    client = connect_daemon(server.server_address, CLASSES, timeout=5)
+    assert client is not None
+    remote = DaemonBackend(client, lambda: None)
+
+    batch = torch.arange(2 * 3 * 2 * 2, dtype=torch.float32).reshape(2, 3, 2, 2)
+    assert torch.equal(remote(batch), SumBackend().infer_batch(batch))
+    assert torch.equal(remote(batch[0]), SumBackend().infer_batch(batch[:1]))  # single image
+    assert remote.model_version == "daemon-model"
+    assert sum(backend.batches) == 3
+    assert connect_daemon(server.server_address, CLASSES + 1) is None  # serves another model
+
+
+def test_daemon_backend_falls_back_when_the_daemon_goes_away(serve):
+    server = serve(batching_enabled=False)
+    local = SumBackend("local-model")
+    remote = DaemonBackend(connect_daemon(server.server_address, CLASSES, timeout=5), lambda: local)
+    batch = torch.ones(1, 3, 2, 2)
+    remote(batch)
+
+    server.shutdown()
+    server.server_close()
+    assert torch.equal(remote(batch), SumBackend().infer_batch(batch))
+    assert local.batches == [1]
+    assert remote.model_version == "local-model"
+
+
+def test_daemon_hot_swaps_a_changed_model_file_and_clients_see_the_new_version(serve, tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon, "VERSION_CHECK_INTERVAL", 0.0)
+    path = tmp_path / "model.pth"
+    path.write_bytes(b"v1")
+    first, second = SumBackend("v1"), SumBackend("v2")
+    first.source = (str(path), CLASSES)
+    server = serve(first, load=lambda: second)
+    remote = DaemonBackend(connect_daemon(server.server_address, CLASSES, timeout=5), lambda: None)
+    batch = torch.ones(1, 3, 2, 2)
+    remote(batch)
+    assert remote.model_version == "v1"
+
+    path.write_bytes(b"v2, a bigger file")
+    assert not server.manager.check()  # seen once: may still be being written
+    assert server.manager.check()
+    assert remote.model_version == "v2"
+    remote(batch)
+    assert (first.batches, second.batches) == ([1], [1])
+    deadline = time.monotonic() + 5
+    while len(server._dispatchers) > 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert list(server._dispatchers) == [id(second)]  # the retired version's dispatcher is closed
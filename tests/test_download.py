@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from font_identifier import download
+from font_identifier.download import download_model, part_path
+
+CHUNK = 4096
+PAYLOAD = os.urandom(5 * CHUNK + 123)
+SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(download, "CHUNK_SIZE", CHUNK)
+    monkeypatch.setattr(download, "PROBE_BYTES", 1024)
+    monkeypatch.setattr(download, "TIMEOUT", (2, 5))
+
+
+class RangeServer:
+    """Serves PAYLOAD with Range support on 127.0.0.1 and logs every requested range"""
+
+    def __init__(self, probe_delay=0.0, fail_ranges=False):
+        self.ranges = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                header = self.headers.get("Range", "")
+                server.ranges.append(header)
+                match = re.fullmatch(r"bytes=(\d+)-(\d+)", header)
+                start, end = (int(match[1]), min(int(match[2]), len(PAYLOAD) - 1)) if match else (0, len(PAYLOAD) - 1)
+                probing = start == 0 and end == download.PROBE_BYTES - 1
+                if probing:
+                    time.sleep(probe_delay)
+                elif fail_ranges:
+                    self.send_error(500)
+                    return
+                body = PAYLOAD[start:end + 1]
+                self.send_response(206 if match else 200)
+                if match:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/model.pth"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def chunk_requests(self):
+        return [r for r in self.ranges if r != f"bytes=0-{download.PROBE_BYTES - 1}"]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server = RangeServer(**kwargs)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.close()
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_download_verifies_and_leaves_no_temp_files(tmp_path, servers):
+    server = servers()
+    path = str(tmp_path / "model.pth")
+    assert download_model([server.url], path, sha256=SHA256)
+    assert _read(path) == PAYLOAD
+    assert os.listdir(tmp_path) == ["model.pth"]
+
+
+def test_interrupted_download_resumes_from_the_recorded_chunks(tmp_path, servers):
+    server = servers()
+    path = str(tmp_path / "model.pth")
+    # a previous run finished chunk 0 and 2, then died
+    with open(part_path(path), "wb") as f:
+        f.truncate(len(PAYLOAD))
+        f.seek(0)
+        f.write(PAYLOAD[:CHUNK])
+        f.seek(2 * CHUNK)
+        f.write(PAYLOAD[2 * CHUNK:3 * CHUNK])
+    with open(path + ".part.json", "w") as f:
+        key = {"size": len(PAYLOAD), "chunk_size": CHUNK, "sha256": SHA256}
+        json.dump({"key": key, "done": [0, 2]}, f)
+
+    assert download_model([server.url], path, sha256=SHA256)
+    assert _read(path) == PAYLOAD
+    requested = server.chunk_requests()
+    assert f"bytes=0-{CHUNK - 1}" not in requested
+    assert f"bytes={2 * CHUNK}-{3 * CHUNK - 1}" not in requested
+    assert len(requested) == 4
+    assert os.listdir(tmp_path) == ["model.pth"]
+
+
+def test_state_for_a_different_file_is_not_resumed(tmp_path, servers):
+    server = servers()
+    path = str(tmp_path / "model.pth")
+    with open(part_path(path), "wb") as f:
+        f.write(b"\0" * len(PAYLOAD))
+    with open(path + ".part.json", "w") as f:
+        key = {"size": len(PAYLOAD), "chunk_size": CHUNK, "sha256": "0" * 64}
+        json.dump({"key": key, "done": [0, 1, 2, 3, 4, 5]}, f)
+
+    assert download_model([server.url], path, sha256=SHA256)
+    assert _read(path) == PAYLOAD
+    assert len(server.chunk_requests()) == 6
+
+
+def test_checksum_mismatch_discards_the_download(tmp_path, servers):
+    server = servers()
+    path = str(tmp_path / "model.pth")
+    assert not download_model([server.url], path, sha256="0" * 64)
+    assert os.listdir(tmp_path) == []
+
+
+def test_falls_back_to_the_other_mirrors(tmp_path, servers):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        dead = f"http://127.0.0.1:{s.getsockname()[1]}/model.pth"
+    # the broken mirror wins the probe, then fails every chunk
+    broken = servers(fail_ranges=True)
+    good = servers(probe_delay=0.2)
+    path = str(tmp_path / "model.pth")
+
+    assert download_model([dead, broken.url, good.url], path, sha256=SHA256)
+    assert _read(path) == PAYLOAD
+    assert broken.chunk_requests()
+    assert len(good.chunk_requests()) == 6
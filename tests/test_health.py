@@ -0,0 +1,30 @@
+import json
+
+from font_identifier.health import LOADING, READY, Readiness, ready_file
+
+
+def test_ready_file_is_keyed_by_service_and_port(monkeypatch):
+    monkeypatch.delenv("FONTID_READY_FILE", raising=False)
+    assert ready_file("streamlit", 8501) != ready_file("api", 8000)
+    assert ready_file("streamlit", 8501) != ready_file("streamlit", 8502)
+    monkeypatch.setenv("FONTID_READY_FILE", "/srv/app.ready")
+    assert ready_file("streamlit", 8501) == "/srv/app.ready"
+
+
+def test_readiness_without_status_file_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    state = Readiness()
+    state.set(READY, backend="torch")
+    assert state.is_ready()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_configure_mirrors_current_and_later_states(tmp_path):
+    path = tmp_path / "svc.ready"
+    state = Readiness()
+    state.set(LOADING)
+    state.configure(str(path))
+    assert json.loads(path.read_text())["state"] == LOADING
+    state.set(READY, backend="torch")
+    status = json.loads(path.read_text())
+    assert status["state"] == READY and status["backend"] == "torch"
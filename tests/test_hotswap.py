@@ -0,0 +1,135 @@
+import os
+import threading
+
+import pytest
+
+from font_identifier._cache import _entries, cached_resource, release_resources
+from font_identifier.hotswap import ModelManager
+
+
+class Backend:
+    def __init__(self, name):
+        self.name = name
+
+
+class Releases:
+    def __init__(self):
+        self.released = []
+        self.event = threading.Event()
+
+    def __call__(self, backend):
+        self.released.append(backend.name)
+        self.event.set()
+
+    def wait(self):
+        assert self.event.wait(5)
+        self.event.clear()
+
+
+def _model_file(tmp_path, content=b"v1"):
+    path = tmp_path / "model.pth"
+    path.write_bytes(content)
+    return str(path)
+
+
+def _replace(path, content, mtime):
+    with open(path, "wb") as f:
+        f.write(content)
+    os.utime(path, (mtime, mtime))
+
+
+def test_retired_version_is_released_after_its_last_lease(tmp_path):
+    path = _model_file(tmp_path)
+    releases = Releases()
+    manager = ModelManager(Backend("v1"), path, lambda: Backend("v2"), releases)
+
+    first = manager.acquire()
+    second = manager.acquire()
+    assert manager.swap()
+    assert manager.backend.name == "v2"
+    assert first.backend.name == "v1"  # requests in flight keep their version
+    assert manager.stats()["retired_in_flight"] == 2
+
+    manager.release(first)
+    assert not releases.event.wait(0.2)
+    manager.release(second)
+    releases.wait()
+    assert releases.released == ["v1"]
+    assert manager.acquire().backend.name == "v2"
+
+
+def test_unused_version_is_released_right_away(tmp_path):
+    releases = Releases()
+    manager = ModelManager(Backend("v1"), _model_file(tmp_path), lambda: Backend("v2"), releases)
+    with manager.lease() as backend:
+        assert backend.name == "v1"
+    assert manager.swap()
+    releases.wait()
+    assert releases.released == ["v1"]
+    assert manager.stats()["in_flight"] == 0
+
+
+def test_failed_load_keeps_the_old_version_until_the_file_changes_again(tmp_path):
+    path = _model_file(tmp_path)
+    manager = ModelManager(Backend("v1"), path, lambda: None)
+    _replace(path, b"broken", 1000)
+    assert not manager.check()  # seen once: may still be being written
+    assert not manager.check()
+    assert manager.backend.name == "v1"
+    assert manager.stats()["swaps"] == 0
+
+
+def test_file_relinked_by_prepare_is_not_swapped_again(tmp_path):
+    path = _model_file(tmp_path)
+    loads = []
+
+    def prepare():
+        # like the model store replacing the file with a link to the stored copy
+        os.utime(path, (2000, 2000))
+
+    manager = ModelManager(Backend("v1"), path, lambda: loads.append(1) or Backend(f"v{len(loads) + 1}"),
+                           prepare=prepare)
+    _replace(path, b"v2", 1000)
+    assert not manager.check()
+    assert manager.check()
+    assert not manager.check()
+    assert not manager.check()
+    assert len(loads) == 1
+
+
+def test_released_object_gets_no_new_resources():
+    owner = Backend("v1")
+
+    @cached_resource
+    def resource(obj):
+        return object()
+
+    value = resource(owner)
+    assert release_resources(owner) == [value]
+    with pytest.raises(RuntimeError):
+        resource(owner)
+
+
+def test_release_waits_for_a_resource_being_created():
+    owner = Backend("v1")
+    started, finish = threading.Event(), threading.Event()
+
+    @cached_resource
+    def slow_resource(obj):
+        started.set()
+        assert finish.wait(5)
+        return "dispatcher"
+
+    creator = threading.Thread(target=slow_resource, args=(owner,))
+    creator.start()
+    assert started.wait(5)
+    released = []
+    releaser = threading.Thread(target=lambda: released.extend(release_resources(owner)))
+    releaser.start()
+    releaser.join(0.2)
+    assert releaser.is_alive()  # waits for the creation in progress
+    finish.set()
+    creator.join(5)
+    releaser.join(5)
+    assert released == ["dispatcher"]
+    assert not any(args[0] is owner for args, _ in _entries.values())
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+import torch
+
+from font_identifier.inference import InferenceDispatcher, InferenceQueueFull
+
+
+class RecordingModel:
+    """Doubles its input and records the batch sizes it was called with"""
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def __call__(self, batch):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batches.append(int(batch.shape[0]))
+        return batch.flatten(1)[:, :2] * 2
+
+
+def test_concurrent_requests_share_a_batch_and_get_their_own_rows():
+    model = RecordingModel()
+    dispatcher = InferenceDispatcher(model, max_batch_size=8, batch_window_ms=200)
+    try:
+        inputs = [torch.full((1, 1, 2, 1), float(i)) for i in range(4)]
+        futures = [dispatcher.submit(x) for x in inputs]
+        outputs = [f.result(timeout=5) for f in futures]
+    finally:
+        dispatcher.close(timeout=5)
+    assert model.batches == [4]
+    for i, out in enumerate(outputs):
+        assert out.tolist() == [[2.0 * i, 2.0 * i]]
+
+
+def test_batches_never_exceed_max_batch_size():
+    model = RecordingModel()
+    dispatcher = InferenceDispatcher(model, max_batch_size=4, batch_window_ms=100)
+    try:
+        futures = [dispatcher.submit(torch.zeros(3, 1, 2, 1)) for _ in range(3)]
+        for f in futures:
+            assert f.result(timeout=5).shape == (3, 2)
+    finally:
+        dispatcher.close(timeout=5)
+    assert max(model.batches) <= 4
+    assert sum(model.batches) == 9
+
+
+def test_model_errors_reach_every_caller_in_the_batch():
+    def broken(batch):
+        raise ValueError("boom")
+
+    dispatcher = InferenceDispatcher(broken, max_batch_size=4, batch_window_ms=50)
+    try:
+        futures = [dispatcher.submit(torch.zeros(1, 1, 2, 1)) for _ in range(2)]
+        for f in futures:
+            with pytest.raises(ValueError):
+                f.result(timeout=5)
+    finally:
+        dispatcher.close(timeout=5)
+
+
+def test_full_queue_rejects_and_close_does_not_block():
+    gate = threading.Event()
+    model = RecordingModel(gate)
+    dispatcher = InferenceDispatcher(model, max_batch_size=1, batch_window_ms=0, max_queue_depth=2)
+    first = dispatcher.submit(torch.zeros(1, 1, 2, 1))
+    time.sleep(0.1)  # worker picks it up and blocks in the model
+    queued = [dispatcher.submit(torch.zeros(1, 1, 2, 1)) for _ in range(2)]
+    with pytest.raises(InferenceQueueFull):
+        dispatcher.submit(torch.zeros(1, 1, 2, 1))
+    assert dispatcher.stats()["rejected"] == 1
+
+    started = time.perf_counter()
+    dispatcher.close(timeout=0.2)
+    assert time.perf_counter() - started < 2
+    with pytest.raises(RuntimeError):
+        dispatcher.submit(torch.zeros(1, 1, 2, 1))
+
+    # Once the model unblocks, queued requests are drained and the worker exits
+    gate.set()
+    for f in [first] + queued:
+        assert f.result(timeout=5).shape == (1, 2)
+    dispatcher._thread.join(timeout=5)
+    assert not dispatcher._thread.is_alive()
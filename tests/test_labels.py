@@ -0,0 +1,34 @@
+import pytest
+import torch
+
+from font_identifier.labels import build_family_index, family_probabilities, rank_probabilities
+
+CLASSES = ["Arial-Regular", "Roboto-Bold", "Arial-Bold", "Times-Italic", "Roboto-Light", "Arial-Italic"]
+
+
+def test_family_scores_are_summed_over_their_classes():
+    index = build_family_index(CLASSES)
+    assert index.families == ["Arial", "Roboto", "Times"]
+    probs = torch.tensor([
+        [0.10, 0.30, 0.10, 0.05, 0.25, 0.20],
+        [0.00, 0.05, 0.00, 0.90, 0.05, 0.00],
+    ])
+    families = family_probabilities(probs, index)
+    assert torch.allclose(families, torch.tensor([[0.40, 0.55, 0.05], [0.00, 0.10, 0.90]]))
+
+
+def test_ranking_orders_families_by_summed_score_not_by_best_class():
+    index = build_family_index(CLASSES)
+    # Roboto-Bold is the single best class, but Arial's three styles add up to more
+    probs = torch.tensor([[0.16, 0.35, 0.14, 0.05, 0.10, 0.20]])
+    result = rank_probabilities(probs, CLASSES, index, k=3)[0]
+    assert result["font"] == "Roboto-Bold"
+    assert [f["font"] for f in result["top_fonts"]] == ["Roboto-Bold", "Arial-Italic", "Arial-Regular"]
+    assert [f["family"] for f in result["top_families"]] == ["Arial", "Roboto", "Times"]
+    assert [f["confidence"] for f in result["top_families"]] == pytest.approx([0.50, 0.45, 0.05])
+
+
+def test_outputs_wider_than_the_label_set_are_cut_to_it():
+    index = build_family_index(CLASSES[:3])
+    probs = torch.tensor([[0.2, 0.3, 0.1, 0.4]])  # a fourth, unlabelled output
+    assert torch.allclose(family_probabilities(probs, index), torch.tensor([[0.3, 0.3]]))
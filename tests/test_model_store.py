@@ -0,0 +1,78 @@
+import os
+import shutil
+import stat
+import subprocess
+
+import pytest
+
+from font_identifier.model_store import ModelStore
+
+
+def _app(tmp_path, name, content=None):
+    directory = tmp_path / name
+    directory.mkdir()
+    path = directory / "model.pth"
+    if content is not None:
+        path.write_bytes(content)
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ModelStore(str(tmp_path / "store"))
+
+
+def test_adopted_file_keeps_its_mode_and_can_be_overwritten_in_place(tmp_path, store):
+    path = _app(tmp_path, "a", b"model v1" * 1000)
+    mode = stat.S_IMODE(os.stat(path).st_mode)
+    sha256 = store.adopt(path)
+    assert os.path.samefile(path, store.object_path(sha256))
+    assert stat.S_IMODE(os.stat(path).st_mode) == mode
+
+    new = tmp_path / "new.pth"
+    new.write_bytes(b"model v2" * 1200)
+    if shutil.which("cp"):
+        subprocess.run(["cp", str(new), path], check=True)
+    else:
+        shutil.copyfile(str(new), path)
+    with open(path, "rb") as f:
+        assert f.read() == new.read_bytes()
+
+
+def test_object_rewritten_through_a_link_is_not_trusted(tmp_path, store):
+    path = _app(tmp_path, "a", b"model v1" * 1000)
+    old = store.adopt(path)
+    with open(path, "r+b") as f:
+        f.write(b"MODEL V2")
+
+    # neither reported as the old model nor linked into another directory
+    assert store.find(path) is None
+    assert not store.has(old)
+    assert not store.link(old, _app(tmp_path, "b"))
+
+    new = store.adopt(path)
+    assert new != old
+    with open(store.object_path(new), "rb") as f:
+        assert f.read().startswith(b"MODEL V2")
+
+
+def test_touched_object_is_still_trusted(tmp_path, store):
+    path = _app(tmp_path, "a", b"model v1" * 1000)
+    sha256 = store.adopt(path)
+    os.utime(path, (1, 1))
+    assert store.find(path) == sha256
+    other = _app(tmp_path, "b")
+    assert store.link(sha256, other)
+    assert os.path.samefile(other, path)
+
+
+def test_copied_objects_are_read_only(tmp_path, store, monkeypatch):
+    path = _app(tmp_path, "a", b"model v1" * 1000)
+
+    def no_hardlinks(src, dst):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(os, "link", no_hardlinks)
+    sha256 = store.add(path)
+    assert os.path.islink(path)  # no hardlinks: linked back by symlink
+    assert stat.S_IMODE(os.stat(store.object_path(sha256)).st_mode) == 0o444
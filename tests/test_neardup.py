@@ -0,0 +1,107 @@
+import io
+import os
+import random
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from font_identifier.neardup import BKTree, NearDuplicateIndex, dhash, hamming
+
+TEXTS = ["The quick brown fox", "Invoice #4471", "Hello World 2024"]
+DEJAVU = "/usr/share/fonts/truetype/dejavu"
+
+
+def render(text, font=None, stroke=0):
+    font = font or ImageFont.load_default(size=40)
+    box = ImageDraw.Draw(Image.new("RGB", (1, 1))).textbbox((0, 0), text, font=font, stroke_width=1)
+    image = Image.new("RGB", (box[2] + 40, box[3] + 30), "white")
+    ImageDraw.Draw(image).text((20, 15), text, font=font, fill="black", stroke_width=stroke, stroke_fill="black")
+    return image
+
+
+def recaptures(image):
+    w, h = image.size
+    yield image.resize((w // 2, h // 2), Image.BILINEAR)
+    yield image.resize((w * 3 // 2, h * 3 // 2), Image.BICUBIC)
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=50)
+    yield Image.open(io.BytesIO(buf.getvalue())).convert("RGB")
+
+
+def matches(stored, query):
+    index = NearDuplicateIndex()
+    value, _ = index.lookup(stored, "whole:k=5")
+    index.add(value, stored, "whole:k=5", {"font": "stored"})
+    return index.lookup(query, "whole:k=5")[1] is not None
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_rescaled_and_recompressed_copies_match(text):
+    image = render(text)
+    for copy in recaptures(image):
+        assert matches(image, copy)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_bolder_weight_of_the_same_text_never_matches(text):
+    regular, bold = render(text), render(text, stroke=1)
+    # the hash alone cannot tell them apart; the thumbnail check has to
+    assert hamming(dhash(regular), dhash(bold)) <= NearDuplicateIndex().max_distance
+    assert not matches(regular, bold)
+    assert not matches(bold, regular)
+    for copy in recaptures(bold):
+        assert not matches(regular, copy)
+
+
+@pytest.mark.skipif(not os.path.isdir(DEJAVU), reason="DejaVu fonts not installed")
+@pytest.mark.parametrize("family", ["Sans", "SansMono", "Serif"])
+def test_regular_and_bold_font_files_never_match(family):
+    regular = ImageFont.truetype(os.path.join(DEJAVU, f"DejaVu{family}.ttf"), 48)
+    bold = ImageFont.truetype(os.path.join(DEJAVU, f"DejaVu{family}-Bold.ttf"), 48)
+    for text in TEXTS:
+        assert not matches(render(text, regular), render(text, bold))
+
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    values += [v ^ (1 << rng.randrange(64)) for v in values[:50]]  # close neighbours
+    tree = BKTree()
+    for v in values:
+        tree.add(v)
+    tree.add(values[0])  # duplicates are stored once
+    assert tree.size == len(set(values))
+
+    for query in values[:20] + [rng.getrandbits(64) for _ in range(20)]:
+        for radius in (0, 3, 24):
+            expected = sorted((hamming(query, v), v) for v in set(values) if hamming(query, v) <= radius)
+            assert sorted(tree.search(query, radius)) == expected
+
+
+def test_evicted_hashes_are_dropped_when_the_tree_is_rebuilt():
+    index = NearDuplicateIndex(max_entries=8)
+    images = [render(f"Sample {i:03d}") for i in range(120)]
+    for image in images:
+        value, _ = index.lookup(image, "whole:k=5")
+        index.add(value, image, "whole:k=5", {"font": "x"})
+    assert index.stats()["entries"] == 8
+    assert index._tree.size <= 2 * len(index._live) + 64
+    assert index._tree.size < len({dhash(image) for image in images})
+    assert index.lookup(images[-1], "whole:k=5")[1] is not None
+    assert index.lookup(images[0], "whole:k=5")[1] is None
+
+
+def test_callers_editing_their_result_leave_the_index_alone():
+    index = NearDuplicateIndex()
+    image = render(TEXTS[0])
+    result = {"font": "stored", "top_fonts": [{"font": "a"}, {"font": "b"}]}
+    value, _ = index.lookup(image, "whole:k=5")
+    index.add(value, image, "whole:k=5", result)
+    result["top_fonts"].pop()  # the leader trims its own copy
+
+    hit = index.lookup(image, "whole:k=5")[1]
+    assert len(hit["top_fonts"]) == 2
+    hit["font"] = "edited"
+    del hit["top_fonts"][:]
+    again = index.lookup(image, "whole:k=5")[1]
+    assert again == {"font": "stored", "top_fonts": [{"font": "a"}, {"font": "b"}]}
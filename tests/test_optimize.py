@@ -0,0 +1,52 @@
+import pytest
+import torch
+import torch.nn as nn
+
+from font_identifier.optimize import fold_batchnorm
+
+torchvision = pytest.importorskip("torchvision")
+
+
+def _resnet18(num_classes=32):
+    torch.manual_seed(0)
+    model = torchvision.models.resnet18(num_classes=num_classes)
+    # non-trivial running statistics and affine parameters, as after training
+    for module in model.modules():
+        if isinstance(module, nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.2, 0.2)
+    return model.eval()
+
+
+def test_folded_resnet18_matches_the_original():
+    model = _resnet18()
+    folded = fold_batchnorm(model)
+    assert not any(isinstance(m, nn.BatchNorm2d) for m in folded.modules())
+    assert sum(isinstance(m, nn.BatchNorm2d) for m in model.modules()) == 20  # the original is untouched
+
+    example = torch.randn(4, 3, 224, 224)
+    with torch.no_grad():
+        expected, actual = model(example), folded(example)
+    assert torch.allclose(actual, expected, rtol=1e-5, atol=1e-5), (actual - expected).abs().max()
+
+
+def test_conv_feeding_two_consumers_is_not_folded():
+    class Branch(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.conv = nn.Conv2d(3, 4, 3)
+            self.bn = nn.BatchNorm2d(4)
+
+        def forward(self, x):
+            y = self.conv(x)
+            return self.bn(y) + y
+
+    model = Branch().eval()
+    model.bn.running_mean.fill_(0.3)
+    folded = fold_batchnorm(model)
+    assert any(isinstance(m, nn.BatchNorm2d) for m in folded.modules())
+    example = torch.randn(2, 3, 16, 16)
+    with torch.no_grad():
+        assert torch.allclose(folded(example), model(example), atol=1e-6)
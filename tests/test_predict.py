@@ -0,0 +1,92 @@
+import io
+
+import pytest
+import torch
+from PIL import Image
+
+from font_identifier import predict
+from font_identifier.cache import prediction_variant
+from font_identifier.predict import PREDICT_MODES, iter_predict_fonts, predict_font_bytes, predict_fonts
+from font_identifier.preprocessing import prepare_image
+from font_identifier.settings import ModelConfig
+
+
+def test_unknown_mode_is_rejected_before_any_lookup():
+    class Untouchable:
+        def __getattr__(self, name):
+            raise AssertionError(f"model used for an invalid request: {name}")
+
+    with pytest.raises(ValueError, match="Unknown prediction mode 'bogus'"):
+        predict_font_bytes(b"not an image", Untouchable(), [], mode="bogus")
+    assert "bogus" not in PREDICT_MODES
+
+
+CLASSES = ["Arial-Regular", "Arial-Bold", "Roboto-Regular", "Times-Italic"]
+
+
+def _png(shade):
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 20), (shade, shade, shade)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+class ShadeModel:
+    """Predicts class i for the i-th shade and records how many images it saw"""
+
+    model_version = "test"
+
+    def __init__(self, images):
+        self.means = torch.stack([prepare_image(data).mean() for data in images])
+        self.seen = 0
+
+    def __call__(self, batch):
+        self.seen += batch.shape[0]
+        shade = (batch.mean(dim=(1, 2, 3)).unsqueeze(1) - self.means.unsqueeze(0)).abs().argmin(dim=1)
+        return torch.nn.functional.one_hot(shade % len(CLASSES), len(CLASSES)).to(torch.float32) * 10
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    config = ModelConfig(prediction_cache=str(tmp_path / "cache.db"), batching_enabled=False,
+                         worker_processes=0, max_batch_size=2, near_duplicate_entries=0, top_k=2)
+    monkeypatch.setattr(predict, "get_model_settings", lambda: config)
+    return config
+
+
+def _cached(model, settings, images, positions):
+    cache = predict.get_prediction_cache(model)
+    variant = prediction_variant("whole", settings)
+    for i in positions:
+        cache.put(images[i], variant, {"font": f"cached-{i}", "confidence": 1.0,
+                                       "top_fonts": [{"font": f"cached-{i}", "confidence": 1.0}],
+                                       "top_families": []})
+
+
+def test_results_keep_input_order_with_mixed_cache_hits(settings):
+    images = [_png(shade) for shade in (0, 60, 120, 180, 240, 30, 90)]
+    model = ShadeModel(images)
+    _cached(model, settings, images, [0, 3, 4])
+
+    results = predict_fonts(images, model, CLASSES)
+    expected = ["cached-0", CLASSES[1], CLASSES[2], "cached-3", "cached-4", CLASSES[5 % 4], CLASSES[6 % 4]]
+    assert [r["font"] for r in results] == expected
+    assert model.seen == 4
+
+    # the misses were stored: a second run needs no forwards and keeps the order
+    assert [r["font"] for r in predict_fonts(images, model, CLASSES)] == expected
+    assert model.seen == 4
+
+
+def test_iter_predict_fonts_yields_every_index_once_in_sorted_batches(settings):
+    images = [_png(shade) for shade in (0, 60, 120, 180, 240)]
+    model = ShadeModel(images)
+    _cached(model, settings, images, [1, 4])
+
+    batches = list(iter_predict_fonts(iter(images), model, CLASSES))
+    for batch in batches:
+        assert [i for i, _ in batch] == sorted(i for i, _ in batch)
+    indices = [i for batch in batches for i, _ in batch]
+    assert sorted(indices) == list(range(len(images)))
+    fonts = dict(item for batch in batches for item in batch)
+    assert fonts[1]["font"] == "cached-1" and fonts[4]["font"] == "cached-4"
+    assert [fonts[i]["font"] for i in (0, 2, 3)] == [CLASSES[0], CLASSES[2], CLASSES[3]]
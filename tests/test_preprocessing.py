@@ -0,0 +1,44 @@
+import torch
+from PIL import Image
+
+from font_identifier.preprocessing import INPUT_SIZE, preprocess_tiles, tile_offsets
+
+
+def test_narrower_than_a_tile_is_one_tile():
+    assert tile_offsets(100, stride=112, max_tiles=16) == [0]
+    assert tile_offsets(INPUT_SIZE, stride=112, max_tiles=16) == [0]
+
+
+def test_exact_multiple_of_the_stride_ends_on_the_edge():
+    assert tile_offsets(INPUT_SIZE * 3, stride=INPUT_SIZE, max_tiles=16) == [0, INPUT_SIZE, 2 * INPUT_SIZE]
+    assert tile_offsets(448, stride=112, max_tiles=16) == [0, 112, 224]
+
+
+def test_trailing_partial_tile_is_aligned_to_the_right_edge():
+    offsets = tile_offsets(500, stride=112, max_tiles=16)
+    assert offsets == [0, 112, 224, 500 - INPUT_SIZE]
+    assert offsets[-1] + INPUT_SIZE == 500
+
+
+def test_thinning_keeps_both_ends():
+    offsets = tile_offsets(5000, stride=112, max_tiles=4)
+    assert len(offsets) == 4
+    assert offsets[0] == 0 and offsets[-1] == 5000 - INPUT_SIZE
+    assert offsets == sorted(offsets)
+
+
+def test_small_image_is_padded_to_one_tile_with_its_background():
+    image = Image.new("RGB", (60, 112), "white")
+    tiles = preprocess_tiles(image)
+    assert tiles.shape == (1, 3, INPUT_SIZE, INPUT_SIZE)
+    assert torch.allclose(tiles, torch.ones_like(tiles))  # white is 1.0 after normalization
+
+
+def test_wide_strip_tiles_cover_it_edge_to_edge():
+    # 1000 x 100 -> resized to 2240 x 224; the last tile must show the right edge
+    image = Image.new("L", (1000, 100), 255)
+    image.paste(0, (990, 0, 1000, 100))
+    tiles = preprocess_tiles(image, stride=INPUT_SIZE, max_tiles=16)
+    assert tiles.shape == (10, 3, INPUT_SIZE, INPUT_SIZE)
+    assert tiles[-1, 0, :, -1].max() < 0  # black right edge
+    assert tiles[0, 0, :, 0].min() > 0
@@ -0,0 +1,56 @@
+import numpy as np
+from PIL import Image, ImageDraw
+
+from font_identifier.segmentation import _merge_runs, _runs, find_text_regions
+
+
+def test_runs_finds_consecutive_true_spans():
+    mask = np.array([False, True, True, False, True, False, False, True])
+    assert _runs(mask).tolist() == [[1, 3], [4, 5], [7, 8]]
+
+
+def test_runs_handles_all_and_nothing():
+    assert _runs(np.ones(4, dtype=bool)).tolist() == [[0, 4]]
+    assert _runs(np.zeros(4, dtype=bool)).shape == (0, 2)
+
+
+def test_merge_runs_joins_only_small_gaps():
+    runs = np.array([[0, 3], [4, 6], [10, 12], [13, 15]])
+    assert _merge_runs(runs, max_gap=1).tolist() == [[0, 6], [10, 15]]
+    assert _merge_runs(runs, max_gap=0).tolist() == runs.tolist()
+    assert _merge_runs(runs, max_gap=10).tolist() == [[0, 15]]
+
+
+def test_merge_runs_leaves_single_run_alone():
+    runs = np.array([[2, 5]])
+    assert _merge_runs(runs, max_gap=3).tolist() == [[2, 5]]
+
+
+def _blocks(layout):
+    """White image with black rectangles standing in for words: [(left, top, right, bottom), ...]"""
+    image = Image.new("RGB", (400, 200), "white")
+    draw = ImageDraw.Draw(image)
+    for box in layout:
+        draw.rectangle(box, fill="black")
+    return image
+
+
+def test_find_text_regions_splits_lines_and_words_in_reading_order():
+    image = _blocks([(20, 20, 120, 40), (200, 20, 300, 40), (20, 120, 150, 140)])
+    regions = find_text_regions(image)
+    assert [r.line for r in regions] == [0, 0, 1]
+    lefts = [r.box[0] for r in regions]
+    assert lefts[0] < lefts[1]
+    for region, (left, top, right, bottom) in zip(regions, [(20, 20, 120, 40), (200, 20, 300, 40), (20, 120, 150, 140)]):
+        r_left, r_top, r_right, r_bottom = region.box
+        assert r_left <= left and r_top <= top and r_right >= right and r_bottom >= bottom
+
+
+def test_find_text_regions_falls_back_to_whole_image_and_caps_count():
+    blank = Image.new("RGB", (100, 50), "white")
+    assert [r.box for r in find_text_regions(blank)] == [(0, 0, 100, 50)]
+
+    image = _blocks([(20 + 60 * i, 20, 50 + 60 * i + (5 * i), 40) for i in range(6)])
+    regions = find_text_regions(image, max_regions=3)
+    assert len(regions) == 3
+    assert regions == sorted(regions, key=lambda r: (r.line, r.box[0]))
@@ -0,0 +1,106 @@
+import json
+import os
+
+import pytest
+
+from shards import Lease, LeaseLost, ShardQueue
+
+
+def _expire(path):
+    os.utime(path, (0, 0))
+
+
+def test_lease_is_exclusive_until_it_expires(tmp_path):
+    path = str(tmp_path / "a.lease")
+    first = Lease(path, "node-a", ttl=60)
+    second = Lease(path, "node-b", ttl=60)
+    assert first.acquire()
+    assert not second.acquire()
+
+    _expire(path)
+    assert second.acquire()
+    assert second.held()
+    assert not first.held()
+    assert not first.renew()
+
+
+def test_takeover_race_leaves_a_single_holder(tmp_path, monkeypatch):
+    path = str(tmp_path / "a.lease")
+    Lease(path, "dead", ttl=60).acquire()
+    _expire(path)
+    slow = Lease(path, "node-a", ttl=60)
+    fast = Lease(path, "node-b", ttl=60)
+
+    # node-a saw the lease expired, then node-b took it over before node-a renamed it
+    check = slow._expired
+    seen = []
+
+    def stale_check(p):
+        if not seen:
+            seen.append(p)
+            return True
+        return check(p)
+
+    monkeypatch.setattr(slow, "_expired", stale_check)
+    assert fast.acquire()
+    assert not slow.acquire()
+    assert fast.held()
+    assert not slow.held()
+    assert os.listdir(tmp_path) == ["a.lease"]
+
+
+def _plan(tmp_path, node, items=5, shard_size=5):
+    queue = ShardQueue(str(tmp_path), node_id=node, lease_ttl=60)
+    queue.plan(({"path": f"{i}.png"} for i in range(items)), shard_size=shard_size)
+    return queue
+
+
+def test_takeover_resumes_from_the_checkpoint_of_a_dead_node(tmp_path):
+    crashed = _plan(tmp_path, "node-a")
+    crashed._stop.set()  # no more heartbeats: the node is dead
+    shard = crashed.claim()
+    for item in list(shard.pending_items())[:2]:
+        shard.write({"path": item["path"], "error": None})
+    shard.checkpoint()
+    shard._out.write('{"path": "2.png", "err')  # torn line from the crash
+    shard._out.flush()
+    _expire(shard.lease.path)
+
+    queue = _plan(tmp_path, "node-b")
+    try:
+        resumed = queue.claim()
+        assert resumed.index == 0
+        assert resumed.done == 2
+        assert [item["path"] for item in resumed.pending_items()] == ["2.png", "3.png", "4.png"]
+        for item in resumed.pending_items():
+            resumed.write({"path": item["path"], "error": None})
+        resumed.complete()
+        resumed.close()
+
+        # the dead node's checkpoint is neither appended to nor left behind
+        assert sorted(os.listdir(tmp_path / "results")) == ["00000.jsonl"]
+        output = str(tmp_path / "out.jsonl")
+        assert queue.merge(output)
+        with open(output, encoding="utf-8") as f:
+            assert [json.loads(line)["path"] for line in f] == [f"{i}.png" for i in range(5)]
+    finally:
+        queue.close()
+
+
+def test_holder_that_lost_its_lease_does_not_write_into_the_new_holders_checkpoint(tmp_path):
+    old = _plan(tmp_path, "node-a")
+    old._stop.set()
+    stale = old.claim()
+    _expire(stale.lease.path)
+
+    queue = _plan(tmp_path, "node-b")
+    try:
+        current = queue.claim()
+        stale.write({"path": "late.png", "error": None})
+        with pytest.raises(LeaseLost):
+            stale.checkpoint()
+        assert current.partial_path != stale.partial_path
+        assert os.path.getsize(current.partial_path) == 0
+    finally:
+        stale._out.close()
+        queue.close()
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from font_identifier.singleflight import SingleFlight
+
+
+def _run_concurrently(flight, key, fn, callers=4):
+    results, errors = [None] * callers, [None] * callers
+
+    def call(i):
+        try:
+            results[i] = flight.do(key, fn)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+def test_concurrent_callers_share_one_call_but_not_its_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"font": "Arial", "top_fonts": [{"font": "Arial", "confidence": 0.9}]}
+
+    threads, results, errors = _run_concurrently(flight, "key", compute)
+    while flight.stats()["coalesced"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert errors == [None] * 4
+    assert all(r == results[0] for r in results)
+    assert len({id(r) for r in results}) == 4
+    assert len({id(r["top_fonts"]) for r in results}) == 4
+    results[0]["top_fonts"].clear()
+    assert results[1]["top_fonts"]
+
+
+def test_error_reaches_every_waiting_caller():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError("model failed")
+
+    threads, results, errors = _run_concurrently(flight, "key", fail, callers=3)
+    while flight.stats()["coalesced"] < 2:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert [str(e) for e in errors] == ["model failed"] * 3
+    assert flight.stats()["in_flight"] == 0
+    assert flight.do("key", lambda: "next call runs again") == "next call runs again"
+
+
+def test_leader_editing_its_result_does_not_reach_the_followers(monkeypatch):
+    import font_identifier.singleflight as singleflight
+
+    deepcopy = singleflight.copy.deepcopy
+
+    def slow_deepcopy(value):
+        time.sleep(0.05)  # followers copy while the leader's caller is already editing
+        return deepcopy(value)
+
+    monkeypatch.setattr(singleflight.copy, "deepcopy", slow_deepcopy)
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        return {"font": "Arial", "top_fonts": [{"font": "Arial"}, {"font": "Helvetica"}]}
+
+    leader = {}
+
+    def lead():
+        result = leader["result"] = flight.do("key", compute)
+        result["top_fonts"].clear()
+        result["font"] = "edited"
+
+    first = threading.Thread(target=lead)
+    first.start()
+    while flight.stats()["in_flight"] < 1:
+        time.sleep(0.001)
+    threads, results, errors = _run_concurrently(flight, "key", compute, callers=3)
+    while flight.stats()["coalesced"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in threads + [first]:
+        t.join(5)
+
+    assert errors == [None] * 3
+    assert leader["result"] == {"font": "edited", "top_fonts": []}
+    assert all(r == {"font": "Arial", "top_fonts": [{"font": "Arial"}, {"font": "Helvetica"}]} for r in results)
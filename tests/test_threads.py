@@ -0,0 +1,43 @@
+from config.settings import ConfigManager
+from font_identifier.settings import ModelConfig
+from font_identifier.threads import plan_thread_budget
+
+
+def test_defaults_use_every_core_for_one_forward():
+    budget = plan_thread_budget(ModelConfig(), cores=8)
+    assert (budget.cores, budget.intra_op, budget.inter_op, budget.concurrency) == (8, 8, 1, 1)
+
+
+def test_split_cores_divides_them_between_concurrent_forwards():
+    config = ModelConfig(expected_concurrency=3, split_cores=True)
+    assert plan_thread_budget(config, cores=8).intra_op == 2
+    # without split_cores every forward gets all cores
+    config.split_cores = False
+    assert plan_thread_budget(config, cores=8).intra_op == 8
+
+
+def test_more_concurrent_forwards_than_cores_still_get_one_thread():
+    config = ModelConfig(expected_concurrency=16, split_cores=True)
+    budget = plan_thread_budget(config, cores=4)
+    assert budget.intra_op == 1
+    assert budget.concurrency == 16
+
+
+def test_explicit_settings_win_over_the_automatic_split():
+    config = ModelConfig(intra_op_threads=3, inter_op_threads=2, expected_concurrency=4, split_cores=True)
+    budget = plan_thread_budget(config, cores=16)
+    assert (budget.intra_op, budget.inter_op) == (3, 2)
+
+
+def test_environment_overrides_reach_the_budget(tmp_path, monkeypatch):
+    monkeypatch.setenv("MODEL_INTRA_OP_THREADS", "5")
+    monkeypatch.setenv("MODEL_INTER_OP_THREADS", "2")
+    monkeypatch.setenv("MODEL_EXPECTED_CONCURRENCY", "2")
+    monkeypatch.setenv("MODEL_SPLIT_CORES", "true")
+    model = ConfigManager(str(tmp_path)).load_config().model
+    assert plan_thread_budget(model, cores=12).intra_op == 5
+    assert plan_thread_budget(model, cores=12).inter_op == 2
+
+    monkeypatch.delenv("MODEL_INTRA_OP_THREADS")
+    model = ConfigManager(str(tmp_path)).load_config().model
+    assert plan_thread_budget(model, cores=12).intra_op == 6
@@ -0,0 +1,213 @@
+import json
+import os
+import struct
+
+import pytest
+import torch
+
+from font_identifier.weights import (SCALE_SUFFIX, build_resnet18, convert, decode_state, encode_state, fresh_weights_path,
+                                     is_weights_file, load_weights, read_header, save_weights, weights_path)
+
+pytest.importorskip("torchvision")
+
+NUM_CLASSES = 10
+
+
+def _mixed_state():
+    torch.manual_seed(0)
+    return {
+        "conv.weight": torch.randn(4, 3, 3, 3),
+        "double": torch.randn(3, dtype=torch.float64),
+        "half": torch.randn(5).half(),
+        "counter": torch.tensor(7),
+        "codes": torch.randint(-127, 127, (7,), dtype=torch.int8),
+        "mask": torch.tensor([True, False, True]),
+        "empty": torch.empty(0, 4),
+    }
+
+
+def test_header_is_aligned_and_every_tensor_at_its_element_size(tmp_path):
+    path = str(tmp_path / "w.safetensors")
+    state = _mixed_state()
+    save_weights(state, path, {"architecture": "test"})
+
+    header, data_start = read_header(path)
+    assert data_start % 8 == 0
+    assert header.pop("__metadata__") == {"architecture": "test"}
+    spans = sorted(tuple(info["data_offsets"]) for info in header.values())
+    assert spans[0][0] == 0
+    assert all(a[1] == b[0] for a, b in zip(spans, spans[1:]))  # packed, no gaps or overlaps
+    assert data_start + spans[-1][1] == os.path.getsize(path)
+    for name, info in header.items():
+        assert info["data_offsets"][0] % state[name].element_size() == 0, name
+
+    loaded, metadata = load_weights(path)
+    assert set(loaded) == set(state)
+    for name, t in state.items():
+        assert loaded[name].dtype == t.dtype and loaded[name].shape == t.shape
+        assert torch.equal(loaded[name], t), name
+
+
+def _resnet_state():
+    torch.manual_seed(0)
+    return build_resnet18(NUM_CLASSES, {}).state_dict()
+
+
+def test_reduced_precision_round_trips_within_their_error_bounds(tmp_path):
+    state = _resnet_state()
+    for precision in ("fp32", "fp16", "int8"):
+        path = str(tmp_path / f"{precision}.safetensors")
+        save_weights(encode_state(state, precision), path, {"precision": precision})
+        stored, _ = load_weights(path)
+        decoded = decode_state(stored, precision)
+        assert set(decoded) == set(state)
+        for name, t in state.items():
+            got = decoded[name]
+            assert got.dtype == t.dtype and got.shape == t.shape, name
+            if precision == "fp32" or not t.is_floating_point():
+                assert torch.equal(got, t), name
+            elif precision == "fp16":
+                assert torch.allclose(got, t, rtol=1e-3, atol=1e-6), name
+            elif t.dim() >= 2:
+                # symmetric per-output-channel int8: off by at most half a step of that channel
+                step = stored[name + SCALE_SUFFIX].reshape(-1, *([1] * (t.dim() - 1)))
+                assert stored[name].dtype == torch.int8
+                assert ((got - t).abs() <= step / 2 + 1e-7).all(), name
+            else:
+                assert torch.equal(got, t), name  # biases and BN statistics stay fp32
+
+
+def test_int8_and_fp16_files_are_smaller(tmp_path):
+    state = _resnet_state()
+    sizes = {}
+    for precision in ("fp32", "fp16", "int8"):
+        path = str(tmp_path / f"{precision}.safetensors")
+        save_weights(encode_state(state, precision), path, {})
+        sizes[precision] = os.path.getsize(path)
+    assert sizes["fp16"] < 0.51 * sizes["fp32"]
+    assert sizes["int8"] < 0.27 * sizes["fp32"]
+
+
+@pytest.fixture
+def weights_file(tmp_path):
+    path = str(tmp_path / "w.safetensors")
+    save_weights(_mixed_state(), path, {})
+    return path
+
+
+def test_truncated_data_is_rejected(weights_file):
+    with open(weights_file, "r+b") as f:
+        f.truncate(os.path.getsize(weights_file) - 10)
+    assert is_weights_file(weights_file)  # the header alone is intact
+    with pytest.raises(ValueError, match="truncated"):
+        load_weights(weights_file)
+
+
+def test_truncated_or_foreign_headers_are_rejected(weights_file, tmp_path):
+    with open(weights_file, "rb") as f:
+        data = f.read()
+    cases = {
+        "short": data[:5],
+        "cut_header": data[:40],
+        "huge_length": struct.pack("<Q", 1 << 40) + data[8:],
+        "pickle": b"\x80\x04" + data[2:],
+    }
+    for name, content in cases.items():
+        path = str(tmp_path / name)
+        with open(path, "wb") as f:
+            f.write(content)
+        assert not is_weights_file(path), name
+        with pytest.raises(ValueError):
+            load_weights(path)
+
+
+def _rewrite_header(path, edit):
+    header, data_start = read_header(path)
+    edit(header)
+    with open(path, "rb") as f:
+        data = f.read()[data_start:]
+    raw = json.dumps(header).encode("utf-8")
+    raw += b" " * (-len(raw) % 8)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(raw)) + raw + data)
+
+
+def test_corrupt_tensor_entries_are_rejected(weights_file):
+    _rewrite_header(weights_file, lambda h: h["conv.weight"].update(shape=[4, 3, 3, 4]))
+    with pytest.raises(ValueError, match="do not match its shape"):
+        load_weights(weights_file)
+    _rewrite_header(weights_file, lambda h: h["conv.weight"].update(shape=[4, 3, 3, 3], dtype="F128"))
+    with pytest.raises(ValueError, match="unknown dtype"):
+        load_weights(weights_file)
+
+
+def _checkpoint(tmp_path):
+    path = str(tmp_path / "model.pth")
+    torch.save(_resnet_state(), path)
+    return path
+
+
+def test_converted_sibling_is_used_only_for_the_file_it_was_made_from(tmp_path):
+    model_path = _checkpoint(tmp_path)
+    assert fresh_weights_path(model_path) is None
+
+    converted = convert(model_path, NUM_CLASSES)
+    assert converted == weights_path(model_path)
+    assert fresh_weights_path(model_path) == converted
+    # reduced-precision artifacts are never picked up in place of model.pth
+    convert(model_path, NUM_CLASSES, precision="int8")
+    assert os.path.exists(weights_path(model_path, "int8"))
+
+    # model.pth replaced by another checkpoint: the sibling is stale
+    torch.save({k: v + 1 if v.is_floating_point() else v for k, v in _resnet_state().items()}, model_path)
+    os.utime(model_path, (1, 1))
+    assert fresh_weights_path(model_path) is None
+
+
+def test_unreadable_sibling_is_ignored(tmp_path):
+    model_path = _checkpoint(tmp_path)
+    with open(weights_path(model_path), "wb") as f:
+        f.write(b"garbage")
+    assert fresh_weights_path(model_path) is None
+
+
+def _mapped_names(path, model):
+    """Names of the model's tensors that are views into the file mapping, at the file's offsets"""
+    header, _ = read_header(path)
+    header.pop("__metadata__")
+    tensors = model.state_dict()
+    shared = [name for name in tensors if name in header and tensors[name].numel()]
+    # the first tensor in the file is an int64 BatchNorm counter, never converted
+    anchor = min(shared, key=lambda name: header[name]["data_offsets"][0])
+    base = tensors[anchor].data_ptr() - header[anchor]["data_offsets"][0]
+    return {name for name in shared if tensors[name].data_ptr() - base == header[name]["data_offsets"][0]}
+
+
+@pytest.mark.parametrize("precision", ["fp32", "fp16", "int8"])
+def test_mapped_model_matches_fp32_and_keeps_the_mapping(tmp_path, precision):
+    from font_identifier.weights import load_weights_model
+
+    state = _resnet_state()
+    reference = build_resnet18(NUM_CLASSES, {k: v.clone() for k, v in state.items()})
+    path = str(tmp_path / f"{precision}.safetensors")
+    save_weights(encode_state(state, precision), path, {"precision": precision, "num_classes": str(NUM_CLASSES)})
+    model = load_weights_model(path, NUM_CLASSES)
+
+    torch.manual_seed(1)
+    example = torch.randn(4, 3, 224, 224)
+    with torch.no_grad():
+        expected, actual = reference(example), model(example)
+    tolerance = {"fp32": 0.0, "fp16": 1e-2, "int8": 0.1}[precision]
+    assert (actual - expected).abs().max() <= tolerance
+    assert torch.equal(actual.argmax(1), expected.argmax(1))
+
+    # Tensors stored at full width are adopted from the mapping, not copied; only the
+    # reduced-precision ones are expanded into new fp32 tensors
+    mapped = _mapped_names(path, model)
+    stored, _ = load_weights(path)
+    kept = {name for name, t in stored.items()
+            if not name.endswith(SCALE_SUFFIX) and name + SCALE_SUFFIX not in stored
+            and t.numel() and (t.dtype == torch.float32 or not t.is_floating_point())}
+    assert mapped == kept
+    if precision == "fp32":
+        assert mapped == {name for name, t in model.state_dict().items() if t.numel()}
@@ -0,0 +1,60 @@
+"""
+Thread budget management for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.threads.
+Calibration writes the app config, so its command line stays here.
+
+Usage (measure throughput at several settings and save the best to config):
+    python threads.py --calibrate
+"""
+
+import argparse
+
+from font_identifier.threads import (  # noqa: F401
+    ThreadBudget, apply_thread_budget, available_cores, candidate_settings, measure_throughput, plan_thread_budget,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate torch thread budgets for this host")
+    parser.add_argument("--calibrate", action="store_true", help="Measure throughput and save the best setting")
+    parser.add_argument("--batch-size", type=int, default=1, help="Batch size per forward")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per measurement")
+    parser.add_argument("--dry-run", action="store_true", help="Do not write the config file")
+    args = parser.parse_args()
+
+    from config.settings import config_manager
+
+    config = config_manager.load_config()
+    if not args.calibrate:
+        budget = plan_thread_budget(config.model)
+        print(f"Cores: {budget.cores}  intra-op: {budget.intra_op}  inter-op: {budget.inter_op}  "
+              f"concurrency: {budget.concurrency}")
+        return
+
+    from font_identifier.backends import create_backend
+    from font_identifier.labels import read_class_names
+
+    backend = create_backend(config.model.path, len(read_class_names()), config.model)
+    if backend is None:
+        raise SystemExit(f"Could not load model from {config.model.path}")
+
+    cores = available_cores()
+    results = []
+    for intra, concurrency in candidate_settings(cores):
+        ips = measure_throughput(backend, intra, concurrency, args.batch_size, args.duration)
+        results.append((ips, intra, concurrency))
+        print(f"intra-op={intra:<3} concurrency={concurrency:<2} {ips:8.1f} images/s")
+
+    best_ips, best_intra, best_concurrency = max(results)
+    print(f"Best: intra-op={best_intra} concurrency={best_concurrency} ({best_ips:.1f} images/s)")
+    if args.dry_run:
+        return
+    config.model.intra_op_threads = best_intra
+    config.model.expected_concurrency = best_concurrency
+    config.model.split_cores = best_concurrency > 1
+    config_manager.save_config(config)
+    print(f"Saved to {config_manager.config_file}")
+
+
+if __name__ == "__main__":
+    main()
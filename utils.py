@@ -1,13 +1,6 @@
-import torch
-from torchvision import transforms
-from PIL import Image
+"""
+Image preprocessing utilities for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.preprocessing
+"""
 
-# Define preprocessing (must match training setup!)
-def preprocess(image: Image.Image):
-    transform = transforms.Compose([
-        transforms.Grayscale(num_output_channels=3),  # if fonts were grayscale
-        transforms.Resize((224, 224)),                # adjust to match training size
-        transforms.ToTensor(),
-        transforms.Normalize([0.5], [0.5])            # adjust if you used different normalization
-    ])
-    return transform(image)
+from font_identifier.preprocessing import INPUT_SIZE, preprocess, preprocess_tiles, tile_offsets  # noqa: F401
@@ -0,0 +1,13 @@
+"""
+Memory-mapped model weights for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.weights
+"""
+
+from font_identifier.weights import (  # noqa: F401
+    PRECISIONS, WEIGHTS_SUFFIX, build_resnet18, convert, decode_state, encode_state, fresh_weights_path,
+    is_weights_file, load_weights, load_weights_model, main, precision_report, read_header, save_weights,
+    weights_path,
+)
+
+if __name__ == "__main__":
+    main()
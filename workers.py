@@ -0,0 +1,6 @@
+"""
+Process-pool inference workers for Font Identifier
+Kept for existing scripts; the implementation lives in font_identifier.workers
+"""
+
+from font_identifier.workers import WorkerCrashed, WorkerPool  # noqa: F401